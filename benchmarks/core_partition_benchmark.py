@@ -0,0 +1,111 @@
+"""
+Core partitioning benchmark
+Runs the same jobs through the worker pool with fixed partition widths and
+with adaptive widths, once as a burst (throughput) and once one at a time
+(latency), and prints the measured trade-off per partition width.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config.settings import settings
+from src.core_scheduler import CorePartitioner, available_cores, print_partition_report
+from src.sample_rates import MODEL_RATE
+from src.voice_registry import VoiceRegistry
+from src.worker_pool import SynthesisWorkerPool
+
+BENCHMARK_TEXTS = [
+    "Hello! I'm testing my cloned voice with Bark.",
+    "The quick brown fox jumps over the lazy dog while the band plays on.",
+    "Performance on CPU matters when there is no GPU in the box.",
+    "Short one.",
+]
+
+
+def run_mode(width: int, prompt, jobs: int, min_width: int) -> dict:
+    """Burst then serial load through a pool partitioned at width (0 = adaptive)"""
+    partitioner = CorePartitioner(min_width=min_width, fixed_width=width)
+    pool = SynthesisWorkerPool(
+        shared_dir=settings.worker_pool.shared_weights_dir,
+        fine_temperature=settings.pipeline.fine_temperature,
+        partitioner=partitioner
+    ).start()
+    try:
+        # Workers map the weights in the background; wait before timing
+        while not all(w['ready'] for w in pool.get_stats()['workers'].values()):
+            time.sleep(0.5)
+        texts = [BENCHMARK_TEXTS[i % len(BENCHMARK_TEXTS)] for i in range(jobs)]
+
+        start = time.perf_counter()
+        futures = [pool.submit(text, prompt) for text in texts]
+        audio_seconds = sum(len(f.result()) for f in futures) / MODEL_RATE
+        burst_wall = time.perf_counter() - start
+
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            pool.generate(text, prompt)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        pool.stop()
+
+    return {
+        'mode': f"{width} cores" if width else "adaptive",
+        'burst_throughput': audio_seconds / burst_wall,
+        'serial_p50_s': float(np.percentile(latencies, 50)),
+        'serial_p95_s': float(np.percentile(latencies, 95)),
+        'partitions': partitioner.report(),
+    }
+
+
+def run_benchmark(speaker_name: str, jobs: int, widths, min_width: int):
+    registry = VoiceRegistry(settings.models_dir, revalidate_interval=0)
+    prompt = registry.get_prompt(speaker_name)
+    if prompt is None:
+        print(f"Voice prompt for {speaker_name} not found. Please train first.")
+        return None
+
+    print(f"{len(available_cores())} cores available")
+    results = []
+    for width in widths:
+        label = f"{width} cores" if width else "adaptive"
+        print(f"\nRunning {jobs} jobs, {label}...")
+        result = run_mode(width, prompt, jobs, min_width)
+        print_partition_report(result['partitions'])
+        results.append(result)
+
+    print("\nCore partitioning benchmark")
+    print("=" * 56)
+    print(f"{'mode':>12}{'burst audio s/s':>18}{'serial p50':>13}{'serial p95':>13}")
+    for result in results:
+        print(f"{result['mode']:>12}{result['burst_throughput']:>18.2f}"
+              f"{result['serial_p50_s']:>12.2f}s{result['serial_p95_s']:>12.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark fixed vs adaptive core partitions')
+    parser.add_argument('--speaker_name', type=str, default="user",
+                        help='Cloned voice to benchmark with')
+    parser.add_argument('--jobs', type=int, default=8,
+                        help='Jobs per load pattern')
+    parser.add_argument('--widths', type=str, default=None,
+                        help='Comma-separated partition widths to compare, 0 = adaptive '
+                             '(default: adaptive, all cores and --min_width)')
+    parser.add_argument('--min_width', type=int, default=settings.worker_pool.min_partition_width,
+                        help='Narrowest adaptive partition')
+
+    args = parser.parse_args()
+
+    if args.widths:
+        widths = [int(w) for w in args.widths.split(",")]
+    else:
+        widths = list(dict.fromkeys([0, len(available_cores()), args.min_width]))
+    run_benchmark(args.speaker_name, args.jobs, widths, args.min_width)
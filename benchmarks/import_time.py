@@ -0,0 +1,83 @@
+"""
+Import-time benchmark
+Runs each entry point in a fresh interpreter with ``-X importtime`` and
+reports wall time plus the slowest imports, so heavy dependencies creeping
+back onto the startup path show up. Exits non-zero when a CLI path goes
+over its budget.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# name -> (python arguments, budget in seconds or None for report only)
+TARGETS = {
+    'main.py --help': (['main.py', '--help'], 1.0),
+    'main.py (banner)': (['main.py'], 1.0),
+    'config.settings': (['-c', 'import config.settings'], 1.0),
+    'src.voice_cloning': (['-c', 'import src.voice_cloning'], None),
+    'src.tts_engine': (['-c', 'import src.tts_engine'], None),
+}
+
+
+def parse_importtime(stderr: str):
+    """(cumulative_us, module) pairs for top-level imports in -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, module = line.split('|')
+        # Nested imports are indented and already counted in their parent
+        if module[1:].startswith(' '):
+            continue
+        rows.append((int(cumulative_us), module.strip()))
+    return rows
+
+
+def measure(args, repeats: int = 3):
+    """Best wall time over a few runs, and the import report of the last one"""
+    best = float('inf')
+    stderr = ""
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime'] + args,
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+        best = min(best, time.perf_counter() - start)
+        stderr = result.stderr
+    return best, parse_importtime(stderr)
+
+
+def run_benchmark(top: int = 8, repeats: int = 3) -> bool:
+    within_budget = True
+    print("\nImport-time benchmark")
+    print("=" * 40)
+    for name, (args, budget) in TARGETS.items():
+        elapsed, rows = measure(args, repeats)
+        status = ""
+        if budget is not None:
+            ok = elapsed <= budget
+            within_budget &= ok
+            status = f"(budget {budget:.1f}s: {'ok' if ok else 'OVER'})"
+        print(f"\n{name}: {elapsed:.3f}s {status}")
+        for us, module in sorted(rows, reverse=True)[:top]:
+            print(f"  {us / 1000:8.1f} ms  {module}")
+    return within_budget
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Report import times of the CLI entry points')
+    parser.add_argument('--top', type=int, default=8,
+                        help='Slowest top-level imports to list per target')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Runs per target; the fastest is reported')
+
+    args = parser.parse_args()
+
+    sys.exit(0 if run_benchmark(args.top, args.repeats) else 1)
@@ -0,0 +1,82 @@
+"""
+Playback path benchmark
+Feeds synthetic speech-sized chunks through the output sink at a chosen
+real-time factor and reports underruns and buffer fill. Uses the null sink,
+so it runs on servers without an audio device.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.audio_output import NullSink
+
+SAMPLE_RATE = 24000
+
+
+def make_chunk(seconds: float, sample_rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.2 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+
+def run_benchmark(num_chunks: int = 8, chunk_seconds: float = 2.0,
+                  synthesis_rtf: float = 0.5, buffer_seconds: float = 10.0):
+    """Produce chunks taking synthesis_rtf x their duration each, as a generator would"""
+    sink = NullSink(SAMPLE_RATE, realtime=True, buffer_seconds=buffer_seconds)
+    chunk = make_chunk(chunk_seconds, SAMPLE_RATE)
+    fill_levels = []
+
+    start = time.perf_counter()
+    first_audio = None
+    for _ in range(num_chunks):
+        time.sleep(chunk_seconds * synthesis_rtf)
+        sink.write(chunk)
+        if first_audio is None:
+            first_audio = time.perf_counter() - start
+        fill_levels.append(sink.fill_level)
+    sink.end_utterance()
+    sink.drain()
+    elapsed = time.perf_counter() - start
+    sink.close()
+
+    audio_seconds = sink.samples_written / SAMPLE_RATE
+    results = {
+        'audio_seconds': audio_seconds,
+        'wall_seconds': elapsed,
+        'first_audio_s': first_audio,
+        'underruns': sink.underruns,
+        'mean_fill_level': float(np.mean(fill_levels)),
+        'max_fill_level': float(np.max(fill_levels)),
+    }
+
+    print("\nPlayback benchmark")
+    print("=" * 40)
+    print(f"Audio played:      {results['audio_seconds']:.2f}s")
+    print(f"Wall time:         {results['wall_seconds']:.2f}s")
+    print(f"First audio after: {results['first_audio_s']:.2f}s")
+    print(f"Underruns:         {results['underruns']}")
+    print(f"Mean fill level:   {results['mean_fill_level']:.2f}")
+    print(f"Max fill level:    {results['max_fill_level']:.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the gapless playback path headless')
+    parser.add_argument('--chunks', type=int, default=8,
+                        help='Number of chunks to play')
+    parser.add_argument('--chunk_seconds', type=float, default=2.0,
+                        help='Duration of each chunk')
+    parser.add_argument('--synthesis_rtf', type=float, default=0.5,
+                        help='Simulated synthesis real-time factor (>1 means slower than playback)')
+    parser.add_argument('--buffer_seconds', type=float, default=10.0,
+                        help='Ring buffer size')
+
+    args = parser.parse_args()
+
+    run_benchmark(args.chunks, args.chunk_seconds, args.synthesis_rtf, args.buffer_seconds)
@@ -0,0 +1,317 @@
+"""
+End-to-end turn latency replay
+Feeds a scripted conversation of recorded WAV turns through the agent's
+response and speech path with a stub ASR and a local stub Grok server, and
+reports per-turn and percentile latencies. Playback goes to the null or
+file sink, so it runs headless on a CPU box; save results with --output and
+pass them back with --baseline to compare two builds.
+
+A script is a directory of turn WAVs played in name order. Each turn's
+transcript is read from a .txt file with the same stem, or taken from the
+file name when there is none.
+"""
+
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config.settings import settings
+from src.cancellation import check_cancelled
+from src.sample_rates import MODEL_RATE
+
+REPLY_TEXT = ("Sure, here is a short answer to that. The details depend on what you are "
+              "after, but the main idea is simple enough to explain in a sentence or two.")
+
+
+def load_script(script_dir: str) -> List[Dict]:
+    turns = []
+    for wav in sorted(glob.glob(os.path.join(script_dir, "*.wav"))):
+        stem = os.path.splitext(wav)[0]
+        if os.path.exists(stem + ".txt"):
+            with open(stem + ".txt") as f:
+                text = f.read().strip()
+        else:
+            text = os.path.basename(stem).replace("_", " ")
+        turns.append({'wav': wav, 'text': text, 'duration': sf.info(wav).duration})
+    return turns
+
+
+class StubASR:
+    """Returns the scripted transcript after asr_rtf x the turn's audio duration"""
+
+    def __init__(self, asr_rtf: float = 0.1):
+        self.asr_rtf = asr_rtf
+
+    def transcribe(self, turn: Dict) -> str:
+        time.sleep(turn['duration'] * self.asr_rtf)
+        return turn['text']
+
+
+class StubGrokServer:
+    """Local OpenAI-style chat completions endpoint with configurable latency.
+
+    Each response takes ``delay`` plus up to ``jitter`` seconds, and the body
+    is streamed out in ``stream_chunks`` pieces spread over that time.
+    """
+
+    def __init__(self, delay: float = 0.8, jitter: float = 0.3, stream_chunks: int = 4,
+                 reply: str = REPLY_TEXT, seed: int = 0):
+        self.delay = delay
+        self.jitter = jitter
+        self.stream_chunks = max(1, stream_chunks)
+        self.reply = reply
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def _response_delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            return self.delay + self._random.uniform(0.0, self.jitter)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length))
+                delay = stub._response_delay()
+                body = json.dumps({
+                    'model': payload.get('model'),
+                    'choices': [{'message': {'role': 'assistant', 'content': stub.reply}}],
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                step = -(-len(body) // stub.stream_chunks)
+                try:
+                    for start in range(0, len(body), step):
+                        time.sleep(delay / stub.stream_chunks)
+                        self.wfile.write(body[start:start + step])
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # A hedged duplicate lost and was dropped by the client
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubVoiceCloner:
+    """Stands in for BarkVoiceCloner: a tone as long as the text, rendered at tts_rtf"""
+
+    def __init__(self, tts_rtf: float = 0.3, sample_rate: int = MODEL_RATE):
+        self.tts_rtf = tts_rtf
+        self.sample_rate = sample_rate
+
+    def synthesize_speech(self, text: str, speaker_name: str, silence_padding: float = 0.0,
+                          cancel_token=None) -> Optional[np.ndarray]:
+        seconds = max(0.5, len(text) / settings.tts.speech_chars_per_second)
+        time.sleep(seconds * self.tts_rtf)
+        check_cancelled(cancel_token)
+        t = np.arange(int(seconds * self.sample_rate)) / self.sample_rate
+        return (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+    def synthesize_chunks(self, chunks: List[str], speaker_name: str, cancel_token=None):
+        for chunk in chunks:
+            yield self.synthesize_speech(chunk, speaker_name, cancel_token=cancel_token)
+
+
+def build_agent(voice_cloner, speaker_name: str, base_url: str, sink_kind: str,
+                sink_path: Optional[str]):
+    from src.ai_agent import AIAgent
+    from src.audio_output import create_sink
+    from src.grok_client import GrokClient
+    from src.tts_engine import BarkTTSEngine
+
+    # Never open a sound device while constructing the agent
+    settings.audio.output_sink = "null"
+    agent = AIAgent("replay", voice_cloner, cloned_voice_name=speaker_name)
+    agent.barge_in = False
+    agent.grok_client = GrokClient("replay", base_url=base_url)
+    agent.tts_engine.close()
+    sink = create_sink(sink_kind, voice_cloner.sample_rate,
+                       crossfade_ms=settings.audio.output_crossfade_ms,
+                       path=sink_path,
+                       buffer_seconds=settings.audio.output_buffer_seconds)
+    agent.tts_engine = BarkTTSEngine(voice_cloner, sink=sink)
+    return agent
+
+
+def replay_turn(agent, asr: StubASR, turn: Dict) -> Dict:
+    """Latencies measured from the end of the user's recorded turn"""
+    sink = agent.tts_engine.sink
+    speech_end = time.monotonic()
+    text = asr.transcribe(turn)
+    transcribed = time.monotonic()
+    response = agent.generate_response(text)
+    responded = time.monotonic()
+    agent.speak_response(response)
+    while sink.utterance_started_at is None or sink.utterance_started_at < responded:
+        if not agent.tts_engine.is_speaking and agent.tts_engine.speech_queue.empty():
+            break
+        time.sleep(0.005)
+    first_audio = sink.utterance_started_at
+    agent.wait_while_speaking()
+    finished = time.monotonic()
+    return {
+        'turn': os.path.basename(turn['wav']),
+        'asr_s': transcribed - speech_end,
+        'llm_s': responded - transcribed,
+        'first_audio_s': (first_audio - speech_end) if first_audio and first_audio >= responded else None,
+        'turn_s': finished - speech_end,
+    }
+
+
+def summarize(turns: List[Dict]) -> Dict:
+    summary = {}
+    for key in ('asr_s', 'llm_s', 'first_audio_s', 'turn_s'):
+        values = [t[key] for t in turns if t[key] is not None]
+        if not values:
+            continue
+        summary[key] = {
+            'p50': float(np.percentile(values, 50)),
+            'p90': float(np.percentile(values, 90)),
+            'p95': float(np.percentile(values, 95)),
+            'max': float(np.max(values)),
+        }
+    return summary
+
+
+def run_replay(script_dir: str, runs: int = 1, speaker_name: Optional[str] = None,
+               sink_kind: str = "null", sink_path: Optional[str] = None,
+               asr_rtf: float = 0.1, tts_rtf: float = 0.3, llm_delay: float = 0.8,
+               llm_jitter: float = 0.3, stream_chunks: int = 4, seed: int = 0) -> Dict:
+    script = load_script(script_dir)
+    if not script:
+        print(f"No .wav turns found in {script_dir}")
+        return {}
+
+    if speaker_name:
+        from src.voice_cloning import BarkVoiceCloner
+        voice_cloner = BarkVoiceCloner()
+    else:
+        voice_cloner = StubVoiceCloner(tts_rtf)
+
+    server = StubGrokServer(llm_delay, llm_jitter, stream_chunks, seed=seed)
+    server.start()
+    agent = build_agent(voice_cloner, speaker_name or "replay", server.base_url,
+                        sink_kind, sink_path)
+    asr = StubASR(asr_rtf)
+    turns = []
+    try:
+        for run in range(runs):
+            agent.conversation_history = []
+            for turn in script:
+                result = replay_turn(agent, asr, turn)
+                result['run'] = run
+                turns.append(result)
+                first = result['first_audio_s']
+                print(f"run {run + 1} {result['turn']}: asr {result['asr_s']:.2f}s, "
+                      f"llm {result['llm_s']:.2f}s, first audio "
+                      f"{'n/a' if first is None else f'{first:.2f}s'}, turn {result['turn_s']:.2f}s")
+    finally:
+        agent.stop()
+        server.stop()
+
+    results = {
+        'config': {'script_dir': script_dir, 'runs': runs, 'bark': bool(speaker_name),
+                   'sink': sink_kind, 'asr_rtf': asr_rtf, 'tts_rtf': tts_rtf,
+                   'llm_delay': llm_delay, 'llm_jitter': llm_jitter,
+                   'stream_chunks': stream_chunks},
+        'turns': turns,
+        'summary': summarize(turns),
+        'grok_stats': dict(agent.grok_client.stats),
+    }
+    return results
+
+
+def print_summary(results: Dict, baseline: Optional[Dict] = None):
+    print("\nTurn latency replay")
+    print("=" * 60)
+    print(f"{'':16}{'p50':>9}{'p90':>9}{'p95':>9}{'max':>9}")
+    for key, stats in results['summary'].items():
+        print(f"{key:16}" + "".join(f"{stats[p]:8.2f}s" for p in ('p50', 'p90', 'p95', 'max')))
+        if baseline and key in baseline.get('summary', {}):
+            old = baseline['summary'][key]
+            print(f"{'  vs baseline':16}" +
+                  "".join(f"{stats[p] - old[p]:+8.2f}s" for p in ('p50', 'p90', 'p95', 'max')))
+    print(f"Grok: {results['grok_stats']}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay a recorded conversation and measure turn latency')
+    parser.add_argument('--script_dir', type=str, required=True,
+                        help='Directory of turn WAVs (with optional .txt transcripts)')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='Times to replay the whole script')
+    parser.add_argument('--speaker_name', type=str, default=None,
+                        help='Render with Bark and this cloned voice instead of the stub synthesizer')
+    parser.add_argument('--sink', type=str, default="null", choices=["null", "file"],
+                        help='Where playback goes')
+    parser.add_argument('--sink_path', type=str, default="replay_output.wav",
+                        help='Output file for the file sink')
+    parser.add_argument('--asr_rtf', type=float, default=0.1,
+                        help='Stub ASR time per second of user audio')
+    parser.add_argument('--tts_rtf', type=float, default=0.3,
+                        help='Stub synthesizer real-time factor')
+    parser.add_argument('--llm_delay', type=float, default=0.8,
+                        help='Stub Grok base response time')
+    parser.add_argument('--llm_jitter', type=float, default=0.3,
+                        help='Extra random Grok delay, up to this much')
+    parser.add_argument('--stream_chunks', type=int, default=4,
+                        help='Pieces the stub Grok body is streamed in')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None,
+                        help='Save results as JSON')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Results JSON from another build to compare against')
+
+    args = parser.parse_args()
+
+    results = run_replay(args.script_dir, args.runs, args.speaker_name, args.sink,
+                         args.sink_path if args.sink == "file" else None,
+                         args.asr_rtf, args.tts_rtf, args.llm_delay, args.llm_jitter,
+                         args.stream_chunks, args.seed)
+    if results:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        print_summary(results, baseline)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"Results saved to {args.output}")
@@ -1,13 +1,16 @@
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, Any
 
-# Try to import torch, but don't fail if it's not available
-try:
-    import torch
-    CUDA_AVAILABLE = torch.cuda.is_available()
-except ImportError:
-    CUDA_AVAILABLE = False
+@lru_cache(maxsize=1)
+def cuda_available() -> bool:
+    """Checked on first use: importing torch costs seconds, so settings must not"""
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
 
 @dataclass
 class GrokConfig:
@@ -15,19 +18,41 @@ class GrokConfig:
     temperature: float = 0.8
     max_tokens: int = 200
     timeout: int = 30
+    turn_deadline_s: float = 8.0  # give up on a turn after this long
+    hedge_enabled: bool = True  # send a second request if the first is slow
+    hedge_percentile: float = 95.0  # hedge once the first request is slower than this
+    hedge_min_delay_s: float = 1.5  # hedge delay floor, and the delay until enough samples exist
+    fallback_model: str = "grok-3-mini"  # cheaper model used near the deadline, "" disables
+    fallback_headroom_s: float = 3.0  # switch to the fallback with this much time left
+    pool_size: int = 8  # pooled HTTP connections
 
 @dataclass
 class AudioConfig:
-    sample_rate: int = 22050
+    sample_rate: int = 24000  # working rate after ingest; Bark's native rate (see src/sample_rates.py)
+    capture_rate: int = 24000  # record at the working rate so takes need no conversion
     chunk_duration: int = 5  # seconds
     silence_threshold: float = 0.01
     min_audio_length: float = 3.0  # seconds for Bark
     max_audio_length: float = 300.0  # seconds
+    output_sink: str = "sounddevice"  # "sounddevice", "file" or "null"
+    output_path: str = "data/processed_audio/agent_output.wav"  # where the "file" sink writes
+    output_buffer_seconds: float = 10.0
+    output_crossfade_ms: float = 10.0
+    capture_queue_seconds: float = 5.0  # audio the recorder can buffer before dropping frames
+    split_silence_s: float = 0.8  # silence that ends a clip in session recording
+    pre_roll_s: float = 0.3  # audio kept before speech onset
+    render_format: str = "wav"  # "wav", "flac" or "opus" for saved renders without an extension choice
+    stream_buffer_kb: int = 256  # encoded audio held for a slow reader before synthesis waits
 
 @dataclass
 class ModelConfig:
     voice_clone_model: str = "bark"
-    device: str = "cuda" if CUDA_AVAILABLE else "cpu"
+    device: str = "auto"  # "auto" picks cuda when available, see resolve_device()
+
+    def resolve_device(self) -> str:
+        if self.device == "auto":
+            return "cuda" if cuda_available() else "cpu"
+        return self.device
 
 @dataclass
 class TrainingConfig:
@@ -36,9 +61,147 @@ class TrainingConfig:
 
 @dataclass
 class AgentConfig:
+    system_prompt: str = """You are Grok, an AI assistant with a sense of humor and a rebellious streak. 
+        You're helpful, witty, and occasionally sarcastic. You have opinions and aren't afraid to show them.
+        Keep your responses concise, engaging, and human-like. Be authentic and don't shy away from humor when appropriate.
+        Remember: you're talking to a real person, so be engaging and natural in your conversation."""
     wake_word: str = "assistant"
     response_timeout: int = 30
     max_response_length: int = 500
+    # Stop talking when the user starts speaking. Off by default: without echo
+    # cancellation loudspeaker playback can trigger it; suited to headphones
+    barge_in: bool = False
+    barge_in_echo_ratio: float = 0.5  # during playback the mic must be this many times louder than it
+    barge_in_min_speech_ms: int = 240
+    vad_aggressiveness: int = 3
+
+@dataclass
+class TTSConfig:
+    fast_engine: str = "espeak"  # degraded-path engine, "none" disables the fallback
+    fast_voice: str = "en"
+    fast_words_per_minute: int = 170
+    first_audio_deadline_s: float = 4.0  # time from speak() to the first audible chunk
+    max_gap_s: float = 0.3  # silence tolerated between chunks before degrading
+    bark_rtf_prior: float = 2.0  # Bark RTF assumed until the first chunk is measured
+    speech_chars_per_second: float = 14.0
+    speaking_rate: float = 1.0  # delivery speed applied after synthesis (1.2 = 20% faster)
+    pitch_semitones: float = 0.0
+
+@dataclass
+class BatchingConfig:
+    enabled: bool = False
+    max_batch_size: int = 4
+    max_wait_ms: float = 15.0  # how long to wait for more requests to join a batch
+
+@dataclass
+class PipelineConfig:
+    semantic_cache_size: int = 256  # cached text->semantic results
+    fine_temperature: float = 0.5
+
+@dataclass
+class LongFormConfig:
+    workers: int = 2
+    max_segment_chars: int = 220
+    crossfade_ms: float = 40.0
+    target_dbfs: float = -20.0
+
+@dataclass
+class VoicePromptConfig:
+    target_seconds: float = 12.0  # voiced audio assembled into the prompt
+    min_snr_db: float = 15.0  # segments below these floors are never used
+    max_clipping: float = 0.001  # fraction of samples at full scale
+    min_voiced_ratio: float = 0.3
+    jitter_weight: float = 10.0  # score dB lost per semitone of frame-to-frame pitch jitter
+    clipping_weight: float = 10000.0  # score dB lost per unit of clipped fraction
+    gap_s: float = 0.2  # pause inserted between segments
+    target_dbfs: float = -20.0  # every segment is levelled to this
+
+@dataclass
+class RegistryConfig:
+    max_prompt_cache_mb: int = 256
+    revalidate_interval_s: float = 5.0  # background mtime check, 0 disables
+
+@dataclass
+class WorkerPoolConfig:
+    enabled: bool = False  # render in worker processes sharing mmap'd weights
+    num_workers: int = 0  # 0 = cpu_count // threads_per_worker
+    threads_per_worker: int = 4
+    shared_weights_dir: str = "data/models/shared"
+    max_retries: int = 1  # times a job is retried after its worker crashes
+    partition_cores: bool = False  # size and pin a core partition per job from the queue depth
+    min_partition_width: int = 2  # narrowest partition, in cores, under heavy load
+
+@dataclass
+class MemoryGovernorConfig:
+    enabled: bool = False
+    idle_ttl_s: float = 600.0  # offload a Bark sub-model unused this long, 0 disables
+    check_interval_s: float = 30.0
+    min_available_mb: int = 0  # offload idle models early below this much free RAM, 0 disables
+    offload_dir: str = "data/models/offload"
+
+@dataclass
+class AudioCacheConfig:
+    enabled: bool = True
+    cache_dir: str = "data/cache/decoded"
+    max_size_mb: int = 1024
+    keep_native: bool = False  # also cache each file at its own rate before resampling
+
+@dataclass
+class DenoiseConfig:
+    n_fft: int = 1024
+    n_std_thresh: float = 1.5  # bins below noise mean + this many std are gated
+    prop_decrease: float = 0.9  # attenuation applied to gated bins
+    time_smoothing: float = 0.6  # one-pole smoothing of the gain mask across frames
+    profiles_dir: str = "data/models/noise_profiles"  # one persisted profile per capture device
+    adapt_rate: float = 0.02  # weight of each non-speech frame when live capture updates the profile
+    capture: bool = True  # denoise the live barge-in microphone stream; recordings stay raw
+    ingest: bool = True  # denoise voice recordings before they are indexed
+    cache_dir: str = "data/cache/denoised"  # denoised copies of ingested recordings
+
+@dataclass
+class SessionConfig:
+    max_sessions: int = 64
+    synthesis_workers: int = 2  # more than 1 only helps with batching or the worker pool on
+    max_pending_chunks: int = 8  # per session; further speech is refused until it drains
+    max_outgoing_messages: int = 64  # per connection; synthesis waits while the client reads slowly
+    max_reply_chars: int = 600  # longer replies are cut before synthesis
+    turns_per_minute: int = 12
+    idle_timeout_s: float = 900.0  # sessions quiet this long are closed
+    history_turns: int = 8  # messages sent to Grok per turn
+    audio_format: str = "pcm16"  # "pcm16" frames, or one "wav"/"opus" stream per utterance
+    max_audio_in_seconds: float = 60.0  # longest client utterance; the connection is closed past it
+    max_audio_in_rate: int = 48000  # highest sample rate accepted for client audio
+    host: str = "127.0.0.1"
+    port: int = 8765
+
+@dataclass
+class BestOfKConfig:
+    candidates: int = 4
+    min_similarity: float = 0.9  # MFCC-profile cosine a preview must reach
+    probe_seconds: float = 2.0  # opening audio each take is judged on
+    min_chars_per_second: float = 5.0  # slower takes are treated as babbling
+    max_chars_per_second: float = 30.0  # faster takes are treated as truncated
+
+@dataclass
+class ProfilingConfig:
+    output_dir: str = "data/profiles"  # each --profile run gets a timestamped folder here
+    torch_trace: bool = True
+    # The torch trace records a window of Bark stage calls: skip, warm up, then record
+    torch_wait_steps: int = 1
+    torch_warmup_steps: int = 1
+    torch_active_steps: int = 3
+    trace_allocations: bool = False  # tracemalloc and torch memory profiling; slows runs noticeably
+    sample_interval_ms: float = 5.0
+    top_functions: int = 15
+
+@dataclass
+class PerformanceConfig:
+    profile: str = "default"  # "default" (fp32) or "cpu_fast"
+    quantize_int8: bool = True  # dynamic int8 Linear layers, cpu_fast only
+    use_kv_caching: bool = True
+    use_small_models: bool = False
+    intra_op_threads: int = 0  # 0 keeps torch's default
+    inter_op_threads: int = 0
 
 class Settings:
     def __init__(self):
@@ -47,6 +210,20 @@ class Settings:
         self.model = ModelConfig()
         self.training = TrainingConfig()
         self.agent = AgentConfig()
+        self.batching = BatchingConfig()
+        self.tts = TTSConfig()
+        self.performance = PerformanceConfig()
+        self.pipeline = PipelineConfig()
+        self.longform = LongFormConfig()
+        self.registry = RegistryConfig()
+        self.voice_prompt = VoicePromptConfig()
+        self.audio_cache = AudioCacheConfig()
+        self.denoise = DenoiseConfig()
+        self.profiling = ProfilingConfig()
+        self.best_of_k = BestOfKConfig()
+        self.sessions = SessionConfig()
+        self.worker_pool = WorkerPoolConfig()
+        self.memory_governor = MemoryGovernorConfig()
         self.data_dir = "data"
         self.models_dir = "data/models"
         
@@ -17,9 +17,54 @@ def main():
                        help='Name for the cloned voice')
     parser.add_argument('--test-voice', action='store_true',
                        help='Test cloned voice without running agent')
+    parser.add_argument('--render-document', type=str,
+                       help='Render a long text document with the cloned voice')
+    parser.add_argument('--output', type=str,
+                       help='Output audio path for --render-document')
+    parser.add_argument('--workers', type=int,
+                       help='Segments rendered in parallel for --render-document')
+    parser.add_argument('--serve', action='store_true',
+                       help='Serve many concurrent conversations over WebSocket')
+    parser.add_argument('--port', type=int,
+                       help='Port for --serve (default from settings.sessions.port)')
+    parser.add_argument('--rate', type=float, default=1.0,
+                       help='Also save a variant at this speaking rate (--test-voice, --render-document)')
+    parser.add_argument('--pitch', type=float, default=0.0,
+                       help='Also save a variant shifted by this many semitones')
+    parser.add_argument('--format', type=str, choices=['wav', 'flac', 'opus'],
+                       help='Audio format for --test-voice and --render-document '
+                            '(default from settings.audio.render_format)')
+    parser.add_argument('--profile', action='store_true',
+                       help='Profile the command; reports go to a timestamped folder in data/profiles')
     
     args = parser.parse_args()
     
+    if args.profile:
+        from src.profiling import profile_session
+        with profile_session(_command_name(args)):
+            run_command(args)
+    else:
+        run_command(args)
+
+
+def _command_name(args) -> str:
+    for name in ('clone_voice', 'run_agent', 'test_voice', 'render_document', 'serve'):
+        if getattr(args, name):
+            return name
+    return "help"
+
+
+def _save_variant(output_path: str, rate: float, pitch: float):
+    """Derive a rate/pitch variant from a finished render, cached next to it"""
+    if rate == 1.0 and pitch == 0.0:
+        return
+    from src.prosody import render_variant
+    variant = render_variant(output_path, rate, pitch)
+    if variant:
+        print(f"Variant (rate {rate}, pitch {pitch:+.1f} st) saved to: {variant}")
+
+
+def run_command(args):
     if args.clone_voice:
         if not args.audio_dir:
             print("Please specify audio directory with --audio-dir")
@@ -33,8 +78,10 @@ def main():
         run_grok_agent()
         
     elif args.test_voice:
+        from config.settings import settings
         from src.voice_cloning import BarkVoiceCloner
         
+        extension = args.format or settings.audio.render_format
         voice_cloner = BarkVoiceCloner()
         speaker_name = args.speaker_name
         
@@ -52,17 +99,63 @@ def main():
         ]
         
         for i, text in enumerate(test_texts):
-            output_path = f"data/processed_audio/voice_test_{i+1}.wav"
+            output_path = f"data/processed_audio/voice_test_{i+1}.{extension}"
             print(f"Generating: '{text}'")
-            success = voice_cloner.synthesize_speech(
+            audio = voice_cloner.synthesize_speech(
                 text=text,
                 speaker_name=speaker_name,
                 output_path=output_path
             )
-            if success:
+            if audio is not None:
                 print(f"Saved to: {output_path}")
             else:
                 print("Generation failed")
+                continue
+            _save_variant(output_path, args.rate, args.pitch)
+        
+    elif args.render_document:
+        from config.settings import settings
+        from src.longform import LongFormRenderer
+        from src.voice_cloning import BarkVoiceCloner
+        
+        extension = args.format or settings.audio.render_format
+        output_path = args.output or f"{os.path.splitext(args.render_document)[0]}.{extension}"
+        with open(args.render_document, 'r', encoding='utf-8') as f:
+            document = f.read()
+        
+        voice_cloner = BarkVoiceCloner()
+        if not voice_cloner.load_voice_prompt(args.speaker_name):
+            print(f"Voice prompt for {args.speaker_name} not found. Please train first.")
+            return
+        
+        renderer = LongFormRenderer(
+            voice_cloner,
+            args.speaker_name,
+            workers=args.workers or settings.longform.workers,
+            max_segment_chars=settings.longform.max_segment_chars,
+            crossfade_ms=settings.longform.crossfade_ms,
+            target_dbfs=settings.longform.target_dbfs
+        )
+        if renderer.render(document, output_path):
+            renderer.cleanup(output_path)
+            _save_variant(output_path, args.rate, args.pitch)
+        
+    elif args.serve:
+        from src.grok_client import GrokClient
+        from src.session_manager import SessionManager, serve_websocket
+        from src.voice_cloning import BarkVoiceCloner
+        
+        api_key = os.environ.get("GROK_API_KEY")
+        if not api_key:
+            from config.api_keys import GROK_API_KEY as api_key
+        
+        # One warm cloner and one pooled Grok client for every session
+        voice_cloner = BarkVoiceCloner()
+        if not voice_cloner.load_voice_prompt(args.speaker_name):
+            print(f"Voice prompt for {args.speaker_name} not found. Please train first.")
+            return
+        manager = SessionManager(voice_cloner, GrokClient(api_key))
+        serve_websocket(manager, port=args.port, speaker_name=args.speaker_name)
         
     else:
         print("Grok Voice AI Agent System")
@@ -71,6 +164,9 @@ def main():
         print("--clone-voice --audio-dir ./your_voice -- Clone your voice")
         print("--run-agent                    -- Run Grok AI agent")
         print("--test-voice --speaker-name your_voice -- Test cloned voice")
+        print("--render-document article.txt --output article.wav -- Render a long text")
+        print("--serve --speaker-name your_voice -- Serve many conversations over WebSocket")
+        print("--profile                      -- Profile any of the above")
         print("\nExample workflow:")
         print("1. python main.py --clone-voice --audio-dir data/raw_audio/your_voice")
         print("2. python main.py --test-voice --speaker-name your_voice")
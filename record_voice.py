@@ -1,58 +1,268 @@
-import pyaudio
-import wave
+import argparse
+import collections
 import os
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+import pyaudio
+from config.settings import settings
+
+
+class StreamingRecorder:
+    """Callback-driven recorder that writes straight to disk.
+
+    PyAudio's callback only hands each block to a bounded queue; a writer
+    thread appends it to the open WAV file. Memory stays constant however
+    long the session runs, and a full queue is counted as dropped frames
+    instead of stalling the audio thread. With ``split_on_silence`` the
+    session is cut into clips at pauses of ``split_silence_s``.
+    """
+
+    def __init__(self, output_dir, prefix="recording", sample_rate=None, channels=1,
+                 chunk=1024, split_on_silence=True, silence_threshold=None,
+                 split_silence_s=None, min_clip_s=None, max_clip_s=None,
+                 pre_roll_s=None, queue_seconds=None, show_meter=True, filename=None):
+        audio_config = settings.audio
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.sample_rate = sample_rate or audio_config.capture_rate
+        self.channels = channels
+        self.chunk = chunk
+        self.split_on_silence = split_on_silence
+        self.silence_threshold = silence_threshold if silence_threshold is not None else audio_config.silence_threshold
+        self.split_silence_s = split_silence_s if split_silence_s is not None else audio_config.split_silence_s
+        self.min_clip_s = min_clip_s if min_clip_s is not None else audio_config.min_audio_length
+        self.max_clip_s = max_clip_s if max_clip_s is not None else audio_config.max_audio_length
+        self.show_meter = show_meter
+        # A fixed filename records one clip there, without splitting
+        self.filename = filename
+        if filename is not None:
+            self.split_on_silence = False
+
+        chunk_s = chunk / self.sample_rate
+        queue_s = queue_seconds if queue_seconds is not None else audio_config.capture_queue_seconds
+        pre_roll = pre_roll_s if pre_roll_s is not None else audio_config.pre_roll_s
+        self._queue = queue.Queue(maxsize=max(1, int(queue_s / chunk_s)))
+        self._pre_roll = collections.deque(maxlen=max(1, int(pre_roll / chunk_s)))
+
+        self._pyaudio = None
+        self._stream = None
+        self._writer = None
+        self._wav = None
+        self._clip_path = None
+        self._clip_frames = 0
+        self._silent_frames = 0
+        self._next_index = 1
+
+        self.clips = []
+        self.frames_captured = 0
+        self.dropped_frames = 0
+        self.overflows = 0
+        self.level_db = -120.0
+        self.peak_db = -120.0
+
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & pyaudio.paInputOverflow:
+            self.overflows += 1
+        try:
+            self._queue.put_nowait(in_data)
+        except queue.Full:
+            # Never block the audio thread; the writer is behind
+            self.dropped_frames += frame_count
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not self.split_on_silence:
+            self._open_clip()
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.sample_rate,
+            input=True,
+            frames_per_buffer=self.chunk,
+            stream_callback=self._callback
+        )
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """Stop capture, write out everything queued and close the last clip"""
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._pyaudio is not None:
+            self._pyaudio.terminate()
+            self._pyaudio = None
+        if self.show_meter:
+            print()
+
+    def record(self, duration=None):
+        """Record for duration seconds, or until Ctrl+C when duration is None"""
+        self.start()
+        try:
+            deadline = None if duration is None else time.monotonic() + duration
+            while deadline is None or time.monotonic() < deadline:
+                time.sleep(0.05)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        return self.clips
+
+    def _write_loop(self):
+        last_meter = 0.0
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            samples = np.frombuffer(data, dtype=np.int16)
+            self.frames_captured += len(samples) // self.channels
+            rms = np.sqrt(np.mean((samples.astype(np.float32) / 32768.0) ** 2)) if len(samples) else 0.0
+            self.level_db = float(20 * np.log10(max(rms, 1e-6)))
+            self.peak_db = max(self.peak_db, self.level_db)
+
+            if self.split_on_silence:
+                self._segment(data, rms >= self.silence_threshold)
+            else:
+                self._append(data)
+
+            now = time.monotonic()
+            if self.show_meter and now - last_meter >= 0.1:
+                last_meter = now
+                self._print_meter()
+        self._close_clip()
 
-def record_audio(filename, duration=10, sample_rate=22050, channels=1, chunk=1024):
+    def _segment(self, data, voiced):
+        chunk_frames = len(data) // (2 * self.channels)
+        if self._wav is None:
+            if voiced:
+                self._open_clip()
+                for block in self._pre_roll:
+                    self._append(block)
+                self._pre_roll.clear()
+                self._append(data)
+            else:
+                self._pre_roll.append(data)
+            return
+
+        self._append(data)
+        self._silent_frames = 0 if voiced else self._silent_frames + chunk_frames
+        if (self._silent_frames >= self.split_silence_s * self.sample_rate
+                or self._clip_frames >= self.max_clip_s * self.sample_rate):
+            self._close_clip()
+
+    def _open_clip(self):
+        if self.filename is not None:
+            self._clip_path = self.filename
+        else:
+            self._clip_path = os.path.join(self.output_dir, f"{self.prefix}_{self._next_index}.wav")
+            self._next_index += 1
+        self._wav = wave.open(self._clip_path, 'wb')
+        self._wav.setnchannels(self.channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.sample_rate)
+        self._clip_frames = 0
+        self._silent_frames = 0
+
+    def _append(self, data):
+        self._wav.writeframes(data)
+        self._clip_frames += len(data) // (2 * self.channels)
+
+    def _close_clip(self):
+        if self._wav is None:
+            return
+        self._wav.close()
+        self._wav = None
+        if self.split_on_silence and self._clip_frames < self.min_clip_s * self.sample_rate:
+            # Coughs and clicks are not worth keeping as training clips
+            os.remove(self._clip_path)
+            self._next_index -= 1
+        else:
+            self.clips.append(self._clip_path)
+            if self.show_meter:
+                print(f"\nSaved {self._clip_path} ({self._clip_frames / self.sample_rate:.1f}s)")
+
+    def _print_meter(self, width=30):
+        filled = int(np.clip((self.level_db + 60) / 60, 0, 1) * width)
+        state = "REC " if self._wav is not None else "wait"
+        print(f"\r[{'#' * filled}{' ' * (width - filled)}] {self.level_db:6.1f} dBFS  {state}  "
+              f"clips {len(self.clips)}  dropped {self.dropped_frames}", end="", flush=True)
+
+    def get_stats(self):
+        return {
+            'clips': len(self.clips),
+            'seconds_captured': self.frames_captured / self.sample_rate,
+            'dropped_frames': self.dropped_frames,
+            'input_overflows': self.overflows,
+            'peak_db': self.peak_db,
+        }
+
+
+def record_audio(filename, duration=10, sample_rate=None, channels=1, chunk=1024):
     """Record audio from microphone"""
-    audio = pyaudio.PyAudio()
-    
     print(f"Recording {duration} seconds of audio...")
     print("Speak now!")
-    
-    stream = audio.open(
-        format=pyaudio.paInt16,
-        channels=channels,
-        rate=sample_rate,
-        input=True,
-        frames_per_buffer=chunk
-    )
-    
-    frames = []
-    
-    for i in range(0, int(sample_rate / chunk * duration)):
-        data = stream.read(chunk)
-        frames.append(data)
-    
+
+    recorder = StreamingRecorder(os.path.dirname(filename) or ".", sample_rate=sample_rate,
+                                 channels=channels, chunk=chunk, show_meter=False,
+                                 filename=filename)
+    recorder.record(duration)
+
     print("Recording finished!")
-    
-    stream.stop_stream()
-    stream.close()
-    audio.terminate()
-    
-    # Save the recorded data
-    wf = wave.open(filename, 'wb')
-    wf.setnchannels(channels)
-    wf.setsampwidth(audio.get_sample_size(pyaudio.paInt16))
-    wf.setframerate(sample_rate)
-    wf.writeframes(b''.join(frames))
-    wf.close()
-    
+    if recorder.dropped_frames or recorder.overflows:
+        print(f"Warning: {recorder.dropped_frames} frames dropped, "
+              f"{recorder.overflows} input overflows")
     print(f"Audio saved to {filename}")
 
+
+def record_session(output_dir, prefix="recording", max_duration=None):
+    """Open-ended enrolment session split into clips at pauses; Ctrl+C ends it"""
+    print("Recording session started. Speak naturally and pause between sentences.")
+    print("Press Ctrl+C to finish.\n")
+    recorder = StreamingRecorder(output_dir, prefix=prefix)
+    clips = recorder.record(max_duration)
+    stats = recorder.get_stats()
+    print(f"Session finished: {stats['clips']} clips from {stats['seconds_captured']:.1f}s of audio, "
+          f"{stats['dropped_frames']} dropped frames, peak {stats['peak_db']:.1f} dBFS")
+    return clips
+
+
 if __name__ == "__main__":
-    os.makedirs("data/raw_audio/your_voice", exist_ok=True)
-    
+    parser = argparse.ArgumentParser(description="Record voice samples for cloning")
+    parser.add_argument("--session", action="store_true",
+                        help="Record one open-ended session, split into clips at pauses")
+    parser.add_argument("--output_dir", default="data/raw_audio/your_voice")
+    parser.add_argument("--max_duration", type=float, default=None,
+                        help="Stop a session after this many seconds")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
     print("Voice Recording for AI Training")
-    print("Record several clips of your voice (10 seconds each)")
-    print("Speak clearly and naturally\n")
-    
-    num_recordings = int(input("How many recordings? (3-5 recommended): "))
-    
-    for i in range(num_recordings):
-        filename = f"data/raw_audio/your_voice/recording_{i+1}.wav"
-        input(f"Press Enter to start recording {i+1}...")
-        record_audio(filename, duration=10)
-        print()
-    
-    print("All recordings completed!")
-    print("You can now train your voice clone when Bark finishes downloading.")
\ No newline at end of file
+    if args.session:
+        record_session(args.output_dir, prefix=time.strftime("session_%Y%m%d_%H%M%S"),
+                       max_duration=args.max_duration)
+    else:
+        print("Record several clips of your voice (10 seconds each)")
+        print("Speak clearly and naturally\n")
+
+        num_recordings = int(input("How many recordings? (3-5 recommended): "))
+
+        for i in range(num_recordings):
+            filename = os.path.join(args.output_dir, f"recording_{i+1}.wav")
+            input(f"Press Enter to start recording {i+1}...")
+            record_audio(filename, duration=10)
+            print()
+
+        print("All recordings completed!")
+    print("You can now train your voice clone when Bark finishes downloading.")
@@ -12,6 +12,8 @@ try:
     from src.tts_engine import BarkTTSEngine
     from src.voice_cloning import BarkVoiceCloner
     from src.grok_client import GrokClient
+    from src.barge_in import BargeInMonitor
+    from config.settings import settings
     DEPENDENCIES_AVAILABLE = True
 except ImportError as e:
     print(f"Import error: {e}")
@@ -34,6 +36,7 @@ class AIAgent:
         self.is_listening = False
         self.wake_word = "assistant"
         self.conversation_history = []
+        self.barge_in = settings.agent.barge_in
         
         # Initialize Grok client
         self.grok_client = GrokClient(grok_api_key)
@@ -44,10 +47,7 @@ class AIAgent:
         self.recognizer.pause_threshold = 0.8
         
         # Grok-specific personality traits
-        self.system_prompt = """You are Grok, an AI assistant with a sense of humor and a rebellious streak. 
-        You're helpful, witty, and occasionally sarcastic. You have opinions and aren't afraid to show them.
-        Keep your responses concise, engaging, and human-like. Be authentic and don't shy away from humor when appropriate.
-        Remember: you're talking to a real person, so be engaging and natural in your conversation."""
+        self.system_prompt = settings.agent.system_prompt
     
     def listen_for_wake_word(self, timeout: int = None) -> bool:
         """Listen for wake word to activate agent"""
@@ -111,12 +111,15 @@ class AIAgent:
             messages = [system_message] + self.conversation_history[-8:]
             
             print("Calling Grok API...")
-            # Generate response using Grok
-            response = self.grok_client.create_chat_completion(
+            # Generate response using Grok; one slow upstream call must not
+            # stall the conversation, so the turn has a deadline with hedging
+            # and a cheaper fallback model
+            response = self.grok_client.create_chat_completion_within(
                 messages=messages,
                 model=self.model,
                 temperature=0.8,  # Slightly higher temperature for more creative responses
-                max_tokens=200
+                max_tokens=200,
+                deadline_s=settings.grok.turn_deadline_s
             )
             
             if response:
@@ -138,6 +141,38 @@ class AIAgent:
         """Speak the response using Bark with cloned voice"""
         self.tts_engine.speak(text, self.cloned_voice_name)
     
+    def wait_while_speaking(self) -> bool:
+        """Wait for the current reply to finish; returns True if the user barged in"""
+        if not self.barge_in:
+            self.tts_engine.wait_until_done()
+            return False
+        
+        def on_user_speech():
+            print("User started speaking, stopping playback")
+            self.tts_engine.stop(reason="barge-in")
+        
+        monitor = BargeInMonitor(
+            on_speech=on_user_speech,
+            min_speech_ms=settings.agent.barge_in_min_speech_ms,
+            vad_aggressiveness=settings.agent.vad_aggressiveness,
+            denoise=settings.denoise.capture,
+            playback_level=lambda: self.tts_engine.sink.playback_level,
+            echo_ratio=settings.agent.barge_in_echo_ratio
+        )
+        try:
+            monitor.start()
+        except Exception as e:
+            print(f"Barge-in unavailable: {e}")
+            self.tts_engine.wait_until_done()
+            return False
+        
+        try:
+            self.tts_engine.wait_until_done()
+        finally:
+            # Release the microphone before the next listen
+            monitor.stop()
+        return monitor.triggered.is_set()
+    
     def run_conversation_cycle(self):
         """Run one conversation cycle"""
         user_input = self.listen_for_speech()
@@ -145,6 +180,7 @@ class AIAgent:
             response = self.generate_response(user_input)
             print(f"Grok: {response}")
             self.speak_response(response)
+            self.wait_while_speaking()
     
     def start_continuous_listening(self):
         """Start continuous listening for wake word"""
@@ -156,6 +192,7 @@ class AIAgent:
             if self.listen_for_wake_word(timeout=5):
                 print("How can I help you?")
                 self.speak_response("Hey there! What's on your mind?")
+                self.wait_while_speaking()
                 self.run_conversation_cycle()
             time.sleep(0.1)
     
@@ -180,6 +217,7 @@ class AIAgent:
         print("Grok Voice Interactive mode started.")
         print("Speak your queries. Say 'goodbye' to exit.")
         self.speak_response("Hey! I'm Grok. What would you like to chat about?")
+        self.wait_while_speaking()
         
         while self.is_listening:
             user_input = self.listen_for_speech(timeout=30)
@@ -195,8 +233,10 @@ class AIAgent:
             print(f"You: {user_input}")
             print(f"Grok: {response}")
             self.speak_response(response)
+            # Keep listening while talking so the user can interrupt
+            self.wait_while_speaking()
     
     def stop(self):
         """Stop the AI agent"""
         self.is_listening = False
-        self.tts_engine.stop()
\ No newline at end of file
+        self.tts_engine.close()
\ No newline at end of file
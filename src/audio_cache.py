@@ -0,0 +1,204 @@
+import os
+import threading
+import uuid
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config.settings import settings
+from src.sample_rates import resample
+from src.voice_manifest import hash_file
+
+
+class DecodedAudioCache:
+    """On-disk cache of decoded, resampled audio.
+
+    Entries are float32 ``.npy`` files named by the source file's content
+    hash and the target sample rate, so each file is decoded once per rate
+    no matter how many code paths ask for it. Hits are memory-mapped
+    copy-on-write; the least recently used entries are evicted once the
+    cache grows past ``max_bytes``. The directory is listed once at start
+    and then tracked in memory. Native-rate copies are only written when
+    ``keep_native`` is set or a caller asks for the file's own rate.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache/decoded",
+                 max_bytes: int = 1024 * 1024 * 1024, keep_native: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.keep_native = keep_native
+        self._hashes: Dict[str, Tuple[int, float, str]] = {}  # path -> (size, mtime, hash)
+        self._native: Dict[str, int] = {}  # content hash -> rate of its native entry
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._rescan()
+
+    def _rescan(self):
+        """Rebuild the native index and size total from the directory"""
+        native = {}
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                total += os.path.getsize(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            content_hash, _, tag = name[:-4].rpartition("_")
+            if tag.startswith("native"):
+                native[content_hash] = int(tag[len("native"):])
+        with self._lock:
+            self._native = native
+            self._total_bytes = total
+
+    def _content_hash(self, path: str) -> str:
+        st = os.stat(path)
+        with self._lock:
+            known = self._hashes.get(path)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime:
+            return known[2]
+        content_hash = hash_file(path)
+        with self._lock:
+            self._hashes[path] = (st.st_size, st.st_mtime, content_hash)
+        return content_hash
+
+    def _entry_path(self, content_hash: str, sample_rate: Optional[int], sr: int) -> str:
+        # Native-rate entries carry the decoded rate in their name
+        tag = f"native{sr}" if sample_rate is None else str(sr)
+        return os.path.join(self.cache_dir, f"{content_hash}_{tag}.npy")
+
+    def _find_entry(self, content_hash: str, sample_rate: Optional[int]) -> Optional[Tuple[str, int]]:
+        if sample_rate is None:
+            with self._lock:
+                sr = self._native.get(content_hash)
+            if sr is None:
+                return None
+        else:
+            sr = sample_rate
+        entry = self._entry_path(content_hash, sample_rate, sr)
+        return (entry, sr) if os.path.exists(entry) else None
+
+    def load(self, path: str, sample_rate: Optional[int]) -> Tuple[np.ndarray, int]:
+        """Decode path at sample_rate (None keeps the file's rate), via the cache"""
+        content_hash = self._content_hash(path)
+        found = self._find_entry(content_hash, sample_rate)
+        if found is not None:
+            entry, sr = found
+            try:
+                audio = np.load(entry, mmap_mode='c')
+                os.utime(entry)  # mark as recently used
+                self.hits += 1
+                return audio, sr
+            except (OSError, ValueError):
+                # Truncated or corrupt entry: decode again
+                pass
+
+        self.misses += 1
+        if sample_rate is None:
+            import librosa
+            audio, sr = librosa.load(path, sr=None)
+        else:
+            if self.keep_native or self._find_entry(content_hash, None) is not None:
+                # Decode at the file's own rate (cached too), then convert once
+                native, native_sr = self.load(path, None)
+            else:
+                import librosa
+                native, native_sr = librosa.load(path, sr=None)
+            audio, sr = resample(np.asarray(native), native_sr, sample_rate), sample_rate
+        audio = audio.astype(np.float32, copy=False)
+        self._store(self._entry_path(content_hash, sample_rate, sr), audio)
+        if sample_rate is None:
+            with self._lock:
+                self._native[content_hash] = sr
+        self.evict()
+        return audio, sr
+
+    def _store(self, entry: str, audio: np.ndarray):
+        # Write under a temporary name so readers never see a partial file
+        tmp = f"{entry}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, audio)
+        size = os.path.getsize(tmp)
+        try:
+            replaced = os.path.getsize(entry)
+        except OSError:
+            replaced = 0
+        os.replace(tmp, entry)
+        with self._lock:
+            self._total_bytes += size - replaced
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        if self.size_bytes() <= self.max_bytes:
+            return
+        # Over budget: list the directory once, which also picks up entries
+        # written by other processes sharing it
+        self._rescan()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            full = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        for _, size, name in sorted(entries):
+            if self.size_bytes() <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            content_hash, _, tag = name[:-4].rpartition("_")
+            with self._lock:
+                self._total_bytes -= size
+                if tag.startswith("native"):
+                    self._native.pop(content_hash, None)
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        with self._lock:
+            self._native.clear()
+            self._total_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> DecodedAudioCache:
+    """Process-wide cache configured from settings"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DecodedAudioCache(
+                settings.audio_cache.cache_dir,
+                max_bytes=settings.audio_cache.max_size_mb * 1024 * 1024,
+                keep_native=settings.audio_cache.keep_native
+            )
+        return _cache
+
+
+def load_audio(path: str, sample_rate: Optional[int]) -> Tuple[np.ndarray, int]:
+    """Drop-in for ``librosa.load(path, sr=sample_rate)`` that decodes each file once"""
+    if not settings.audio_cache.enabled:
+        import librosa
+        audio, sr = librosa.load(path, sr=None)
+        if sample_rate is None:
+            return audio, sr
+        return resample(audio, sr, sample_rate), sample_rate
+    return get_audio_cache().load(path, sample_rate)
@@ -0,0 +1,358 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from src.audio_writer import StreamingAudioWriter
+
+
+class RingBuffer:
+    """Fixed-size float32 ring buffer shared by a producer and an audio callback"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._read_pos = 0
+        self._size = 0
+        # Bumped by clear(), so a producer blocked on a full buffer gives up
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+
+    @property
+    def available(self) -> int:
+        with self._lock:
+            return self._size
+
+    @property
+    def fill_level(self) -> float:
+        """Fraction of the buffer currently filled, 0.0 - 1.0"""
+        return self.available / self.capacity
+
+    def write(self, samples: np.ndarray, timeout: Optional[float] = None) -> int:
+        """Append samples, blocking while the buffer is full; returns samples written.
+
+        Returns early, dropping the rest, if the buffer is cleared meanwhile.
+        """
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        written = 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            generation = self._generation
+        while written < len(samples):
+            with self._not_full:
+                while self._size == self.capacity and self._generation == generation:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return written
+                    self._not_full.wait(remaining)
+                if self._generation != generation:
+                    return written
+                n = min(len(samples) - written, self.capacity - self._size)
+                start = (self._read_pos + self._size) % self.capacity
+                first = min(n, self.capacity - start)
+                self._data[start:start + first] = samples[written:written + first]
+                self._data[:n - first] = samples[written + first:written + n]
+                self._size += n
+                written += n
+        return written
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Fill out with buffered samples (zero padded); returns samples read"""
+        with self._lock:
+            n = min(len(out), self._size)
+            first = min(n, self.capacity - self._read_pos)
+            out[:first] = self._data[self._read_pos:self._read_pos + first]
+            out[first:n] = self._data[:n - first]
+            out[n:] = 0.0
+            self._read_pos = (self._read_pos + n) % self.capacity
+            self._size -= n
+            self._not_full.notify_all()
+            return n
+
+    def clear(self):
+        with self._lock:
+            self._read_pos = 0
+            self._size = 0
+            self._generation += 1
+            self._not_full.notify_all()
+
+    def wait_empty(self, timeout: Optional[float] = None) -> bool:
+        with self._not_full:
+            return self._not_full.wait_for(lambda: self._size == 0, timeout)
+
+
+class ChunkCrossfader:
+    """Joins consecutive audio chunks with a short linear crossfade.
+
+    The last ``crossfade_samples`` of each chunk are held back and blended
+    with the start of the next chunk; ``flush`` releases the final tail.
+    """
+
+    def __init__(self, write: Callable[[np.ndarray], object], crossfade_samples: int):
+        self.write = write
+        self.crossfade_samples = crossfade_samples
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def append(self, audio: np.ndarray):
+        audio = np.asarray(audio, dtype=np.float32)
+        n = min(self.crossfade_samples, len(self._tail), len(audio))
+        if n > 0:
+            fade_in = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            blended = self._tail[-n:] * (1.0 - fade_in) + audio[:n] * fade_in
+            self.write(self._tail[:-n])
+            audio = np.concatenate([blended, audio[n:]])
+        else:
+            self.write(self._tail)
+        # Hold back the end of this chunk to blend with the next one
+        keep = min(self.crossfade_samples, len(audio))
+        self._tail = audio[len(audio) - keep:]
+        self.write(audio[:len(audio) - keep])
+
+    def flush(self):
+        self.write(self._tail)
+        self._tail = np.zeros(0, dtype=np.float32)
+
+    def reset(self):
+        self._tail = np.zeros(0, dtype=np.float32)
+
+
+class AudioSink:
+    """Destination for synthesized audio; chunks are crossfaded on the way in"""
+
+    def __init__(self, sample_rate: int, crossfade_ms: float = 10.0):
+        self.sample_rate = sample_rate
+        # Running dry only counts as an underrun mid-utterance
+        self._in_utterance = False
+        # time.monotonic() of the first chunk of the latest utterance
+        self.utterance_started_at = None
+        # Held by the producer around crossfader updates; stop() bumps the
+        # generation first so a producer blocked mid-chunk writes nothing more
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._write_generation = 0
+        self._crossfader = ChunkCrossfader(self._emit, int(crossfade_ms / 1000.0 * sample_rate))
+        # RMS of the last few blocks played, covering the output latency
+        self._played_levels = deque(maxlen=8)
+
+    def _note_played(self, block: np.ndarray):
+        """Called by real-time sinks for every block handed to the device"""
+        self._played_levels.append(float(np.sqrt(np.mean(block ** 2))) if len(block) else 0.0)
+
+    @property
+    def playback_level(self) -> float:
+        """Peak RMS of what was played recently, 0.0 when silent; an echo reference"""
+        return max(self._played_levels, default=0.0)
+
+    def _emit(self, samples: np.ndarray):
+        if self._write_generation == self._generation:
+            self._write(samples)
+
+    def write(self, audio: np.ndarray):
+        """Queue one chunk of an utterance"""
+        with self._lock:
+            self._write_generation = self._generation
+            if not self._in_utterance:
+                self.utterance_started_at = time.monotonic()
+            self._in_utterance = True
+            self._crossfader.append(audio)
+
+    def end_utterance(self):
+        """Mark the end of an utterance so its held-back tail is emitted"""
+        with self._lock:
+            self._write_generation = self._generation
+            self._crossfader.flush()
+            self._in_utterance = False
+
+    @property
+    def fill_level(self) -> float:
+        """How full the sink's buffer is, for producer flow control"""
+        return 0.0
+
+    @property
+    def buffered_seconds(self) -> float:
+        """Audio queued ahead of the playhead; infinite for sinks that do not play in real time"""
+        return float('inf')
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything written so far has been played"""
+        return True
+
+    def stop(self):
+        """Drop any audio that has not been played yet"""
+        self._generation += 1
+        # Unblock a producer waiting on a full buffer before taking the lock
+        self._interrupt()
+        with self._lock:
+            self._in_utterance = False
+            self._crossfader.reset()
+            # Anything a producer slipped in while we waited for the lock
+            self._interrupt()
+
+    def close(self):
+        self.end_utterance()
+
+    def _interrupt(self):
+        """Discard queued audio and wake a blocked _write"""
+
+    def _write(self, samples: np.ndarray):
+        raise NotImplementedError
+
+
+class SoundDeviceSink(AudioSink):
+    """Persistent callback-driven output stream fed from a ring buffer"""
+
+    def __init__(self, sample_rate: int, crossfade_ms: float = 10.0,
+                 buffer_seconds: float = 10.0, blocksize: int = 1024,
+                 device: Optional[int] = None):
+        super().__init__(sample_rate, crossfade_ms)
+        self.buffer = RingBuffer(int(buffer_seconds * sample_rate))
+        self.blocksize = blocksize
+        self.device = device
+        self.underruns = 0
+        self._playing = False
+        self._stream = None
+
+    def _callback(self, outdata, frames, time_info, status):
+        n = self.buffer.read_into(outdata[:, 0])
+        self._note_played(outdata[:n, 0])
+        if n < frames and self._playing and self._in_utterance:
+            self.underruns += 1
+        self._playing = n > 0
+
+    def _ensure_stream(self):
+        if self._stream is None:
+            import sounddevice as sd
+            # Opened once and kept running; silence is output while idle
+            self._stream = sd.OutputStream(
+                samplerate=self.sample_rate,
+                channels=1,
+                dtype='float32',
+                blocksize=self.blocksize,
+                device=self.device,
+                callback=self._callback
+            )
+            self._stream.start()
+
+    def _write(self, samples: np.ndarray):
+        self._ensure_stream()
+        self.buffer.write(samples)
+
+    @property
+    def fill_level(self) -> float:
+        return self.buffer.fill_level
+
+    @property
+    def buffered_seconds(self) -> float:
+        return self.buffer.available / self.sample_rate
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        return self.buffer.wait_empty(timeout)
+
+    def _interrupt(self):
+        self.buffer.clear()
+
+    def close(self):
+        super().close()
+        self.drain(timeout=self.buffer.capacity / self.sample_rate)
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class FileSink(AudioSink):
+    """Writes everything that is played to a sound file (.wav, .flac or .opus)"""
+
+    def __init__(self, path: str, sample_rate: int, crossfade_ms: float = 10.0):
+        super().__init__(sample_rate, crossfade_ms)
+        self.path = path
+        self._file = StreamingAudioWriter(path, sample_rate)
+
+    def _write(self, samples: np.ndarray):
+        if len(samples):
+            self._file.write(samples)
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class NullSink(AudioSink):
+    """Discards audio; with realtime=True it drains at playback speed.
+
+    Used to run and benchmark the playback path on machines without an
+    audio device.
+    """
+
+    def __init__(self, sample_rate: int, crossfade_ms: float = 10.0,
+                 realtime: bool = False, buffer_seconds: float = 10.0,
+                 blocksize: int = 1024):
+        super().__init__(sample_rate, crossfade_ms)
+        self.realtime = realtime
+        self.samples_written = 0
+        self.underruns = 0
+        self.blocksize = blocksize
+        self.buffer = RingBuffer(int(buffer_seconds * sample_rate)) if realtime else None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def _consume(self):
+        block = np.zeros(self.blocksize, dtype=np.float32)
+        period = self.blocksize / self.sample_rate
+        next_tick = time.monotonic()
+        playing = False
+        while not self._stop_event.is_set():
+            n = self.buffer.read_into(block)
+            self._note_played(block[:n])
+            if n < self.blocksize and playing and self._in_utterance:
+                self.underruns += 1
+            playing = n > 0
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def _write(self, samples: np.ndarray):
+        self.samples_written += len(samples)
+        if self.buffer is not None:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._consume, daemon=True)
+                self._thread.start()
+            self.buffer.write(samples)
+
+    @property
+    def fill_level(self) -> float:
+        return self.buffer.fill_level if self.buffer is not None else 0.0
+
+    @property
+    def buffered_seconds(self) -> float:
+        if self.buffer is None:
+            return float('inf')
+        return self.buffer.available / self.sample_rate
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        return self.buffer.wait_empty(timeout) if self.buffer is not None else True
+
+    def _interrupt(self):
+        if self.buffer is not None:
+            self.buffer.clear()
+
+    def close(self):
+        super().close()
+        self.drain()
+        self._stop_event.set()
+
+
+def create_sink(kind: str, sample_rate: int, crossfade_ms: float = 10.0,
+                path: Optional[str] = None, buffer_seconds: float = 10.0) -> AudioSink:
+    """Build a sink by name: 'sounddevice', 'file' or 'null'"""
+    if kind == "sounddevice":
+        return SoundDeviceSink(sample_rate, crossfade_ms, buffer_seconds)
+    if kind == "file":
+        if not path:
+            raise ValueError("File sink needs an output path")
+        return FileSink(path, sample_rate, crossfade_ms)
+    if kind == "null":
+        return NullSink(sample_rate, crossfade_ms, realtime=True, buffer_seconds=buffer_seconds)
+    raise ValueError(f"Unknown audio sink '{kind}'")
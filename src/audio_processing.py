@@ -5,18 +5,21 @@ import os
 from pydub import AudioSegment, effects
 from pydub.silence import split_on_silence
 import speech_recognition as sr
-from typing import List, Tuple
-import noisereduce as nr
+from typing import List, Optional, Tuple
+from src.audio_cache import load_audio
+from src.denoise import NoiseProfile, denoise_array, estimate_profile
+from config.settings import settings
 
 class AudioProcessor:
-    def __init__(self, sample_rate=22050):
-        self.sample_rate = sample_rate
+    def __init__(self, sample_rate=None):
+        self.sample_rate = sample_rate or settings.audio.sample_rate
         self.recognizer = sr.Recognizer()
     
     def load_audio(self, file_path: str) -> Tuple[np.ndarray, int]:
         """Load audio file and convert to target sample rate"""
         try:
-            audio, sr = librosa.load(file_path, sr=self.sample_rate)
+            # Decoded once per file and rate, then served from the cache
+            audio, sr = load_audio(file_path, self.sample_rate)
             return audio, sr
         except Exception as e:
             raise Exception(f"Error loading audio: {str(e)}")
@@ -25,10 +28,28 @@ class AudioProcessor:
         """Save audio to file"""
         sf.write(file_path, audio, self.sample_rate)
     
-    def preprocess_audio(self, audio: np.ndarray) -> np.ndarray:
+    def _gate_options(self) -> dict:
+        config = settings.denoise
+        return {
+            'n_std_thresh': config.n_std_thresh,
+            'prop_decrease': config.prop_decrease,
+            'time_smoothing': config.time_smoothing,
+        }
+
+    def device_noise_profile(self, device_name: str = "default") -> Optional[NoiseProfile]:
+        """Persisted noise profile for a capture device, if one matches this rate"""
+        profile = NoiseProfile.load(NoiseProfile.path_for_device(device_name, settings.denoise.profiles_dir))
+        if profile is not None and profile.sample_rate != self.sample_rate:
+            return None
+        return profile
+
+    def preprocess_audio(self, audio: np.ndarray, noise_profile: Optional[NoiseProfile] = None) -> np.ndarray:
         """Preprocess audio: noise reduction, normalization"""
-        # Noise reduction
-        audio_clean = nr.reduce_noise(y=audio, sr=self.sample_rate)
+        # Streaming spectral gate; the profile comes from the quietest frames if not given
+        if noise_profile is None:
+            noise_profile = estimate_profile(audio, self.sample_rate, settings.denoise.n_fft)
+        audio_clean = denoise_array(audio.astype(np.float32), self.sample_rate, noise_profile,
+                                    **self._gate_options())
         
         # Normalize audio
         audio_normalized = effects.normalize(
@@ -69,9 +90,10 @@ class AudioProcessor:
         
         return valid_chunks
     
-    def record_audio(self, duration: int = 5, output_path: str = None) -> np.ndarray:
+    def record_audio(self, duration: int = 5, output_path: str = None,
+                     denoise: bool = False, device_name: str = "default") -> np.ndarray:
         """Record audio from microphone"""
-        with sr.Microphone() as source:
+        with sr.Microphone(sample_rate=self.sample_rate) as source:
             print("Recording...")
             self.recognizer.adjust_for_ambient_noise(source)
             audio_data = self.recognizer.record(source, duration=duration)
@@ -80,6 +102,15 @@ class AudioProcessor:
             audio = np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)
             audio = audio.astype(np.float32) / 32768.0
             
+            if denoise:
+                # Estimated once per device, then reused by later sessions
+                profile = self.device_noise_profile(device_name)
+                if profile is None:
+                    profile = estimate_profile(audio, self.sample_rate, settings.denoise.n_fft)
+                    if profile is not None:
+                        profile.save(NoiseProfile.path_for_device(device_name, settings.denoise.profiles_dir))
+                audio = denoise_array(audio, self.sample_rate, profile, **self._gate_options())
+            
             if output_path:
                 self.save_audio(audio, output_path)
             
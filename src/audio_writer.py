@@ -0,0 +1,263 @@
+import os
+import struct
+import threading
+import uuid
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import soundfile as sf
+
+# Container and codec per output format. PCM_16 halves the size of the float
+# WAVs scipy used to write and is what every player expects; FLAC is
+# lossless at roughly half of that again and Opus is a small fraction of it.
+FORMATS = {
+    'wav': ('WAV', 'PCM_16'),
+    'flac': ('FLAC', 'PCM_16'),
+    'opus': ('OGG', 'OPUS'),
+    'ogg': ('OGG', 'OPUS'),
+}
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+# Formats a reader can decode from a ByteChunkStream. libsndfile writes FLAC's
+# STREAMINFO with an 'unknown' sample count that it only fills in by seeking
+# back on close; libsndfile 1.2 then reports 2**63 - 1 frames for such a file
+# and cannot read it, so FLAC is only written to seekable targets.
+STREAMABLE_FORMATS = ('wav', 'opus', 'ogg')
+STREAMING_SIZE = 0xFFFFFFFF  # RIFF/data size for a WAV of unknown length
+
+
+def streaming_wav_header(sample_rate: int, channels: int = 1) -> bytes:
+    """16-bit PCM WAV header whose sizes say 'until the stream ends'"""
+    block_align = 2 * channels
+    return (b"RIFF" + struct.pack("<I", STREAMING_SIZE) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate,
+                                    sample_rate * block_align, block_align, 16)
+            + b"data" + struct.pack("<I", STREAMING_SIZE))
+
+
+def format_for_path(path: str, default: str = "wav") -> str:
+    """Output format implied by a file extension"""
+    ext = os.path.splitext(str(path))[1].lower().lstrip(".")
+    return ext if ext in FORMATS else default
+
+
+class ByteChunkStream:
+    """Write-only file object that hands encoded bytes to a reader as they are produced.
+
+    Meant as the target of a StreamingAudioWriter feeding an HTTP response
+    or socket. At most ``max_buffer_bytes`` wait for the reader; beyond that
+    the encoder blocks, so a slow client throttles synthesis rather than
+    growing memory. Bytes already handed out cannot be changed, so only
+    formats whose headers need no patching on close are streamed (see
+    STREAMABLE_FORMATS); WAV is written with the conventional streaming sizes.
+    """
+
+    def __init__(self, max_buffer_bytes: int = 256 * 1024):
+        self.max_buffer_bytes = max_buffer_bytes
+        self._chunks = deque()
+        self._buffered = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._abandoned = False
+        self._pos = 0
+        self._end = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        size = len(data)
+        if self._pos < self._end:
+            # Rewriting bytes that were already sent; drop them
+            skip = min(size, self._end - self._pos)
+            self._pos += skip
+            data = data[skip:]
+        if data:
+            with self._cond:
+                while self._buffered >= self.max_buffer_bytes and not self._abandoned:
+                    self._cond.wait()
+                if not self._abandoned:
+                    self._chunks.append(data)
+                    self._buffered += len(data)
+                    self._cond.notify_all()
+            self._pos += len(data)
+            self._end = self._pos
+        return size
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = (0, self._pos, self._end)[whence]
+        self._pos = max(0, min(base + offset, self._end))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        return b""
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """No more bytes will be written; the reader drains what is left"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def abandon(self):
+        """The reader has gone away; discard further writes instead of blocking"""
+        with self._cond:
+            self._abandoned = True
+            self._chunks.clear()
+            self._buffered = 0
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            with self._cond:
+                while not self._chunks and not self._closed:
+                    self._cond.wait()
+                if not self._chunks:
+                    return
+                chunk = self._chunks.popleft()
+                self._buffered -= len(chunk)
+                self._cond.notify_all()
+            yield chunk
+
+
+class StreamingAudioWriter:
+    """Encodes audio incrementally as chunks arrive.
+
+    The target is a file path, a seekable file object such as io.BytesIO,
+    or a ByteChunkStream for sending WAV or Opus while synthesis is still
+    running.
+    File paths are written to a temporary name and moved into place on
+    close, so readers never see a half-written render.
+    """
+
+    def __init__(self, target, sample_rate: int, fmt: Optional[str] = None,
+                 channels: int = 1, compression_level: Optional[float] = None):
+        if fmt is None:
+            fmt = format_for_path(target) if isinstance(target, (str, os.PathLike)) else "wav"
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported audio format '{fmt}' (choose from {', '.join(FORMATS)})")
+        major, subtype = FORMATS[fmt]
+        if subtype == 'OPUS' and sample_rate not in OPUS_RATES:
+            raise ValueError(f"Opus cannot encode {sample_rate} Hz; resample to one of {OPUS_RATES}")
+
+        self.format = fmt
+        self.sample_rate = sample_rate
+        self.frames_written = 0
+        self.path = None
+        self._tmp_path = None
+        self._stream = target if isinstance(target, ByteChunkStream) else None
+        if self._stream is not None and fmt not in STREAMABLE_FORMATS:
+            raise ValueError(f"'{fmt}' cannot be streamed (choose from {', '.join(STREAMABLE_FORMATS)})")
+        self._file = None
+        if self._stream is not None and major == 'WAV':
+            # libsndfile would leave a header claiming zero samples; PCM
+            # needs no encoder, so write it straight through
+            self._stream.write(streaming_wav_header(sample_rate, channels))
+            return
+        if isinstance(target, (str, os.PathLike)):
+            self.path = os.fspath(target)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            target = self._tmp_path
+        self._file = sf.SoundFile(target, 'w', samplerate=sample_rate, channels=channels,
+                                  format=major, subtype=subtype,
+                                  compression_level=compression_level)
+
+    @property
+    def seconds_written(self) -> float:
+        return self.frames_written / self.sample_rate
+
+    def write(self, audio: np.ndarray):
+        """Encode one chunk of float audio in [-1, 1]"""
+        audio = np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0)
+        if not len(audio):
+            return
+        if self._file is None:
+            self._stream.write((audio * 32767.0).astype('<i2').tobytes())
+        else:
+            self._file.write(audio)
+        self.frames_written += len(audio)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed if self._file is not None else self._stream.closed
+
+    def close(self):
+        if self.closed:
+            return
+        if self._file is not None:
+            self._file.close()
+        if self._tmp_path is not None:
+            os.replace(self._tmp_path, self.path)
+        if self._stream is not None:
+            self._stream.close()
+
+    def abort(self):
+        """Stop writing and leave no partial file behind"""
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        if self._tmp_path is not None and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        if self._stream is not None:
+            self._stream.close()
+
+    def __enter__(self) -> "StreamingAudioWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_audio(path: str, audio: np.ndarray, sample_rate: int, fmt: Optional[str] = None,
+                compression_level: Optional[float] = None):
+    """Write a whole render in the format implied by path (or fmt)"""
+    with StreamingAudioWriter(path, sample_rate, fmt, compression_level=compression_level) as writer:
+        writer.write(audio)
+
+
+def stream_encoded(chunks: Iterable[np.ndarray], sample_rate: int, fmt: str = "opus",
+                   max_buffer_bytes: Optional[int] = None,
+                   compression_level: Optional[float] = None) -> Iterator[bytes]:
+    """Encode chunks on a background thread, yielding bytes as soon as they exist.
+
+    The first bytes go out while later chunks are still being synthesized.
+    Closing the generator early (client disconnected) stops the encoder
+    from blocking on the full buffer.
+    """
+    if max_buffer_bytes is None:
+        from config.settings import settings
+        max_buffer_bytes = settings.audio.stream_buffer_kb * 1024
+    stream = ByteChunkStream(max_buffer_bytes)
+    # Created here so a bad format fails in the caller, not the thread
+    writer = StreamingAudioWriter(stream, sample_rate, fmt, compression_level=compression_level)
+    errors = []
+
+    def encode():
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            writer.close()
+        except Exception as e:
+            errors.append(e)
+            writer.abort()
+
+    thread = threading.Thread(target=encode, name="audio-encoder", daemon=True)
+    thread.start()
+    try:
+        yield from stream
+    finally:
+        stream.abandon()
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,135 @@
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+from src.denoise import LiveDenoiser
+from src.sample_rates import VAD_RATE
+
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+
+class BargeInMonitor:
+    """Watches the microphone while the assistant speaks and fires when the user talks.
+
+    Frames are classified with webrtcvad when it is installed, otherwise by
+    RMS energy. ``on_speech`` is called once, off the audio thread, after
+    ``min_speech_ms`` of consecutive speech. With ``denoise`` the frames are
+    cleaned before classification, and frames classified as non-speech keep
+    the device's noise profile up to date.
+
+    There is no echo cancellation. ``playback_level`` (e.g. the sink's
+    ``playback_level``) is the echo reference: while the assistant is audible
+    a frame only counts as speech if the microphone is at least
+    ``echo_ratio`` times louder than the playback, and the noise profile is
+    not adapted, so loudspeaker bleed neither triggers nor trains it.
+    """
+
+    def __init__(self, on_speech: Callable[[], None],
+                 sample_rate: int = VAD_RATE,
+                 frame_ms: int = 30,
+                 min_speech_ms: int = 240,
+                 vad_aggressiveness: int = 3,
+                 energy_threshold: float = 0.02,
+                 device: Optional[int] = None,
+                 denoise: bool = False,
+                 playback_level: Optional[Callable[[], float]] = None,
+                 echo_ratio: float = 0.5):
+        self.on_speech = on_speech
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        self.frames_needed = max(1, min_speech_ms // frame_ms)
+        self.energy_threshold = energy_threshold
+        self.device = device
+        self.vad = webrtcvad.Vad(vad_aggressiveness) if WEBRTCVAD_AVAILABLE else None
+        self.triggered = threading.Event()
+        self.denoise = denoise
+        self.playback_level = playback_level
+        self.echo_ratio = echo_ratio
+        self._denoiser = None
+        self._clean = np.zeros(0, dtype=np.float32)
+        self._speech_frames = 0
+        self._stream = None
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        if self.vad is not None:
+            return self.vad.is_speech(frame.tobytes(), self.sample_rate)
+        rms = np.sqrt(np.mean((frame.astype(np.float32) / 32768.0) ** 2))
+        return rms > self.energy_threshold
+
+    def _above_echo(self, frame: np.ndarray, playback: float) -> bool:
+        """Whether the microphone is loud enough not to be just the assistant's own voice"""
+        if playback <= 0.0:
+            return True
+        rms = np.sqrt(np.mean((frame.astype(np.float32) / 32768.0) ** 2))
+        return rms >= self.echo_ratio * playback
+
+    def _callback(self, indata, frames, time_info, status):
+        if self.triggered.is_set():
+            return
+        frame = indata[:, 0]
+        playback = self.playback_level() if self.playback_level is not None else 0.0
+        loud_enough = self._above_echo(frame, playback)
+        if self._denoiser is None:
+            self._observe(loud_enough and self._is_speech(frame))
+            return
+        # The raw frame's label only decides whether it may update the
+        # profile; never while playback could be bleeding into the microphone
+        is_noise = playback <= 0.0 and not self._is_speech(frame)
+        clean = self._denoiser.process(frame / 32768.0, is_noise=is_noise)
+        self._clean = np.concatenate([self._clean, clean])
+        # The denoiser emits whole hops; the VAD wants whole frames
+        while len(self._clean) >= self.frame_samples and not self.triggered.is_set():
+            block, self._clean = self._clean[:self.frame_samples], self._clean[self.frame_samples:]
+            pcm = (np.clip(block, -1.0, 1.0) * 32767.0).astype(np.int16)
+            self._observe(loud_enough and self._is_speech(pcm))
+
+    def _observe(self, speech: bool):
+        if speech:
+            self._speech_frames += 1
+        else:
+            self._speech_frames = 0
+        if self._speech_frames >= self.frames_needed:
+            self.triggered.set()
+            # Never run user code on the audio thread
+            threading.Thread(target=self.on_speech, daemon=True).start()
+
+    def start(self):
+        """Open the capture stream and start listening"""
+        # Imported here so headless runs never need PortAudio
+        import sounddevice as sd
+        self.triggered.clear()
+        self._speech_frames = 0
+        if self.denoise:
+            from config.settings import settings
+            config = settings.denoise
+            device_name = sd.query_devices(self.device, kind='input')['name']
+            self._denoiser = LiveDenoiser(
+                self.sample_rate, device_name, config.profiles_dir, config.n_fft,
+                n_std_thresh=config.n_std_thresh, prop_decrease=config.prop_decrease,
+                time_smoothing=config.time_smoothing, adapt_rate=config.adapt_rate
+            )
+            self._clean = np.zeros(0, dtype=np.float32)
+        self._stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype='int16',
+            blocksize=self.frame_samples,
+            device=self.device,
+            callback=self._callback
+        )
+        self._stream.start()
+
+    def stop(self):
+        """Close the capture stream so the microphone is free again"""
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        if self._denoiser is not None:
+            self._denoiser.save()
+            self._denoiser = None
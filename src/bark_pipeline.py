@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.cancellation import check_cancelled
+from src.cpu_profile import models_version
+from src.bark_stages import (
+    decode_batch,
+    generate_coarse_batch,
+    generate_fine_batch,
+    generate_semantic_batch,
+)
+
+
+class SemanticTokenCache:
+    """Thread-safe LRU of semantic tokens keyed by loaded models, voice, text and temperature"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(voice_key: str, text: str, temperature: float) -> Tuple[int, str, str, float]:
+        return (models_version(), voice_key, " ".join(text.split()), round(temperature, 3))
+
+    def get(self, key) -> Optional[np.ndarray]:
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+    def put(self, key, tokens: np.ndarray):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = tokens
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class BarkStagePipeline:
+    """Runs Bark's stages on separate workers so chunks overlap.
+
+    Each stage has a single worker and jobs are queued in chunk order, so
+    chunk 2's text->semantic pass runs while chunk 1 is in coarse or fine.
+    """
+
+    def __init__(self, semantic_cache: Optional[SemanticTokenCache] = None,
+                 use_kv_caching: bool = True, fine_temperature: float = 0.5):
+        self.semantic_cache = semantic_cache if semantic_cache is not None else SemanticTokenCache()
+        self.use_kv_caching = use_kv_caching
+        self.fine_temperature = fine_temperature
+        self.semantic_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bark-semantic")
+        self.coarse_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bark-coarse")
+        self.fine_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bark-fine")
+
+    def text_to_semantic(self, text: str, history_prompt, voice_key: str,
+                         temperature: float, cancel_token=None) -> np.ndarray:
+        """Text -> semantic tokens, served from the cache when possible"""
+        check_cancelled(cancel_token)
+        key = SemanticTokenCache.make_key(voice_key, text, temperature)
+        tokens = self.semantic_cache.get(key)
+        if tokens is None:
+            tokens = generate_semantic_batch([text], [history_prompt], [temperature],
+                                             use_kv_caching=self.use_kv_caching,
+                                             cancel_token=cancel_token)[0]
+            self.semantic_cache.put(key, tokens)
+        return tokens
+
+    def semantic_to_coarse(self, semantic: np.ndarray, history_prompt,
+                           temperature: float, cancel_token=None) -> np.ndarray:
+        check_cancelled(cancel_token)
+        return generate_coarse_batch([semantic], [history_prompt], [temperature],
+                                     use_kv_caching=self.use_kv_caching,
+                                     cancel_token=cancel_token)[0]
+
+    def coarse_to_audio(self, coarse: np.ndarray, history_prompt,
+                        cancel_token=None) -> np.ndarray:
+        check_cancelled(cancel_token)
+        fine = generate_fine_batch([coarse], [history_prompt], temp=self.fine_temperature,
+                                   cancel_token=cancel_token)[0]
+        return decode_batch([fine], cancel_token=cancel_token)[0]
+
+    def _submit_stages(self, text: str, history_prompt, voice_key: str,
+                       temperature: float, cancel_token) -> Tuple[Future, Future, Future]:
+        semantic = self.semantic_worker.submit(
+            self.text_to_semantic, text, history_prompt, voice_key, temperature, cancel_token
+        )
+        coarse = self.coarse_worker.submit(
+            lambda: self.semantic_to_coarse(semantic.result(), history_prompt,
+                                            temperature, cancel_token)
+        )
+        audio = self.fine_worker.submit(
+            lambda: self.coarse_to_audio(coarse.result(), history_prompt, cancel_token)
+        )
+        return semantic, coarse, audio
+
+    def submit(self, text: str, history_prompt, voice_key: str,
+               temperature: float = 0.7, cancel_token=None) -> Future:
+        """Queue one chunk through all stages; returns a future of the waveform"""
+        return self._submit_stages(text, history_prompt, voice_key, temperature, cancel_token)[-1]
+
+    def render(self, chunks: Sequence[str], history_prompt, voice_key: str,
+               temperature: float = 0.7, cancel_token=None) -> Iterator[np.ndarray]:
+        """Yield waveforms in chunk order as soon as each one is finished"""
+        stages = [self._submit_stages(chunk, history_prompt, voice_key, temperature, cancel_token)
+                  for chunk in chunks]
+        try:
+            for _, _, audio in stages:
+                check_cancelled(cancel_token)
+                yield audio.result()
+        finally:
+            # Drop stage jobs that have not started if the caller stopped early
+            for chunk_stages in stages:
+                for future in chunk_stages:
+                    future.cancel()
+
+    def render_all(self, chunks: Sequence[str], history_prompt, voice_key: str,
+                   temperature: float = 0.7, cancel_token=None) -> List[np.ndarray]:
+        return list(self.render(chunks, history_prompt, voice_key, temperature, cancel_token))
+
+    def shutdown(self):
+        for worker in (self.semantic_worker, self.coarse_worker, self.fine_worker):
+            worker.shutdown(wait=False)
@@ -0,0 +1,475 @@
+import functools
+import numpy as np
+import torch
+import torch.nn.functional as F
+from typing import List, Optional, Sequence
+
+from src.cancellation import check_cancelled
+from src.memory_governor import get_governor
+from src.profiling import profiler_step
+
+try:
+    import bark.generation as bark_gen
+    from bark.generation import (
+        CODEBOOK_SIZE,
+        COARSE_INFER_TOKEN,
+        COARSE_RATE_HZ,
+        COARSE_SEMANTIC_PAD_TOKEN,
+        N_COARSE_CODEBOOKS,
+        N_FINE_CODEBOOKS,
+        SEMANTIC_INFER_TOKEN,
+        SEMANTIC_PAD_TOKEN,
+        SEMANTIC_RATE_HZ,
+        SEMANTIC_VOCAB_SIZE,
+        TEXT_ENCODING_OFFSET,
+        TEXT_PAD_TOKEN,
+    )
+    BARK_AVAILABLE = True
+except ImportError:
+    BARK_AVAILABLE = False
+
+# Batched re-implementations of Bark's generation stages.
+#
+# Bark's own generate_text_semantic / generate_coarse / generate_fine only
+# accept a single sequence. The functions below follow the same sampling
+# logic but run a list of requests through the model as one batch, so the
+# matrix multiplies on CPU see a batch dimension > 1. A batch of one behaves
+# like the upstream implementation.
+#
+# Every sampling step checks the optional cancel_token, so a cancelled
+# request stops burning CPU within one forward pass.
+
+SEMANTIC_CONTEXT_LEN = 256 + 256 + 1
+MAX_SEMANTIC_STEPS = 768
+FINE_WINDOW = 1024
+FINE_HOP = 512
+
+
+def _profiled(label: str):
+    """Label a stage in torch profiler traces (a no-op when no profiler is running)"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # A fresh record_function per call; one shared instance is not thread-safe
+            try:
+                with torch.profiler.record_function(label):
+                    return fn(*args, **kwargs)
+            finally:
+                profiler_step()
+        return wrapper
+    return decorate
+
+
+def _get_model(model_key: str):
+    """Return a loaded Bark sub-model, loading all models if needed"""
+    governor = get_governor()
+    if governor is not None:
+        # Reloads just this model if it was offloaded while idle
+        model = governor.acquire(model_key)
+    else:
+        if model_key not in bark_gen.models:
+            bark_gen.preload_models()
+        model = bark_gen.models[model_key]
+    if bark_gen.OFFLOAD_CPU:
+        target = model["model"] if model_key == "text" else model
+        target.to(bark_gen.models_devices[model_key])
+    return model
+
+
+def _release_model(model_key: str):
+    """Move an offloaded model back to CPU after use"""
+    if bark_gen.OFFLOAD_CPU:
+        model = bark_gen.models[model_key]
+        target = model["model"] if model_key == "text" else model
+        target.to("cpu")
+    governor = get_governor()
+    if governor is not None:
+        governor.release(model_key)
+
+
+def _load_history(history_prompt) -> Optional[dict]:
+    if history_prompt is None:
+        return None
+    return bark_gen._load_history_prompt(history_prompt)
+
+
+def _semantic_input_row(tokenizer, text: str, history: Optional[dict]) -> np.ndarray:
+    """Build the fixed-size [text | semantic history | infer] input row"""
+    text = bark_gen._normalize_whitespace(text)
+    encoded_text = np.array(bark_gen._tokenize(tokenizer, text)) + TEXT_ENCODING_OFFSET
+    encoded_text = encoded_text[:256]
+    encoded_text = np.pad(
+        encoded_text,
+        (0, 256 - len(encoded_text)),
+        constant_values=TEXT_PAD_TOKEN,
+        mode="constant",
+    )
+    if history is not None:
+        semantic_history = history["semantic_prompt"].astype(np.int64)[-256:]
+        semantic_history = np.pad(
+            semantic_history,
+            (0, 256 - len(semantic_history)),
+            constant_values=SEMANTIC_PAD_TOKEN,
+            mode="constant",
+        )
+    else:
+        semantic_history = np.array([SEMANTIC_PAD_TOKEN] * 256)
+    return np.hstack([
+        encoded_text, semantic_history, np.array([SEMANTIC_INFER_TOKEN])
+    ]).astype(np.int64)
+
+
+@_profiled("bark.semantic")
+def generate_semantic_batch(texts: Sequence[str],
+                            history_prompts: Sequence,
+                            temps: Sequence[float],
+                            min_eos_p: float = 0.2,
+                            use_kv_caching: bool = True,
+                            cancel_token=None) -> List[np.ndarray]:
+    """Generate semantic tokens for several texts in one batched pass"""
+    model_container = _get_model("text")
+    try:
+        model = model_container["model"]
+        tokenizer = model_container["tokenizer"]
+        device = next(model.parameters()).device
+
+        rows = [
+            _semantic_input_row(tokenizer, text, _load_history(prompt))
+            for text, prompt in zip(texts, history_prompts)
+        ]
+        results: List[Optional[np.ndarray]] = [None] * len(rows)
+        active = list(range(len(rows)))
+
+        with bark_gen._inference_mode():
+            x = torch.from_numpy(np.stack(rows)).to(device)
+            temp_t = torch.tensor(temps, dtype=torch.float32, device=device)[:, None]
+            kv_cache = None
+            for n in range(MAX_SEMANTIC_STEPS):
+                check_cancelled(cancel_token)
+                if use_kv_caching and kv_cache is not None:
+                    x_input = x[:, [-1]]
+                else:
+                    x_input = x
+                logits, kv_cache = model(
+                    x_input, merge_context=True, use_cache=use_kv_caching, past_kv=kv_cache
+                )
+                relevant_logits = torch.cat(
+                    (logits[:, 0, :SEMANTIC_VOCAB_SIZE], logits[:, 0, [SEMANTIC_PAD_TOKEN]]),
+                    dim=1,
+                )
+                probs = F.softmax(relevant_logits.float() / temp_t, dim=-1)
+                item_next = torch.multinomial(probs, num_samples=1)
+                done = (item_next[:, 0] == SEMANTIC_VOCAB_SIZE) | (probs[:, -1] >= min_eos_p)
+
+                if n == MAX_SEMANTIC_STEPS - 1:
+                    # Out of steps: keep the last token, like Bark does
+                    x = torch.cat((x, item_next), dim=1)
+                    done = torch.ones_like(done)
+                    for row, idx in enumerate(active):
+                        results[idx] = x[row, SEMANTIC_CONTEXT_LEN:].cpu().numpy()
+                    break
+
+                for row in torch.nonzero(done).flatten().tolist():
+                    results[active[row]] = x[row, SEMANTIC_CONTEXT_LEN:].cpu().numpy()
+
+                x = torch.cat((x, item_next), dim=1)
+                if bool(done.any()):
+                    keep = torch.nonzero(~done).flatten()
+                    active = [active[row] for row in keep.tolist()]
+                    if not active:
+                        break
+                    x = x[keep]
+                    temp_t = temp_t[keep]
+                    if kv_cache is not None:
+                        kv_cache = tuple((k[keep], v[keep]) for k, v in kv_cache)
+    finally:
+        _release_model("text")
+    return [r.astype(np.int64) for r in results]
+
+
+class _CoarseRow:
+    """Per-request state for batched coarse generation"""
+
+    def __init__(self, index: int, x_semantic: np.ndarray, history: Optional[dict],
+                 temp: float, max_coarse_history: int, prefix: Optional[np.ndarray] = None):
+        self.index = index
+        self.temp = temp
+        ratio = COARSE_RATE_HZ / SEMANTIC_RATE_HZ * N_COARSE_CODEBOOKS
+        max_semantic_history = int(np.floor(max_coarse_history / ratio))
+
+        if history is not None:
+            x_semantic_history = history["semantic_prompt"]
+            x_coarse_history = bark_gen._flatten_codebooks(history["coarse_prompt"]) + SEMANTIC_VOCAB_SIZE
+            n_semantic_hist = int(np.min([
+                max_semantic_history,
+                len(x_semantic_history) - len(x_semantic_history) % 2,
+                int(np.floor(len(x_coarse_history) / ratio)),
+            ]))
+            n_coarse_hist = int(round(n_semantic_hist * ratio))
+            x_semantic_history = x_semantic_history[-n_semantic_hist:].astype(np.int64)
+            x_coarse_history = x_coarse_history[-n_coarse_hist:].astype(np.int64)
+            # Same time-alignment trim as upstream Bark
+            x_coarse_history = x_coarse_history[:-2]
+        else:
+            x_semantic_history = np.array([], dtype=np.int64)
+            x_coarse_history = np.array([], dtype=np.int64)
+
+        # Continuing an earlier run: its codes become context and sampling
+        # resumes at the step it reached
+        if prefix is None:
+            prefix = np.zeros((N_COARSE_CODEBOOKS, 0), dtype=np.int64)
+        self.prefix = prefix.astype(np.int64)
+        self.start_step = self.prefix.shape[1] * N_COARSE_CODEBOOKS
+        if self.prefix.shape[1]:
+            x_coarse_history = np.hstack([
+                x_coarse_history, bark_gen._flatten_codebooks(self.prefix) + SEMANTIC_VOCAB_SIZE
+            ]).astype(np.int64)
+
+        # Only the last max_coarse_history tokens are ever fed to the model,
+        # so trimming here is lossless and lets rows share one tensor.
+        self.coarse_history = x_coarse_history[-max_coarse_history:]
+        self.semantic = np.hstack([x_semantic_history, x_semantic]).astype(np.int64)
+        self.base_semantic_idx = len(x_semantic_history)
+        self.max_semantic_history = max_semantic_history
+        self.ratio = ratio
+        self.n_steps = int(round(
+            np.floor(len(x_semantic) * ratio / N_COARSE_CODEBOOKS) * N_COARSE_CODEBOOKS
+        ))
+
+    def semantic_window(self, n_step: int) -> np.ndarray:
+        semantic_idx = self.base_semantic_idx + int(round(n_step / self.ratio))
+        window = self.semantic[max(0, semantic_idx - self.max_semantic_history):][:256]
+        return np.pad(window, (0, 256 - len(window)),
+                      constant_values=COARSE_SEMANTIC_PAD_TOKEN, mode="constant")
+
+    def to_codes(self, generated: np.ndarray) -> np.ndarray:
+        codes = generated.reshape(-1, N_COARSE_CODEBOOKS).T - SEMANTIC_VOCAB_SIZE
+        for n in range(1, N_COARSE_CODEBOOKS):
+            codes[n, :] -= n * CODEBOOK_SIZE
+        return np.hstack([self.prefix, codes])
+
+    def stable_frames(self, n_semantic: int) -> int:
+        """Leading frames whose semantic window lies within the first n_semantic tokens"""
+        end = self.base_semantic_idx + n_semantic
+        frames = 0
+        while (frames + 1) * N_COARSE_CODEBOOKS <= self.n_steps:
+            last_step = (frames + 1) * N_COARSE_CODEBOOKS - 1
+            semantic_idx = self.base_semantic_idx + int(round(last_step / self.ratio))
+            if max(0, semantic_idx - self.max_semantic_history) + 256 > end:
+                break
+            frames += 1
+        return frames
+
+
+def _run_coarse_group(model, rows: List[_CoarseRow], results: list,
+                      max_coarse_history: int, sliding_window_len: int,
+                      use_kv_caching: bool, cancel_token=None):
+    """Generate coarse tokens for rows sharing the same history length"""
+    device = next(model.parameters()).device
+    hist_len = len(rows[0].coarse_history)
+    x_coarse = torch.from_numpy(np.stack([r.coarse_history for r in rows])).to(device)
+    n_step = rows[0].start_step
+
+    def finish(keep_mask: List[bool]):
+        nonlocal rows, x_coarse
+        for row, keep in zip(rows, keep_mask):
+            if not keep:
+                generated = x_coarse[rows.index(row), hist_len:].cpu().numpy()
+                results[row.index] = row.to_codes(generated)
+        keep_idx = [i for i, keep in enumerate(keep_mask) if keep]
+        rows = [rows[i] for i in keep_idx]
+        x_coarse = x_coarse[keep_idx]
+        return keep_idx
+
+    while rows:
+        finish([n_step < r.n_steps for r in rows])
+        if not rows:
+            break
+        semantic_in = torch.from_numpy(np.stack([r.semantic_window(n_step) for r in rows])).to(device)
+        infer = torch.full((len(rows), 1), COARSE_INFER_TOKEN, dtype=torch.long, device=device)
+        x_in = torch.cat([semantic_in, infer, x_coarse[:, -max_coarse_history:]], dim=1)
+        temp_t = torch.tensor([r.temp for r in rows], dtype=torch.float32, device=device)[:, None]
+        kv_cache = None
+
+        for _ in range(sliding_window_len):
+            check_cancelled(cancel_token)
+            keep_mask = [n_step < r.n_steps for r in rows]
+            if not all(keep_mask):
+                keep_idx = finish(keep_mask)
+                if not rows:
+                    break
+                x_in = x_in[keep_idx]
+                temp_t = temp_t[keep_idx]
+                if kv_cache is not None:
+                    kv_cache = tuple((k[keep_idx], v[keep_idx]) for k, v in kv_cache)
+
+            is_major_step = n_step % N_COARSE_CODEBOOKS == 0
+            if use_kv_caching and kv_cache is not None:
+                x_input = x_in[:, [-1]]
+            else:
+                x_input = x_in
+            logits, kv_cache = model(x_input, use_cache=use_kv_caching, past_kv=kv_cache)
+            logit_start_idx = SEMANTIC_VOCAB_SIZE + (1 - int(is_major_step)) * CODEBOOK_SIZE
+            logit_end_idx = SEMANTIC_VOCAB_SIZE + (2 - int(is_major_step)) * CODEBOOK_SIZE
+            relevant_logits = logits[:, 0, logit_start_idx:logit_end_idx]
+            probs = F.softmax(relevant_logits.float() / temp_t, dim=-1)
+            item_next = torch.multinomial(probs, num_samples=1) + logit_start_idx
+            x_coarse = torch.cat((x_coarse, item_next), dim=1)
+            x_in = torch.cat((x_in, item_next), dim=1)
+            n_step += 1
+
+
+@_profiled("bark.coarse")
+def generate_coarse_batch(semantic_tokens: Sequence[np.ndarray],
+                          history_prompts: Sequence,
+                          temps: Sequence[float],
+                          max_coarse_history: int = 630,
+                          sliding_window_len: int = 60,
+                          use_kv_caching: bool = True,
+                          cancel_token=None,
+                          prefixes: Optional[Sequence[Optional[np.ndarray]]] = None) -> List[np.ndarray]:
+    """Generate coarse codes for several semantic sequences in batches.
+
+    prefixes optionally gives, per sequence, coarse codes already sampled for
+    its opening (see stable_coarse_frames); generation continues after them
+    and the returned codes include them.
+    """
+    model = _get_model("coarse")
+    if prefixes is None:
+        prefixes = [None] * len(semantic_tokens)
+    try:
+        rows = [
+            _CoarseRow(i, np.asarray(tokens), _load_history(prompt), temp, max_coarse_history, prefix)
+            for i, (tokens, prompt, temp, prefix)
+            in enumerate(zip(semantic_tokens, history_prompts, temps, prefixes))
+        ]
+        results: List[Optional[np.ndarray]] = [None] * len(rows)
+
+        # Rows can only share a forward pass if their coarse context has the same
+        # length and they are at the same step; requests for the same voice
+        # always land in the same group.
+        groups = {}
+        for row in rows:
+            groups.setdefault((len(row.coarse_history), row.start_step), []).append(row)
+
+        with bark_gen._inference_mode():
+            for group in groups.values():
+                _run_coarse_group(model, group, results, max_coarse_history,
+                                  sliding_window_len, use_kv_caching, cancel_token)
+    finally:
+        _release_model("coarse")
+    return results
+
+
+def stable_coarse_frames(n_semantic: int, history_prompt, max_coarse_history: int = 630) -> int:
+    """Coarse frames of a run on n_semantic tokens that a run on a longer sequence can reuse.
+
+    Coarse sampling looks ahead in the semantic sequence, so the last frames
+    of a run on a truncated sequence were conditioned on padding where the
+    longer sequence has speech. Only the frames before that are a valid
+    prefix for generate_coarse_batch.
+    """
+    row = _CoarseRow(0, np.zeros(n_semantic, dtype=np.int64), _load_history(history_prompt),
+                     1.0, max_coarse_history)
+    return row.stable_frames(n_semantic)
+
+
+class _FineRow:
+    """Per-request state for batched fine generation"""
+
+    def __init__(self, index: int, x_coarse: np.ndarray, history: Optional[dict]):
+        self.index = index
+        self.n_coarse = x_coarse.shape[0]
+        in_arr = np.vstack([
+            x_coarse,
+            np.zeros((N_FINE_CODEBOOKS - self.n_coarse, x_coarse.shape[1])) + CODEBOOK_SIZE,
+        ]).astype(np.int64)
+        if history is not None:
+            fine_history = history["fine_prompt"].astype(np.int64)[:, -FINE_HOP:]
+            in_arr = np.hstack([fine_history, in_arr])
+            self.n_history = fine_history.shape[1]
+        else:
+            self.n_history = 0
+        self.n_remove_from_end = 0
+        if in_arr.shape[1] < FINE_WINDOW:
+            self.n_remove_from_end = FINE_WINDOW - in_arr.shape[1]
+            in_arr = np.hstack([
+                in_arr,
+                np.zeros((N_FINE_CODEBOOKS, self.n_remove_from_end), dtype=np.int64) + CODEBOOK_SIZE,
+            ])
+        self.in_arr = in_arr.T
+        self.n_loops = max(0, int(np.ceil(
+            (x_coarse.shape[1] - (FINE_WINDOW - self.n_history)) / FINE_HOP
+        ))) + 1
+
+    def window(self, n: int):
+        start_idx = min(n * FINE_HOP, self.in_arr.shape[0] - FINE_WINDOW)
+        start_fill_idx = min(self.n_history + n * FINE_HOP, self.in_arr.shape[0] - FINE_HOP)
+        return start_idx, start_fill_idx, start_fill_idx - start_idx
+
+    def output(self) -> np.ndarray:
+        gen = self.in_arr.T[:, self.n_history:]
+        if self.n_remove_from_end > 0:
+            gen = gen[:, :-self.n_remove_from_end]
+        return gen
+
+
+@_profiled("bark.fine")
+def generate_fine_batch(coarse_tokens: Sequence[np.ndarray],
+                        history_prompts: Sequence,
+                        temp: Optional[float] = 0.5,
+                        cancel_token=None) -> List[np.ndarray]:
+    """Generate fine codes for several coarse sequences in one batch"""
+    model = _get_model("fine")
+    try:
+        device = next(model.parameters()).device
+        rows = [
+            _FineRow(i, np.asarray(tokens), _load_history(prompt))
+            for i, (tokens, prompt) in enumerate(zip(coarse_tokens, history_prompts))
+        ]
+        n_coarse = rows[0].n_coarse if rows else N_COARSE_CODEBOOKS
+
+        with bark_gen._inference_mode():
+            for n in range(max((r.n_loops for r in rows), default=0)):
+                active = [r for r in rows if n < r.n_loops]
+                windows = [r.window(n) for r in active]
+                in_buffer = torch.from_numpy(np.stack([
+                    r.in_arr[start:start + FINE_WINDOW] for r, (start, _, _) in zip(active, windows)
+                ])).to(device)
+                for nn in range(n_coarse, N_FINE_CODEBOOKS):
+                    check_cancelled(cancel_token)
+                    logits = model(nn, in_buffer)[:, :, :CODEBOOK_SIZE]
+                    if temp is None:
+                        preds = torch.argmax(logits, -1)
+                    else:
+                        probs = F.softmax(logits.float() / temp, dim=-1)
+                        preds = torch.multinomial(
+                            probs.reshape(-1, CODEBOOK_SIZE), num_samples=1
+                        ).reshape(probs.shape[0], probs.shape[1])
+                    for i, (_, _, rel_fill) in enumerate(windows):
+                        in_buffer[i, rel_fill:, nn] = preds[i, rel_fill:]
+                in_buffer = in_buffer.cpu().numpy()
+                for i, (row, (_, start_fill, rel_fill)) in enumerate(zip(active, windows)):
+                    row.in_arr[start_fill:start_fill + (FINE_WINDOW - rel_fill), n_coarse:] = \
+                        in_buffer[i, rel_fill:, n_coarse:]
+    finally:
+        _release_model("fine")
+    return [r.output() for r in rows]
+
+
+@_profiled("bark.decode")
+def decode_batch(fine_tokens: Sequence[np.ndarray], cancel_token=None) -> List[np.ndarray]:
+    """Decode fine codes to waveforms with the Encodec codec"""
+    # Encodec output length depends on the input length, so each sequence is
+    # decoded on its own; the codec is cheap next to the transformer stages.
+    audio = []
+    # codec_decode loads every Bark model if the codec is missing, so make
+    # sure it is resident first
+    _get_model("codec")
+    try:
+        for tokens in fine_tokens:
+            check_cancelled(cancel_token)
+            audio.append(bark_gen.codec_decode(tokens))
+    finally:
+        _release_model("codec")
+    return audio
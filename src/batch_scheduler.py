@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from queue import Queue, Empty
+from typing import List, Optional
+
+import numpy as np
+
+from src.cancellation import AllCancelled, SynthesisCancelled
+from src.bark_stages import (
+    decode_batch,
+    generate_coarse_batch,
+    generate_fine_batch,
+    generate_semantic_batch,
+)
+
+
+@dataclass
+class GenerationRequest:
+    text: str
+    history_prompt: object
+    temperature: float = 0.7
+    cancel_token: object = None
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class BarkBatchScheduler:
+    """Collects concurrent Bark requests and renders them as padded batches.
+
+    A request that arrives alone is dispatched after at most ``max_wait_ms``;
+    requests arriving within that window share the text, coarse and fine
+    forward passes.
+    """
+
+    def __init__(self, max_batch_size: int = 4, max_wait_ms: float = 15.0,
+                 use_kv_caching: bool = True):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.use_kv_caching = use_kv_caching
+        self.request_queue = Queue()
+        self.batches_run = 0
+        self.requests_served = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the batching worker thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._worker)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop the worker; pending requests are failed"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        while not self.request_queue.empty():
+            request = self.request_queue.get()
+            request.future.set_exception(RuntimeError("Batch scheduler stopped"))
+
+    def submit(self, text: str, history_prompt, temperature: float = 0.7,
+               cancel_token=None) -> Future:
+        """Queue a request and return a future resolving to the waveform"""
+        request = GenerationRequest(text, history_prompt, temperature, cancel_token)
+        self.request_queue.put(request)
+        if not self._running:
+            self.start()
+        return request.future
+
+    def generate(self, text: str, history_prompt, temperature: float = 0.7,
+                 timeout: Optional[float] = None, cancel_token=None) -> np.ndarray:
+        """Blocking helper around submit()"""
+        return self.submit(text, history_prompt, temperature, cancel_token).result(timeout=timeout)
+
+    def _collect_batch(self) -> List[GenerationRequest]:
+        try:
+            first = self.request_queue.get(timeout=0.1)
+        except Empty:
+            return []
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.request_queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while self._running:
+            batch = self._collect_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch: List[GenerationRequest]):
+        """Run one batch through all Bark stages and resolve its futures"""
+        # Requests cancelled while queued never enter the batch
+        for request in batch:
+            if request.cancel_token is not None and request.cancel_token.cancelled:
+                request.future.set_exception(SynthesisCancelled(request.cancel_token.reason))
+        batch = [r for r in batch if not r.future.done()]
+        if not batch:
+            return
+
+        try:
+            prompts = [r.history_prompt for r in batch]
+            temps = [r.temperature for r in batch]
+            # Rows share forward passes, so stop only when every request gave up
+            cancel_token = AllCancelled(r.cancel_token for r in batch)
+
+            semantic = generate_semantic_batch([r.text for r in batch], prompts, temps,
+                                               use_kv_caching=self.use_kv_caching,
+                                               cancel_token=cancel_token)
+            coarse = generate_coarse_batch(semantic, prompts, temps,
+                                           use_kv_caching=self.use_kv_caching,
+                                           cancel_token=cancel_token)
+            fine = generate_fine_batch(coarse, prompts, cancel_token=cancel_token)
+            waveforms = decode_batch(fine, cancel_token=cancel_token)
+
+            for request, audio in zip(batch, waveforms):
+                if request.cancel_token is not None and request.cancel_token.cancelled:
+                    request.future.set_exception(SynthesisCancelled(request.cancel_token.reason))
+                else:
+                    request.future.set_result(audio)
+        except SynthesisCancelled as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        except Exception as e:
+            print(f"Error in batched Bark generation: {e}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self.batches_run += 1
+            self.requests_served += len(batch)
+
+    def get_stats(self) -> dict:
+        """Return average batch size and request counters"""
+        return {
+            'batches_run': self.batches_run,
+            'requests_served': self.requests_served,
+            'avg_batch_size': self.requests_served / self.batches_run if self.batches_run else 0.0,
+        }
@@ -0,0 +1,123 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+from bark.generation import SEMANTIC_RATE_HZ
+
+from src.bark_stages import (
+    decode_batch,
+    generate_coarse_batch,
+    generate_fine_batch,
+    generate_semantic_batch,
+    stable_coarse_frames,
+)
+from src.cancellation import CancellationToken, check_cancelled
+
+
+@dataclass
+class Candidate:
+    index: int
+    token: CancellationToken = field(default_factory=CancellationToken)
+    semantic: Optional[np.ndarray] = None
+    speech_rate: float = 0.0  # characters per second implied by the semantic length
+    preview_similarity: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return not self.token.cancelled
+
+    def summary(self) -> dict:
+        return {
+            'index': self.index,
+            'speech_rate': round(self.speech_rate, 2),
+            'preview_similarity': self.preview_similarity,
+            'aborted': self.token.reason if self.token.cancelled else None,
+        }
+
+
+def render_best_of_k(text: str, history_prompt, score: Callable[[np.ndarray], float],
+                     k: int = 4, temperature: float = 0.7, min_similarity: float = 0.9,
+                     probe_seconds: float = 2.0,
+                     speech_rate_range: Tuple[float, float] = (5.0, 30.0),
+                     use_kv_caching: bool = True, fine_temperature: float = 0.5,
+                     cancel_token=None) -> Tuple[Optional[np.ndarray], dict]:
+    """Render k Bark takes side by side and finish only the most promising one.
+
+    All candidates share each stage's forward passes as one batch. Takes are
+    dropped as soon as they are clearly bad: after the semantic stage if the
+    implied speech rate is implausible (truncated or babbling), and after a
+    low-bitrate preview of their first ``probe_seconds`` if it scores below
+    ``min_similarity`` against the speaker. Only the best preview is carried
+    through the full coarse, fine and decode stages, continuing from the
+    coarse tokens of its probe.
+    """
+    start = time.perf_counter()
+    candidates = [Candidate(i) for i in range(k)]
+    report = {'k': k, 'min_similarity': min_similarity}
+
+    semantic = generate_semantic_batch([text] * k, [history_prompt] * k, [temperature] * k,
+                                       use_kv_caching=use_kv_caching, cancel_token=cancel_token)
+    low, high = speech_rate_range
+    for candidate, tokens in zip(candidates, semantic):
+        candidate.semantic = tokens
+        candidate.speech_rate = len(text) / max(len(tokens) / SEMANTIC_RATE_HZ, 1e-3)
+        if not low <= candidate.speech_rate <= high:
+            candidate.token.cancel(f"speech rate {candidate.speech_rate:.1f} chars/s")
+    alive = [c for c in candidates if c.alive]
+    if not alive:
+        # Every take looks off; keep the one closest to a plausible rate
+        target = (low + high) / 2
+        closest = min(candidates, key=lambda c: abs(c.speech_rate - target))
+        closest.token = CancellationToken()
+        alive = [closest]
+    report['semantic_s'] = time.perf_counter() - start
+
+    # Score a preview of the opening of each take; Encodec decodes the two
+    # coarse codebooks alone at 1.5 kbps, which is plenty for a voice match
+    check_cancelled(cancel_token)
+    probe_len = int(probe_seconds * SEMANTIC_RATE_HZ)
+    probing = probe_len > 0 and all(len(c.semantic) >= 2 * probe_len for c in alive)
+    coarse = generate_coarse_batch(
+        [c.semantic[:probe_len] if probing else c.semantic for c in alive],
+        [history_prompt] * len(alive), [temperature] * len(alive),
+        use_kv_caching=use_kv_caching, cancel_token=cancel_token
+    )
+    previews = decode_batch(coarse, cancel_token=cancel_token)
+    for candidate, preview in zip(alive, previews):
+        candidate.preview_similarity = float(score(preview))
+    best_index = int(np.argmax([c.preview_similarity for c in alive]))
+    best = alive[best_index]
+    for candidate in alive:
+        if candidate is not best:
+            reason = "below similarity threshold" if candidate.preview_similarity < min_similarity \
+                else "outscored"
+            candidate.token.cancel(reason)
+    report['preview_s'] = time.perf_counter() - start
+
+    # Let the best take finish
+    check_cancelled(cancel_token)
+    if probing:
+        frames = stable_coarse_frames(probe_len, history_prompt)
+        # The probe's closing frames saw padding instead of the rest of the
+        # take, so only the frames before them are kept; a probe too short to
+        # have any such frames is re-sampled from scratch
+        prefix = coarse[best_index][:, :frames] if frames > 0 else None
+        best_coarse = generate_coarse_batch([best.semantic], [history_prompt], [temperature],
+                                            use_kv_caching=use_kv_caching,
+                                            cancel_token=cancel_token, prefixes=[prefix])[0]
+        report['probe_frames_reused'] = frames
+    else:
+        best_coarse = coarse[best_index]
+    fine = generate_fine_batch([best_coarse], [history_prompt], temp=fine_temperature,
+                               cancel_token=cancel_token)[0]
+    audio = decode_batch([fine], cancel_token=cancel_token)[0]
+
+    report.update({
+        'chosen': best.index,
+        'below_threshold': best.preview_similarity < min_similarity,
+        'similarity': float(score(audio)),
+        'total_s': time.perf_counter() - start,
+        'candidates': [c.summary() for c in candidates],
+    })
+    return audio, report
@@ -0,0 +1,65 @@
+import threading
+from typing import Iterable, Optional
+
+
+class SynthesisCancelled(Exception):
+    """Raised inside the synthesis path when its CancellationToken fires"""
+
+
+class CancellationToken:
+    """Cooperative cancellation flag shared by a request's workers"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason: str = "cancelled"):
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise SynthesisCancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+
+class AllCancelled:
+    """Fires only once every wrapped token has been cancelled (for shared batches)"""
+
+    def __init__(self, tokens: Iterable[Optional[CancellationToken]]):
+        self.tokens = list(tokens)
+
+    @property
+    def cancelled(self) -> bool:
+        return bool(self.tokens) and all(t is not None and t.cancelled for t in self.tokens)
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise SynthesisCancelled("all requests in batch cancelled")
+
+
+class AnyCancelled:
+    """Fires as soon as any wrapped token is cancelled (e.g. request or one chunk)"""
+
+    def __init__(self, tokens: Iterable[Optional[CancellationToken]]):
+        self.tokens = [t for t in tokens if t is not None]
+
+    @property
+    def cancelled(self) -> bool:
+        return any(t.cancelled for t in self.tokens)
+
+    def raise_if_cancelled(self):
+        for token in self.tokens:
+            token.raise_if_cancelled()
+
+
+def check_cancelled(token):
+    """No-op when token is None, otherwise raise SynthesisCancelled if it fired"""
+    if token is not None:
+        token.raise_if_cancelled()
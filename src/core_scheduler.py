@@ -0,0 +1,140 @@
+import os
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def pin_threads(cpus: Sequence[int], threads: int):
+    """Restrict this process to cpus and size torch's intra-op pool to match.
+
+    Affinity is set on every thread of the process, since torch's OpenMP
+    threads already exist and would otherwise keep their old mask.
+    """
+    import torch
+    torch.set_num_threads(max(1, threads))
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = set(cpus)
+    try:
+        task_ids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        task_ids = [0]
+    for tid in task_ids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            # The thread exited while we were iterating
+            pass
+
+
+class CorePartitioner:
+    """Splits the machine's cores into partitions sized for the current load.
+
+    With one generation in flight it gets every core, which gives the
+    lowest latency. As the queue deepens partitions halve, down to
+    ``min_width`` cores, so more generations run side by side without
+    contending for the same cores, which gives the best throughput. Widths
+    are powers of two (or all cores) so partitions tile the machine.
+    """
+
+    def __init__(self, cores: Optional[Sequence[int]] = None, min_width: int = 2,
+                 fixed_width: int = 0, history: int = 500):
+        self.cores = list(cores) if cores is not None else available_cores()
+        self.min_width = max(1, min(min_width, len(self.cores)))
+        self.fixed_width = min(fixed_width, len(self.cores))
+        self._free = set(self.cores)
+        self._lock = threading.Lock()
+        self._history: Dict[int, deque] = defaultdict(lambda: deque(maxlen=history))
+
+    @property
+    def max_partitions(self) -> int:
+        return len(self.cores) // (self.fixed_width or self.min_width)
+
+    def _widths(self) -> List[int]:
+        if self.fixed_width:
+            return [self.fixed_width]
+        widths = {len(self.cores)}
+        width = self.min_width
+        while width < len(self.cores):
+            widths.add(width)
+            width *= 2
+        return sorted(widths, reverse=True)
+
+    def choose_width(self, load: int) -> int:
+        """Widest partition that still lets `load` generations run at once"""
+        share = len(self.cores) / max(1, load)
+        for width in self._widths():
+            if width <= share:
+                return width
+        return self._widths()[-1]
+
+    def allocate(self, load: int) -> Optional[Tuple[int, ...]]:
+        """Reserve cores for one generation, or None if too few are free"""
+        with self._lock:
+            width = self.choose_width(load)
+            if len(self._free) < width:
+                # Take the widest partition that fits in what is left
+                fitting = [w for w in self._widths() if w <= len(self._free)]
+                if not fitting:
+                    return None
+                width = fitting[0]
+            cpus = tuple(sorted(self._free)[:width])
+            self._free.difference_update(cpus)
+            return cpus
+
+    def release(self, cpus: Sequence[int]):
+        with self._lock:
+            self._free.update(cpus)
+
+    @property
+    def free_cores(self) -> int:
+        with self._lock:
+            return len(self._free)
+
+    def record(self, width: int, queue_seconds: float, latency_seconds: float,
+               render_seconds: float, audio_seconds: float):
+        """Log one finished generation for the throughput/latency report"""
+        with self._lock:
+            self._history[width].append((queue_seconds, latency_seconds, render_seconds, audio_seconds))
+
+    def report(self) -> Dict[int, Dict]:
+        """Measured latency and throughput per partition width.
+
+        ``throughput`` is audio seconds produced per wall second if the
+        whole machine ran partitions of that width, which is what to
+        compare against the latency of each width.
+        """
+        with self._lock:
+            history = {width: list(samples) for width, samples in self._history.items()}
+        report = {}
+        for width, samples in sorted(history.items(), reverse=True):
+            queue_s, latency_s, render_s, audio_s = (np.array(column) for column in zip(*samples))
+            rtf = render_s.sum() / max(audio_s.sum(), 1e-9)
+            report[width] = {
+                'jobs': len(samples),
+                'partitions': len(self.cores) // width,
+                'mean_queue_s': float(queue_s.mean()),
+                'p50_latency_s': float(np.percentile(latency_s, 50)),
+                'p95_latency_s': float(np.percentile(latency_s, 95)),
+                'rtf': float(rtf),
+                'throughput': (len(self.cores) // width) / rtf if rtf > 0 else 0.0,
+            }
+        return report
+
+
+def print_partition_report(report: Dict[int, Dict]):
+    print(f"{'cores':>6}{'jobs':>6}{'parts':>7}{'queue':>8}{'p50':>8}{'p95':>8}{'rtf':>7}{'audio s/s':>11}")
+    for width, row in report.items():
+        print(f"{width:>6}{row['jobs']:>6}{row['partitions']:>7}{row['mean_queue_s']:>7.2f}s"
+              f"{row['p50_latency_s']:>7.2f}s{row['p95_latency_s']:>7.2f}s{row['rtf']:>7.2f}"
+              f"{row['throughput']:>11.2f}")
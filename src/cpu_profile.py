@@ -0,0 +1,94 @@
+from typing import Dict
+
+import torch
+import torch.nn as nn
+
+try:
+    import bark.generation as bark_gen
+    from bark import preload_models
+    BARK_AVAILABLE = True
+except ImportError:
+    BARK_AVAILABLE = False
+
+PROFILES = ("default", "cpu_fast")
+
+# Bumped on every load_bark_models call, so results cached from one set of
+# weights (e.g. semantic tokens) are not served after a profile switch
+_models_version = 0
+
+# Sub-models whose transformer Linear layers are quantized. The Encodec
+# codec is convolutional and gains nothing from dynamic quantization.
+QUANTIZABLE_MODELS = ("text", "coarse", "fine")
+
+
+def configure_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """Set torch intra-op and inter-op thread counts (0 keeps the default)"""
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work starts
+            print(f"Could not set inter-op threads: {e}")
+
+
+def quantize_model(key: str) -> bool:
+    """Apply dynamic int8 quantization to one Bark model's Linear layers"""
+    if key not in QUANTIZABLE_MODELS or key not in bark_gen.models:
+        return False
+    container = bark_gen.models[key]
+    model = container["model"] if key == "text" else container
+    if next(model.parameters()).device.type != "cpu":
+        # Dynamic quantization kernels are CPU-only
+        return False
+    model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if key == "text":
+        container["model"] = model
+    else:
+        bark_gen.models[key] = model
+    return True
+
+
+def quantize_bark_models() -> Dict[str, bool]:
+    """Apply dynamic int8 quantization to Bark's transformer Linear layers"""
+    return {key: quantize_model(key) for key in QUANTIZABLE_MODELS}
+
+
+def models_version() -> int:
+    """Identity of the currently loaded Bark weights"""
+    return _models_version
+
+
+def load_bark_models(performance_config, force_reload: bool = False) -> Dict:
+    """Load Bark with the selected performance profile applied"""
+    global _models_version
+    profile = performance_config.profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown performance profile '{profile}', expected one of {PROFILES}")
+
+    if profile == "cpu_fast":
+        configure_threads(performance_config.intra_op_threads,
+                          performance_config.inter_op_threads)
+
+    use_small = performance_config.use_small_models
+    preload_models(
+        text_use_small=use_small,
+        coarse_use_small=use_small,
+        fine_use_small=use_small,
+        force_reload=force_reload
+    )
+
+    quantized = {}
+    if profile == "cpu_fast" and performance_config.quantize_int8:
+        quantized = quantize_bark_models()
+    _models_version += 1
+
+    return {
+        'profile': profile,
+        'small_models': use_small,
+        'quantized': quantized,
+        'use_kv_caching': performance_config.use_kv_caching,
+        'intra_op_threads': torch.get_num_threads(),
+        'inter_op_threads': torch.get_num_interop_threads(),
+    }
@@ -0,0 +1,296 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+def _window(n_fft: int) -> np.ndarray:
+    # sqrt-Hann for both analysis and synthesis: with hop = n_fft / 4 the
+    # squared windows overlap-add to a constant 2.0
+    return np.sqrt(np.hanning(n_fft + 1)[:-1]).astype(np.float32)
+
+
+@dataclass
+class NoiseProfile:
+    """Per-bin magnitude statistics of stationary background noise"""
+    sample_rate: int
+    n_fft: int
+    mean: np.ndarray
+    std: np.ndarray
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, sample_rate=self.sample_rate, n_fft=self.n_fft,
+                 mean=self.mean, std=self.std)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["NoiseProfile"]:
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(int(data['sample_rate']), int(data['n_fft']), data['mean'], data['std'])
+
+    @staticmethod
+    def path_for_device(device_name: str, profiles_dir: str = "data/models/noise_profiles",
+                        sample_rate: Optional[int] = None) -> str:
+        """Where a capture device's profile is persisted (per rate, if given)"""
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', device_name).strip('_') or "default"
+        if sample_rate is not None:
+            slug = f"{slug}_{sample_rate}"
+        return os.path.join(profiles_dir, f"{slug}.npz")
+
+
+class NoiseProfileEstimator:
+    """Builds a noise profile from the quietest frames seen, in constant memory.
+
+    Audio is fed in blocks; only the ``keep_frames`` lowest-energy magnitude
+    spectra are retained, so a whole file or an open-ended live stream can be
+    scanned without holding it.
+    """
+
+    def __init__(self, sample_rate: int, n_fft: int = 1024, hop: int = 256,
+                 keep_frames: int = 64):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.keep_frames = keep_frames
+        self._window = _window(n_fft)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._quietest = []  # max-heap on energy via negated keys
+        self._counter = 0
+
+    def update(self, block: np.ndarray):
+        samples = np.concatenate([self._pending, np.asarray(block, dtype=np.float32)])
+        n_frames = 0 if len(samples) < self.n_fft else 1 + (len(samples) - self.n_fft) // self.hop
+        if n_frames:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop][:n_frames]
+            mags = np.abs(np.fft.rfft(frames * self._window, axis=1))
+            energies = (mags ** 2).sum(axis=1)
+            for energy, mag in zip(energies, mags):
+                self._counter += 1
+                item = (-float(energy), self._counter, mag)
+                if len(self._quietest) < self.keep_frames:
+                    heapq.heappush(self._quietest, item)
+                elif -item[0] < -self._quietest[0][0]:
+                    heapq.heapreplace(self._quietest, item)
+        self._pending = samples[n_frames * self.hop:]
+
+    @property
+    def frames(self) -> int:
+        """Quiet frames held so far (at most keep_frames)"""
+        return len(self._quietest)
+
+    def profile(self) -> Optional[NoiseProfile]:
+        if not self._quietest:
+            return None
+        mags = np.stack([item[2] for item in self._quietest])
+        return NoiseProfile(self.sample_rate, self.n_fft, mags.mean(axis=0), mags.std(axis=0))
+
+
+class StreamingDenoiser:
+    """Spectral gating applied frame by frame with overlap-add.
+
+    Bins whose magnitude stays below the noise mean plus ``n_std_thresh``
+    standard deviations are attenuated by ``prop_decrease``. The gain mask
+    is smoothed over time (one-pole) and across neighbouring bins to avoid
+    musical noise. State is one frame of input and output, so memory is
+    constant and latency is ``n_fft - hop`` samples.
+
+    Blocks passed with ``is_noise=True`` (a VAD found no speech) also update
+    the profile, an exponential average with weight ``adapt_rate`` per frame,
+    so the gate follows a background that changes during a session.
+    """
+
+    def __init__(self, profile: NoiseProfile, hop: Optional[int] = None,
+                 n_std_thresh: float = 1.5, prop_decrease: float = 0.9,
+                 time_smoothing: float = 0.6, adapt_rate: float = 0.02):
+        self.profile = profile
+        self.n_fft = profile.n_fft
+        self.hop = hop or self.n_fft // 4
+        self.window = _window(self.n_fft)
+        self.n_std_thresh = n_std_thresh
+        self.adapt_rate = adapt_rate
+        self._mean = profile.mean.astype(np.float64)
+        self._var = profile.std.astype(np.float64) ** 2
+        self.threshold = profile.mean + n_std_thresh * profile.std
+        self.floor = 1.0 - prop_decrease
+        self.time_smoothing = time_smoothing
+        self._freq_kernel = np.array([0.25, 0.5, 0.25], dtype=np.float32)
+        # Squared sqrt-Hann windows overlap-add to n_fft / (2 * hop)
+        self._norm = self.hop * 2.0 / self.n_fft
+        self.reset()
+
+    def reset(self):
+        self._in = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        self._out = np.zeros(self.n_fft, dtype=np.float32)
+        self._mask = np.ones(self.n_fft // 2 + 1, dtype=np.float32)
+        # Trailing input samples known to be noise only
+        self._noise_run = 0
+
+    def noise_profile(self) -> NoiseProfile:
+        """The profile as adapted so far"""
+        return NoiseProfile(self.profile.sample_rate, self.n_fft,
+                            self._mean.astype(np.float32), np.sqrt(self._var).astype(np.float32))
+
+    def _adapt(self, mags: np.ndarray):
+        rate = self.adapt_rate
+        for mag in mags:
+            delta = mag - self._mean
+            self._mean += rate * delta
+            self._var = (1.0 - rate) * (self._var + rate * delta ** 2)
+        self.threshold = (self._mean + self.n_std_thresh * np.sqrt(self._var)).astype(np.float32)
+
+    def process(self, block: np.ndarray, is_noise: bool = False) -> np.ndarray:
+        """Denoise a block; returns as many samples as whole hops became available"""
+        block = np.asarray(block, dtype=np.float32)
+        samples = np.concatenate([self._in, block])
+        n_frames = 0 if len(samples) < self.n_fft else 1 + (len(samples) - self.n_fft) // self.hop
+        self._noise_run = self._noise_run + len(block) if is_noise else 0
+        output = np.empty(n_frames * self.hop, dtype=np.float32)
+        if n_frames:
+            frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop][:n_frames]
+            spectra = np.fft.rfft(frames * self.window, axis=1)
+            if self._noise_run and self.adapt_rate > 0:
+                # Only frames lying wholly inside the noise-only stretch
+                first = -(-max(0, len(samples) - self._noise_run) // self.hop)
+                self._adapt(np.abs(spectra[first:]))
+            gates = np.where(np.abs(spectra) > self.threshold, 1.0, self.floor).astype(np.float32)
+            # Smooth across bins; edge padding keeps the outermost bins at full gain
+            padded = np.pad(gates, ((0, 0), (1, 1)), mode='edge')
+            kernel = self._freq_kernel
+            gates = kernel[0] * padded[:, :-2] + kernel[1] * padded[:, 1:-1] + kernel[2] * padded[:, 2:]
+            for i in range(n_frames):
+                gate = gates[i]
+                self._mask = self.time_smoothing * self._mask + (1.0 - self.time_smoothing) * gate
+                frame = np.fft.irfft(spectra[i] * self._mask, n=self.n_fft).astype(np.float32)
+                self._out += frame * self.window * self._norm
+                output[i * self.hop:(i + 1) * self.hop] = self._out[:self.hop]
+                self._out = np.concatenate([self._out[self.hop:], np.zeros(self.hop, dtype=np.float32)])
+        self._in = samples[n_frames * self.hop:]
+        return output
+
+    def flush(self) -> np.ndarray:
+        """Push out the samples still held back by the frame latency"""
+        tail = self.process(np.zeros(self.n_fft, dtype=np.float32))
+        self.reset()
+        return tail
+
+
+class LiveDenoiser:
+    """Denoises a live capture stream and keeps its device's noise profile current.
+
+    Starts from the profile stored for the device at this rate or, without
+    one, passes audio through until enough non-speech has been heard to
+    estimate it. Blocks the caller marks as non-speech keep adapting the
+    profile, and ``save`` stores it for the next session.
+    """
+
+    def __init__(self, sample_rate: int, device_name: str = "default",
+                 profiles_dir: str = "data/models/noise_profiles", n_fft: int = 1024,
+                 **gate_options):
+        self.sample_rate = sample_rate
+        self.path = NoiseProfile.path_for_device(device_name, profiles_dir, sample_rate)
+        self.gate_options = gate_options
+        profile = NoiseProfile.load(self.path)
+        if profile is not None and profile.n_fft != n_fft:
+            profile = None
+        self._estimator = NoiseProfileEstimator(sample_rate, n_fft) if profile is None else None
+        self._denoiser = StreamingDenoiser(profile, **gate_options) if profile is not None else None
+
+    @property
+    def active(self) -> bool:
+        return self._denoiser is not None
+
+    def process(self, block: np.ndarray, is_noise: bool = False) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float32)
+        if self._denoiser is None:
+            if is_noise:
+                self._estimator.update(block)
+            if self._estimator.frames < self._estimator.keep_frames:
+                return block
+            self._denoiser = StreamingDenoiser(self._estimator.profile(), **self.gate_options)
+            self._estimator = None
+        return self._denoiser.process(block, is_noise)
+
+    def flush(self) -> np.ndarray:
+        """The samples still held back by the frame latency"""
+        if self._denoiser is None:
+            return np.zeros(0, dtype=np.float32)
+        held = self._denoiser.n_fft - self._denoiser.hop
+        return self._denoiser.flush()[:held]
+
+    def save(self):
+        if self._denoiser is not None:
+            self._denoiser.noise_profile().save(self.path)
+
+
+def _blocks(audio: np.ndarray, block_size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(audio), block_size):
+        yield audio[start:start + block_size]
+
+
+def estimate_profile(audio: np.ndarray, sr: int, n_fft: int = 1024) -> Optional[NoiseProfile]:
+    estimator = NoiseProfileEstimator(sr, n_fft)
+    for block in _blocks(audio, 65536):
+        estimator.update(block)
+    return estimator.profile()
+
+
+def denoise_array(audio: np.ndarray, sr: int, profile: Optional[NoiseProfile] = None,
+                  block_size: int = 4096, **gate_options) -> np.ndarray:
+    """Denoise an in-memory signal; the profile is estimated from it if not given"""
+    profile = profile or estimate_profile(audio, sr)
+    if profile is None:
+        return audio
+    denoiser = StreamingDenoiser(profile, **gate_options)
+    delay = denoiser.n_fft - denoiser.hop
+    parts = [denoiser.process(block) for block in _blocks(audio, block_size)]
+    parts.append(denoiser.flush())
+    # Drop the frame latency so output lines up with the input
+    return np.concatenate(parts)[delay:delay + len(audio)]
+
+
+def gate_signature(n_fft: int = 1024, **gate_options) -> str:
+    """Short hash of the settings that shape denoised output, for cache keys"""
+    options = dict(gate_options, n_fft=n_fft)
+    return hashlib.sha1(json.dumps(options, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def denoise_file(input_path: str, output_path: str, profile: Optional[NoiseProfile] = None,
+                 block_size: int = 65536, n_fft: int = 1024,
+                 **gate_options) -> Optional[NoiseProfile]:
+    """Denoise a file block by block in constant memory; returns the profile used"""
+    import soundfile as sf
+
+    info = sf.info(input_path)
+    if profile is None:
+        # First pass only keeps the quietest frames
+        estimator = NoiseProfileEstimator(info.samplerate, n_fft)
+        for block in sf.blocks(input_path, blocksize=block_size, dtype='float32', always_2d=True):
+            estimator.update(block.mean(axis=1))
+        profile = estimator.profile()
+        if profile is None:
+            return None
+
+    denoiser = StreamingDenoiser(profile, **gate_options)
+    to_skip = denoiser.n_fft - denoiser.hop
+    remaining = info.frames
+    with sf.SoundFile(output_path, 'w', samplerate=info.samplerate, channels=1,
+                      subtype='PCM_16') as out:
+        def write(samples: np.ndarray):
+            nonlocal to_skip, remaining
+            skip = min(to_skip, len(samples))
+            samples = samples[skip:][:remaining]
+            to_skip -= skip
+            remaining -= len(samples)
+            out.write(samples)
+
+        for block in sf.blocks(input_path, blocksize=block_size, dtype='float32', always_2d=True):
+            write(denoiser.process(block.mean(axis=1)))
+        write(denoiser.flush())
+    return profile
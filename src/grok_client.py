@@ -1,27 +1,172 @@
 import requests
 import json
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, List, Optional
 import os
 
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from config.settings import settings
+
+# The attempt running on this thread, so the pool can hand it its connection
+_current = threading.local()
+
+
+class RequestCancelled(Exception):
+    """Raised inside an attempt whose result is no longer wanted"""
+
+
+class _Attempt:
+    """One in-flight request that can be abandoned from another thread.
+
+    Cancelling shuts down the attempt's socket, so a thread still blocked
+    waiting for the response headers returns at once and the connection is
+    dropped instead of being held until the read timeout.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def attach(self, conn):
+        with self._lock:
+            self._conn = conn
+        if self.cancelled:
+            raise RequestCancelled()
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            conn = self._conn
+        sock = getattr(conn, 'sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _attach_to_attempt(conn):
+    attempt = getattr(_current, 'attempt', None)
+    if attempt is not None:
+        attempt.attach(conn)
+    return conn
+
+
+class _TrackedHTTPPool(HTTPConnectionPool):
+    def _get_conn(self, timeout=None):
+        return _attach_to_attempt(super()._get_conn(timeout))
+
+
+class _TrackedHTTPSPool(HTTPSConnectionPool):
+    def _get_conn(self, timeout=None):
+        return _attach_to_attempt(super()._get_conn(timeout))
+
+
+class _CancellableAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections can be closed by a cancelled _Attempt"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TrackedHTTPPool, 'https': _TrackedHTTPSPool
+        }
+
+
 class GrokClient:
-    def __init__(self, api_key: str, base_url: str = "https://api.x.ai/v1"):
+    def __init__(self, api_key: str, base_url: str = "https://api.x.ai/v1",
+                 pool_size: Optional[int] = None):
         self.api_key = api_key
         self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        # One pooled session so turns (and hedged duplicates) reuse
+        # warm TLS connections instead of opening new ones
+        pool_size = pool_size or settings.grok.pool_size
+        self.session = requests.Session()
+        adapter = _CancellableAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="grok")
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stats = {'turns': 0, 'hedges_sent': 0, 'hedge_wins': 0,
+                      'fallbacks_used': 0, 'deadline_misses': 0}
+    
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+    
+    def _record_latency(self, model: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=200)).append(seconds)
+    
+    def latency_percentile(self, model: str, percentile: float,
+                           min_samples: int = 20) -> Optional[float]:
+        """Recent successful-request latency percentile, None until enough samples"""
+        with self._lock:
+            samples = list(self._latencies.get(model, ()))
+        if len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, percentile))
+    
+    def _request_completion(self, payload: Dict, timeout: float,
+                            attempt: Optional[_Attempt] = None) -> str:
+        """POST one completion; raises on failure or once attempt is cancelled"""
+        url = f"{self.base_url}/chat/completions"
+        start = time.monotonic()
+        _current.attempt = attempt
+        try:
+            # Streamed so a cancelled attempt can drop its connection mid-body
+            response = self.session.post(url, headers=self.headers, json=payload,
+                                         timeout=timeout, stream=True)
+            try:
+                if response.status_code >= 400:
+                    # Read the error body now so e.response.text survives close()
+                    response.content
+                response.raise_for_status()
+                body = bytearray()
+                for block in response.iter_content(chunk_size=4096):
+                    if attempt is not None and attempt.cancelled:
+                        raise RequestCancelled()
+                    body.extend(block)
+            finally:
+                response.close()
+        except requests.exceptions.RequestException:
+            # Most likely our own socket shutdown
+            if attempt is not None and attempt.cancelled:
+                raise RequestCancelled()
+            raise
+        finally:
+            _current.attempt = None
+        if attempt is not None and attempt.cancelled:
+            raise RequestCancelled()
+        content = json.loads(body)['choices'][0]['message']['content']
+        self._record_latency(payload['model'], time.monotonic() - start)
+        return content
     
     def create_chat_completion(self, 
                              messages: List[Dict[str, str]],
                              model: str = "grok-beta",
                              temperature: float = 0.7,
                              max_tokens: int = 500,
-                             stream: bool = False) -> Optional[str]:
+                             stream: bool = False,
+                             timeout: float = 30) -> Optional[str]:
         """Create chat completion using Grok API"""
         try:
-            url = f"{self.base_url}/chat/completions"
-            
             payload = {
                 "messages": messages,
                 "model": model,
@@ -31,11 +176,7 @@ class GrokClient:
             }
             
             print(f"Sending request to Grok API...")
-            response = requests.post(url, headers=self.headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data['choices'][0]['message']['content']
+            return self._request_completion(payload, timeout)
             
         except requests.exceptions.RequestException as e:
             print(f"Grok API request failed: {e}")
@@ -50,11 +191,101 @@ class GrokClient:
             print(f"Error in Grok API call: {e}")
             return None
     
+    def create_chat_completion_within(self,
+                                      messages: List[Dict[str, str]],
+                                      model: str = "grok-beta",
+                                      temperature: float = 0.7,
+                                      max_tokens: int = 500,
+                                      deadline_s: Optional[float] = None,
+                                      hedge: Optional[bool] = None,
+                                      fallback_model: Optional[str] = None) -> Optional[str]:
+        """Chat completion that answers within a per-turn deadline.
+
+        If the first request is slower than the recent latency percentile a
+        duplicate is sent and the first successful answer wins; the other is
+        cancelled. With the deadline close, or after the primary model has
+        failed, the request is retried on the cheaper fallback model.
+        Returns None only when nothing answered in time.
+        """
+        config = settings.grok
+        deadline_s = config.turn_deadline_s if deadline_s is None else deadline_s
+        hedge = config.hedge_enabled if hedge is None else hedge
+        fallback_model = config.fallback_model if fallback_model is None else fallback_model
+        deadline = time.monotonic() + deadline_s
+        self._count('turns')
+        
+        def payload_for(name: str) -> Dict:
+            return {"messages": messages, "model": name, "temperature": temperature,
+                    "max_tokens": max_tokens, "stream": False}
+        
+        def launch(name: str):
+            remaining = max(0.1, deadline - time.monotonic())
+            attempt = _Attempt()
+            future = self.executor.submit(self._request_completion, payload_for(name),
+                                          remaining, attempt)
+            attempts[future] = (name, attempt)
+            return future
+        
+        attempts = {}
+        pending = {launch(model)}
+        hedge_delay = self.latency_percentile(model, config.hedge_percentile)
+        hedge_at = time.monotonic() + max(config.hedge_min_delay_s, hedge_delay or 0.0)
+        hedged = not hedge
+        hedge_future = None
+        fell_back = not fallback_model or fallback_model == model
+        
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._count('deadline_misses')
+                    print(f"Grok did not answer within {deadline_s:.1f}s")
+                    return None
+                
+                # Decide whether another attempt should go out now
+                if not fell_back and (deadline - now <= config.fallback_headroom_s or not pending):
+                    print(f"Falling back to {fallback_model}")
+                    self._count('fallbacks_used')
+                    pending.add(launch(fallback_model))
+                    fell_back = True
+                elif not hedged and now >= hedge_at and pending:
+                    print("Grok is slow, sending a hedged request")
+                    self._count('hedges_sent')
+                    hedge_future = launch(model)
+                    pending.add(hedge_future)
+                    hedged = True
+                elif not pending:
+                    return None
+                
+                wake_at = deadline
+                if not hedged:
+                    wake_at = min(wake_at, hedge_at)
+                if not fell_back:
+                    wake_at = min(wake_at, deadline - config.fallback_headroom_s)
+                done, pending = wait(pending, timeout=max(0.0, wake_at - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        content = future.result()
+                    except RequestCancelled:
+                        continue
+                    except Exception as e:
+                        print(f"Grok API request failed ({attempts[future][0]}): {e}")
+                        continue
+                    if future is hedge_future:
+                        self._count('hedge_wins')
+                    return content
+        finally:
+            # First answer wins; anything still running is abandoned and
+            # its connection closed
+            for _, attempt in attempts.values():
+                attempt.cancel()
+    
     def list_models(self) -> List[str]:
         """List available Grok models"""
         try:
             url = f"{self.base_url}/models"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, headers=self.headers, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+
+from src.audio_output import ChunkCrossfader
+from src.audio_writer import StreamingAudioWriter
+
+
+def segment_document(text: str, max_chars: int = 220) -> List[str]:
+    """Split a document into sentence-aligned segments of at most max_chars"""
+    segments = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        sentences = re.split(r"(?<=[.!?;:])\s+", paragraph)
+        current = ""
+        for sentence in sentences:
+            # Break run-on sentences on whitespace so no segment overflows
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    segments.append(current)
+                    current = ""
+                segments.append(sentence[:cut].strip())
+                sentence = sentence[cut:].strip()
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                segments.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            segments.append(current)
+    return segments
+
+
+def normalize_loudness(audio: np.ndarray, target_dbfs: float = -20.0,
+                       peak_limit: float = 0.98) -> np.ndarray:
+    """Scale audio to a target RMS level without clipping"""
+    audio = audio.astype(np.float32)
+    rms = np.sqrt(np.mean(audio ** 2)) if len(audio) else 0.0
+    if rms < 1e-6:
+        return audio
+    gain = 10 ** (target_dbfs / 20.0) / rms
+    peak = np.max(np.abs(audio)) * gain
+    if peak > peak_limit:
+        gain *= peak_limit / peak
+    return audio * gain
+
+
+class LongFormRenderer:
+    """Renders long documents in parallel with resumable per-segment checkpoints"""
+
+    def __init__(self, voice_cloner, speaker_name: str,
+                 workers: int = 2,
+                 max_segment_chars: int = 220,
+                 crossfade_ms: float = 40.0,
+                 target_dbfs: float = -20.0):
+        self.voice_cloner = voice_cloner
+        self.speaker_name = speaker_name
+        self.workers = max(1, workers)
+        self.max_segment_chars = max_segment_chars
+        self.crossfade_ms = crossfade_ms
+        self.target_dbfs = target_dbfs
+        self.sample_rate = voice_cloner.sample_rate
+
+    def _checkpoint_dir(self, output_path: str) -> str:
+        return f"{output_path}.parts"
+
+    def _segment_path(self, checkpoint_dir: str, index: int) -> str:
+        return os.path.join(checkpoint_dir, f"segment_{index:05d}.npy")
+
+    def _load_manifest(self, checkpoint_dir: str, segments: List[str]) -> Dict:
+        """Load the checkpoint manifest, discarding it if the job changed"""
+        manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+        # The voice key changes whenever the speaker's prompt is replaced, so
+        # segments rendered with an older prompt are not stitched to new ones
+        registry = self.voice_cloner.voice_registry
+        registry.refresh()
+        job_hash = hashlib.sha1(
+            json.dumps([registry.voice_key(self.speaker_name), segments]).encode("utf-8")
+        ).hexdigest()
+        manifest = {'job_hash': job_hash, 'completed': []}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r') as f:
+                    saved = json.load(f)
+                if saved.get('job_hash') == job_hash:
+                    manifest = saved
+                else:
+                    print("Document or voice changed since last run, starting over")
+            except Exception as e:
+                print(f"Ignoring unreadable checkpoint manifest: {e}")
+        # Only trust segments whose audio actually made it to disk
+        manifest['completed'] = [
+            i for i in manifest['completed']
+            if os.path.exists(self._segment_path(checkpoint_dir, i))
+        ]
+        return manifest
+
+    def _save_manifest(self, checkpoint_dir: str, manifest: Dict):
+        manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    def _render_segment(self, checkpoint_dir: str, index: int, text: str) -> int:
+        audio = self.voice_cloner.synthesize_speech(
+            text=text,
+            speaker_name=self.speaker_name,
+            silence_padding=0.0
+        )
+        if audio is None:
+            raise RuntimeError(f"Synthesis failed for segment {index}")
+        audio = normalize_loudness(audio, self.target_dbfs)
+        # Write atomically so a crash never leaves a half-written checkpoint
+        segment_path = self._segment_path(checkpoint_dir, index)
+        tmp_path = segment_path + ".tmp.npy"
+        np.save(tmp_path, audio)
+        os.replace(tmp_path, segment_path)
+        return index
+
+    def render(self, text: str, output_path: str) -> bool:
+        """Render a document to output_path, resuming from checkpoints"""
+        segments = segment_document(text, self.max_segment_chars)
+        if not segments:
+            print("Document is empty")
+            return False
+
+        checkpoint_dir = self._checkpoint_dir(output_path)
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        manifest = self._load_manifest(checkpoint_dir, segments)
+        completed = set(manifest['completed'])
+        pending = [i for i in range(len(segments)) if i not in completed]
+        print(f"Rendering {len(segments)} segments "
+              f"({len(completed)} already done, {len(pending)} to go)")
+
+        crossfade_samples = int(self.crossfade_ms / 1000.0 * self.sample_rate)
+        next_to_write = 0
+        failed = []
+
+        # The format follows the extension: .wav, .flac or .opus
+        with StreamingAudioWriter(output_path, self.sample_rate) as audio_writer:
+            writer = ChunkCrossfader(audio_writer.write, crossfade_samples)
+
+            def flush_ready():
+                # Stream the finished prefix of the document to disk
+                nonlocal next_to_write
+                while next_to_write in completed:
+                    audio = np.load(self._segment_path(checkpoint_dir, next_to_write))
+                    writer.append(audio)
+                    next_to_write += 1
+
+            flush_ready()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(self._render_segment, checkpoint_dir, i, segments[i]): i
+                    for i in pending
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error rendering segment {index}: {e}")
+                        failed.append(index)
+                        continue
+                    completed.add(index)
+                    manifest['completed'] = sorted(completed)
+                    self._save_manifest(checkpoint_dir, manifest)
+                    print(f"Segment {index + 1}/{len(segments)} done")
+                    flush_ready()
+            if failed:
+                # Keep the previous output; the checkpoints hold the progress
+                audio_writer.abort()
+            else:
+                writer.flush()
+
+        if failed:
+            print(f"{len(failed)} segments failed; re-run the same command to resume")
+            return False
+
+        print(f"Long-form audio saved to {output_path}")
+        return True
+
+    def cleanup(self, output_path: str):
+        """Remove checkpoints after a successful render"""
+        checkpoint_dir = self._checkpoint_dir(output_path)
+        if not os.path.isdir(checkpoint_dir):
+            return
+        for name in os.listdir(checkpoint_dir):
+            os.remove(os.path.join(checkpoint_dir, name))
+        os.rmdir(checkpoint_dir)
@@ -0,0 +1,250 @@
+import gc
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+BARK_MODEL_KEYS = ("text", "coarse", "fine", "codec")
+
+
+def available_memory_bytes() -> Optional[int]:
+    """System memory available to new allocations, or None if unknown"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None if unknown"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _module_of(container):
+    return container["model"] if isinstance(container, dict) else container
+
+
+def model_bytes(container) -> int:
+    """Bytes held by a model's weights, counted from its state dict.
+
+    parameters() misses the packed int8 weights of dynamically quantized
+    layers; their state dict entries are (weight, bias) tuples instead.
+    """
+    import torch
+    seen = set()
+    total = 0
+
+    def add(value):
+        nonlocal total
+        if isinstance(value, (tuple, list)):
+            for item in value:
+                add(item)
+        elif isinstance(value, torch.Tensor) and id(value) not in seen:
+            # keep_vars keeps tied weights as one object, counted once
+            seen.add(id(value))
+            total += value.numel() * value.element_size()
+
+    for value in _module_of(container).state_dict(keep_vars=True).values():
+        add(value)
+    return total
+
+
+class ModelMemoryGovernor:
+    """Offloads Bark sub-models that have sat idle and reloads them on first use.
+
+    Each stage acquires its model through the governor, which records the
+    last use. A background thread drops models idle for longer than
+    ``idle_ttl`` and, when system memory falls below ``min_available_bytes``,
+    the least recently used idle models as well. Dropped weights are spilled
+    once to plain state dicts in ``offload_dir`` and memory-mapped back in,
+    which takes a fraction of Bark's own checkpoint load. Quantized models
+    cannot be spilled that way and are reloaded through Bark instead.
+    """
+
+    def __init__(self, idle_ttl: float = 600.0, check_interval: float = 30.0,
+                 min_available_bytes: int = 0,
+                 offload_dir: str = "data/models/offload",
+                 use_small_models: bool = False,
+                 quantized: Iterable[str] = ()):
+        self.idle_ttl = idle_ttl
+        self.check_interval = check_interval
+        self.min_available_bytes = min_available_bytes
+        self.offload_dir = offload_dir
+        self.use_small_models = use_small_models
+        self.quantized = set(quantized)
+        now = time.monotonic()
+        self._last_used: Dict[str, float] = {key: now for key in BARK_MODEL_KEYS}
+        self._in_use: Dict[str, int] = {key: 0 for key in BARK_MODEL_KEYS}
+        self._devices: Dict[str, str] = {}
+        self._spilled: Dict[str, Dict] = {}  # key -> manifest entry of the spill file
+        self._tokenizer = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.offloads = 0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+
+    def start(self):
+        """Start the background idle/pressure check"""
+        if self.check_interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.enforce()
+            except Exception as e:
+                print(f"Memory governor check failed: {e}")
+
+    def acquire(self, key: str):
+        """Return a resident model for a stage, reloading it if it was offloaded"""
+        import bark.generation as bark_gen
+        with self._lock:
+            if key not in bark_gen.models:
+                self._reload(key)
+            self._in_use[key] += 1
+            self._last_used[key] = time.monotonic()
+            return bark_gen.models[key]
+
+    def release(self, key: str):
+        with self._lock:
+            self._in_use[key] = max(0, self._in_use[key] - 1)
+            self._last_used[key] = time.monotonic()
+
+    def _reload(self, key: str):
+        import bark.generation as bark_gen
+        start = time.perf_counter()
+        device = self._devices.get(key, "cpu")
+        entry = self._spilled.get(key)
+        if entry is not None:
+            from src.worker_pool import load_shared_model
+            bark_gen.models[key] = load_shared_model(key, entry, self.offload_dir, device,
+                                                     tokenizer=self._tokenizer)
+        elif key == "codec":
+            bark_gen.load_codec_model(use_gpu=device != "cpu")
+        else:
+            bark_gen.load_model(use_gpu=device != "cpu", use_small=self.use_small_models,
+                                model_type=key)
+            if key in self.quantized:
+                from src.cpu_profile import quantize_model
+                quantize_model(key)
+        self.reloads += 1
+        self.reload_seconds += time.perf_counter() - start
+        print(f"Reloaded Bark {key} model in {time.perf_counter() - start:.2f}s")
+
+    def offload(self, key: str) -> bool:
+        """Drop one idle model from memory; returns False if it is busy or absent"""
+        import bark.generation as bark_gen
+        with self._lock:
+            if self._in_use[key] > 0 or key not in bark_gen.models:
+                return False
+            container = bark_gen.models[key]
+            module = _module_of(container)
+            self._devices[key] = next(module.parameters()).device.type
+            if key == "text":
+                self._tokenizer = container["tokenizer"]
+            if key not in self.quantized and key not in self._spilled:
+                # Spill once; the weights never change afterwards
+                from src.worker_pool import save_shared_model
+                os.makedirs(self.offload_dir, exist_ok=True)
+                self._spilled[key] = save_shared_model(key, container, self.offload_dir)
+                with open(os.path.join(self.offload_dir, "manifest.json"), 'w') as f:
+                    json.dump({'use_small': self.use_small_models, 'models': self._spilled},
+                              f, indent=2)
+            del bark_gen.models[key]
+            del container, module
+            self.offloads += 1
+
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"Offloaded idle Bark {key} model")
+        return True
+
+    def enforce(self):
+        """Offload models past their idle TTL, then more if memory is tight"""
+        import bark.generation as bark_gen
+        now = time.monotonic()
+        with self._lock:
+            idle = sorted(
+                (self._last_used[key], key) for key in BARK_MODEL_KEYS
+                if key in bark_gen.models and self._in_use[key] == 0
+            )
+        for last_used, key in idle:
+            if self.idle_ttl > 0 and now - last_used >= self.idle_ttl:
+                self.offload(key)
+
+        if self.min_available_bytes > 0:
+            # Least recently used first, until there is enough headroom
+            for _, key in idle:
+                available = available_memory_bytes()
+                if available is None or available >= self.min_available_bytes:
+                    break
+                self.offload(key)
+
+    def report(self) -> Dict:
+        """Per-model residency and memory, plus process RSS"""
+        import bark.generation as bark_gen
+        now = time.monotonic()
+        models = {}
+        with self._lock:
+            for key in BARK_MODEL_KEYS:
+                container = bark_gen.models.get(key)
+                models[key] = {
+                    'resident': container is not None,
+                    'bytes': model_bytes(container) if container is not None else 0,
+                    'idle_s': now - self._last_used[key],
+                    'in_use': self._in_use[key],
+                }
+        return {
+            'models': models,
+            'resident_model_bytes': sum(m['bytes'] for m in models.values()),
+            'process_rss_bytes': process_rss_bytes(),
+            'offloads': self.offloads,
+            'reloads': self.reloads,
+            'reload_seconds': self.reload_seconds,
+        }
+
+
+_governor: Optional[ModelMemoryGovernor] = None
+
+
+def install_governor(governor: Optional[ModelMemoryGovernor]):
+    """Route Bark stage model access in this process through governor (None removes it)"""
+    global _governor
+    _governor = governor
+
+
+def get_governor() -> Optional[ModelMemoryGovernor]:
+    return _governor
@@ -0,0 +1,261 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+# The session whose torch profiler is stepped by profiler_step()
+_active_session = None
+_step_lock = threading.Lock()
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far, or None if unknown"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def profiler_step():
+    """Advance the running torch profiler's schedule by one step, if any"""
+    session = _active_session
+    if session is None or session._torch_profiler is None:
+        return
+    with _step_lock:
+        session._torch_profiler.step()
+
+
+class StackSampler:
+    """Samples the Python stacks of every thread at a fixed interval.
+
+    cProfile only sees the thread it was enabled in, while synthesis and
+    playback run on worker threads; sampling covers all of them. Stacks are
+    kept as counts per unique stack, so memory grows with code paths rather
+    than run time.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def hottest(self, limit: int = 15) -> Tuple[list, list]:
+        """(self samples, inclusive samples) per function, most frequent first"""
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+        return own.most_common(limit), inclusive.most_common(limit)
+
+    def write_folded(self, path: str):
+        """Folded stacks, one per line, for flamegraph tools"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(stack) + f" {count}\n")
+
+
+class ProfileSession:
+    """Captures a profile of everything run inside the ``with`` block.
+
+    Writes to ``<output_dir>/<name>_<timestamp>/``:
+    cprofile.prof and cprofile.txt (calling thread), stacks.folded
+    (all threads, sampled), torch_trace.json and torch_ops.txt (Bark stages
+    are labelled), allocations.txt (tracemalloc, only with
+    ``trace_allocations``) and summary.txt.
+
+    The torch trace covers a window of Bark stage calls rather than the whole
+    run: ``torch_schedule`` is (wait, warmup, active) stage calls, so long
+    sessions keep a bounded trace. Allocation tracing also turns on torch's
+    memory profiling; both are costly and off unless asked for.
+    """
+
+    def __init__(self, name: str, output_dir: str = "data/profiles",
+                 torch_trace: bool = True, trace_allocations: bool = False,
+                 sample_interval: float = 0.005, top_functions: int = 15,
+                 torch_schedule: Tuple[int, int, int] = (1, 1, 3)):
+        self.name = name
+        self.output_dir = os.path.join(output_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        self.torch_trace = torch_trace
+        self.trace_allocations = trace_allocations
+        self.torch_schedule = torch_schedule
+        self.top_functions = top_functions
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(sample_interval)
+        self._torch_profiler = None
+        self._start = None
+        self.results: Dict = {}
+
+    def _start_torch_profiler(self):
+        try:
+            import torch
+        except ImportError:
+            print("torch not installed; skipping the torch profiler trace")
+            return
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        wait, warmup, active = self.torch_schedule
+        trace_path = os.path.join(self.output_dir, "torch_trace.json")
+        self._torch_profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+            on_trace_ready=lambda prof: prof.export_chrome_trace(trace_path),
+            profile_memory=self.trace_allocations
+        )
+        self._torch_profiler.__enter__()
+
+    def __enter__(self):
+        global _active_session
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"Profiling '{self.name}' into {self.output_dir}")
+        if self.trace_allocations:
+            import tracemalloc
+            tracemalloc.start(25)
+        if self.torch_trace:
+            self._start_torch_profiler()
+            _active_session = self
+        self.sampler.start()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active_session
+        self.profiler.disable()
+        if _active_session is self:
+            _active_session = None
+        wall = time.perf_counter() - self._start
+        self.sampler.stop()
+        try:
+            self._write_reports(wall)
+        except Exception as e:
+            print(f"Could not write profile reports: {e}")
+        # Errors and Ctrl+C inside the block still propagate
+        return False
+
+    def _write_reports(self, wall: float):
+        out = self.output_dir
+        self.results = {'wall_seconds': wall, 'peak_rss_bytes': peak_rss_bytes()}
+
+        self.profiler.dump_stats(os.path.join(out, "cprofile.prof"))
+        buffer = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=buffer).sort_stats("cumulative")
+        stats.print_stats(60)
+        with open(os.path.join(out, "cprofile.txt"), 'w') as f:
+            f.write(buffer.getvalue())
+
+        self.sampler.write_folded(os.path.join(out, "stacks.folded"))
+
+        if self._torch_profiler is not None:
+            with _step_lock:
+                # Writes torch_trace.json if the window was still recording
+                self._torch_profiler.__exit__(None, None, None)
+            try:
+                table = self._torch_profiler.key_averages().table(
+                    sort_by="self_cpu_time_total", row_limit=40)
+            except Exception as e:
+                # Nothing reached the active window (too few stage calls)
+                table = f"No torch ops recorded: {e}\n"
+            with open(os.path.join(out, "torch_ops.txt"), 'w') as f:
+                f.write(table)
+
+        if self.trace_allocations:
+            import tracemalloc
+            _, traced_peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.results['traced_peak_bytes'] = traced_peak
+            with open(os.path.join(out, "allocations.txt"), 'w') as f:
+                f.write(f"Peak traced Python memory: {traced_peak / 1e6:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:40]:
+                    f.write(f"{stat}\n")
+
+        summary = self._summary()
+        with open(os.path.join(out, "summary.txt"), 'w') as f:
+            f.write(summary)
+        print(summary)
+
+    def _summary(self) -> str:
+        def mb(value):
+            return "n/a" if value is None else f"{value / 1e6:.1f} MB"
+
+        lines = [
+            f"Profile: {self.name}",
+            f"Command: {' '.join(sys.argv)}",
+            f"Wall time: {self.results['wall_seconds']:.2f}s",
+            f"Peak RSS: {mb(self.results['peak_rss_bytes'])}",
+        ]
+        if 'traced_peak_bytes' in self.results:
+            lines.append(f"Peak traced Python allocations: {mb(self.results['traced_peak_bytes'])}")
+
+        own, inclusive = self.sampler.hottest(self.top_functions)
+        total = max(1, self.sampler.samples)
+        lines.append(f"\nHottest functions, all threads ({self.sampler.samples} samples):")
+        lines.append("  self time:")
+        lines += [f"  {100.0 * count / total:5.1f}%  {function}" for function, count in own]
+        lines.append("  including callees:")
+        lines += [f"  {100.0 * count / total:5.1f}%  {function}" for function, count in inclusive]
+
+        buffer = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=buffer).sort_stats("tottime")
+        lines.append("\nTop functions by own time, calling thread (cProfile):")
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top_functions]:
+            lines.append(f"  {tottime:8.3f}s own {cumtime:8.3f}s cum {calls:8d} calls  "
+                         f"{function} ({os.path.basename(filename)}:{line})")
+        lines.append(f"\nReports in {self.output_dir}")
+        return "\n".join(lines) + "\n"
+
+
+def profile_session(name: str) -> ProfileSession:
+    """A ProfileSession configured from settings.profiling"""
+    from config.settings import settings
+    config = settings.profiling
+    return ProfileSession(
+        name,
+        output_dir=config.output_dir,
+        torch_trace=config.torch_trace,
+        trace_allocations=config.trace_allocations,
+        sample_interval=config.sample_interval_ms / 1000.0,
+        top_functions=config.top_functions,
+        torch_schedule=(config.torch_wait_steps, config.torch_warmup_steps,
+                        config.torch_active_steps)
+    )
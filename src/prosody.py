@@ -0,0 +1,118 @@
+import os
+from fractions import Fraction
+from typing import Optional
+
+import numpy as np
+
+from src.sample_rates import resample
+
+# Rate and pitch variants derived from an existing render. A phase vocoder
+# stretches time without touching pitch; a pitch shift is a stretch followed
+# by resampling back to the original length. Both run on whole arrays with
+# numpy, so a variant of a sentence takes milliseconds instead of another
+# Bark generation.
+
+N_FFT = 1024
+HOP = 256
+
+
+def _window(n_fft: int) -> np.ndarray:
+    return np.hanning(n_fft + 1)[:-1].astype(np.float32)
+
+
+def _stft(audio: np.ndarray, n_fft: int, hop: int, window: np.ndarray) -> np.ndarray:
+    padded = np.pad(audio, (n_fft // 2, n_fft // 2 + hop))
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop]
+    return np.fft.rfft(frames * window, axis=1)
+
+
+def _istft(spectra: np.ndarray, n_fft: int, hop: int, window: np.ndarray,
+           length: int) -> np.ndarray:
+    frames = np.fft.irfft(spectra, n=n_fft, axis=1).astype(np.float32) * window
+    n_frames = len(frames)
+    out = np.zeros(hop * (n_frames - 1) + n_fft, dtype=np.float32)
+    norm = np.zeros_like(out)
+    # Overlap-add one hop-sized column of every frame at a time
+    for k in range(n_fft // hop):
+        segment = slice(k * hop, k * hop + n_frames * hop)
+        out[segment] += frames[:, k * hop:(k + 1) * hop].reshape(-1)
+        norm[segment] += np.tile(window[k * hop:(k + 1) * hop] ** 2, n_frames)
+    out /= np.maximum(norm, 1e-8)
+    return out[n_fft // 2:n_fft // 2 + length]
+
+
+def time_stretch(audio: np.ndarray, rate: float, n_fft: int = N_FFT, hop: int = HOP) -> np.ndarray:
+    """Play audio rate times faster at the same pitch (phase vocoder)"""
+    if rate == 1.0 or len(audio) == 0:
+        return audio
+    audio = np.asarray(audio, dtype=np.float32)
+    window = _window(n_fft)
+    spectra = _stft(audio, n_fft, hop, window)
+
+    steps = np.arange(0, len(spectra) - 1, rate)
+    index = steps.astype(int)
+    frac = (steps - index)[:, None]
+    left, right = spectra[index], spectra[index + 1]
+    magnitude = (1.0 - frac) * np.abs(left) + frac * np.abs(right)
+
+    # Expected phase advance per hop for each bin, plus the measured deviation
+    omega = 2 * np.pi * hop * np.arange(spectra.shape[1]) / n_fft
+    deviation = np.angle(right) - np.angle(left) - omega
+    deviation -= 2 * np.pi * np.round(deviation / (2 * np.pi))
+    advance = omega + deviation
+    phase = np.angle(spectra[0]) + np.concatenate(
+        [np.zeros((1, spectra.shape[1])), np.cumsum(advance[:-1], axis=0)]
+    )
+
+    length = int(round(len(audio) / rate))
+    return _istft(magnitude * np.exp(1j * phase), n_fft, hop, window, length)
+
+
+def pitch_shift(audio: np.ndarray, semitones: float, n_fft: int = N_FFT,
+                hop: int = HOP) -> np.ndarray:
+    """Shift pitch by semitones keeping the duration"""
+    if semitones == 0.0 or len(audio) == 0:
+        return audio
+    # A small-denominator ratio keeps the polyphase filter short; the
+    # error is well under a cent
+    ratio = Fraction(2.0 ** (semitones / 12.0)).limit_denominator(48)
+    stretched = time_stretch(audio, 1.0 / float(ratio), n_fft, hop)
+    shifted = resample(stretched, ratio.numerator, ratio.denominator)
+    if len(shifted) >= len(audio):
+        return shifted[:len(audio)]
+    return np.pad(shifted, (0, len(audio) - len(shifted)))
+
+
+def apply_prosody(audio: np.ndarray, rate: float = 1.0, semitones: float = 0.0) -> np.ndarray:
+    """Pitch then rate; returns audio unchanged when both are neutral"""
+    return time_stretch(pitch_shift(audio, semitones), rate)
+
+
+def variant_path(base_path: str, rate: float, semitones: float) -> str:
+    """Where a variant of a render is cached: <stem>.variants/ next to it"""
+    stem, ext = os.path.splitext(base_path)
+    return os.path.join(f"{stem}.variants", f"rate{rate:.2f}_pitch{semitones:+.1f}{ext or '.wav'}")
+
+
+def render_variant(base_path: str, rate: float = 1.0, semitones: float = 0.0) -> Optional[str]:
+    """Path of a rate/pitch variant of a rendered file, derived on first request"""
+    import soundfile as sf
+    from src.audio_writer import write_audio
+
+    if rate == 1.0 and semitones == 0.0:
+        return base_path
+    if not os.path.exists(base_path):
+        print(f"Base render {base_path} not found")
+        return None
+    path = variant_path(base_path, rate, semitones)
+    # A re-rendered base invalidates its variants
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(base_path):
+        return path
+
+    audio, sr = sf.read(base_path, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    variant = np.clip(apply_prosody(audio, rate, semitones), -1.0, 1.0)
+    # Written atomically in the base render's format
+    write_audio(path, variant, sr)
+    return path
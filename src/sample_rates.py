@@ -0,0 +1,50 @@
+"""
+Sample-rate plan for the whole pipeline.
+
+Every component declares the rate it works at natively:
+
+- capture:  microphone recording (``settings.audio.capture_rate``)
+- model:    Bark generation and everything downstream of ingest -- prompts,
+            feature extraction, similarity scoring and playback (24 kHz)
+- vad:      barge-in voice activity detection (16 kHz, webrtcvad's rate)
+
+Audio is converted once, where it crosses into a component: files are
+resampled to the model rate when they are decoded (see ``src.audio_cache``)
+and nothing is resampled again after that.
+"""
+
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+
+MODEL_RATE = 24000  # bark.SAMPLE_RATE
+VAD_RATE = 16000
+
+
+@lru_cache(maxsize=32)
+def _resampling_filter(up: int, down: int, half_width: int = 32) -> np.ndarray:
+    """Kaiser-windowed low-pass for an up/down polyphase resampler"""
+    from scipy.signal import firwin
+    max_rate = max(up, down)
+    cutoff = 0.95 / max_rate  # a little below Nyquist of the lower rate
+    return firwin(2 * half_width * max_rate + 1, cutoff, window=('kaiser', 8.6))
+
+
+def _ratio(orig_sr: int, target_sr: int) -> Tuple[int, int]:
+    g = gcd(orig_sr, target_sr)
+    return target_sr // g, orig_sr // g
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """High-quality polyphase resampling; a no-op when the rates already match.
+
+    Filters are designed once per rate pair and reused across calls.
+    """
+    if orig_sr == target_sr:
+        return audio
+    from scipy.signal import resample_poly
+    up, down = _ratio(orig_sr, target_sr)
+    window = _resampling_filter(up, down)
+    return resample_poly(audio, up, down, window=window).astype(np.float32)
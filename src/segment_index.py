@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Bump when the analysis changes so stored segments are recomputed
+SEGMENT_INDEX_VERSION = 1
+
+FRAME_S = 0.02
+CLIP_LEVEL = 0.99
+
+
+@dataclass
+class Segment:
+    start: float  # seconds
+    end: float
+    snr_db: float
+    clipping: float  # fraction of samples at full scale
+    pitch_hz: float  # mean f0 of pitched frames, 0 if none
+    pitch_jitter: float  # mean frame-to-frame f0 change in semitones
+    voiced_ratio: float  # fraction of frames with a clear pitch
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _frames(audio: np.ndarray, frame: int) -> np.ndarray:
+    n = len(audio) // frame
+    return audio[:n * frame].reshape(n, frame)
+
+
+def _segment_sums(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Sum of values[start:end] for every segment at once"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    return cumulative[ends] - cumulative[starts]
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end indices of the True runs in mask"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def frame_pitch(audio: np.ndarray, sr: int, frame: int, fmin: float = 60.0,
+                fmax: float = 400.0, threshold: float = 0.5,
+                batch: int = 2048) -> np.ndarray:
+    """f0 per frame from the normalized autocorrelation, 0 where unpitched.
+
+    Each frame is analysed over a window of two frames so the lowest pitch
+    fits twice; frames are processed in batches through one FFT each.
+    """
+    window = 2 * frame
+    padded = np.pad(audio, (frame // 2, window))
+    views = np.lib.stride_tricks.sliding_window_view(padded, window)[::frame][:len(audio) // frame]
+    min_lag = max(1, int(sr / fmax))
+    max_lag = min(window - 1, int(sr / fmin))
+    taper = np.hanning(window).astype(np.float32)
+    n_fft = 1 << int(np.ceil(np.log2(2 * window)))
+
+    f0 = np.zeros(len(views), dtype=np.float32)
+    for offset in range(0, len(views), batch):
+        chunk = views[offset:offset + batch] * taper
+        chunk = chunk - chunk.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(chunk, n=n_fft, axis=1)
+        autocorr = np.fft.irfft(np.abs(spectrum) ** 2, n=n_fft, axis=1)[:, :max_lag + 1]
+        energy = np.maximum(autocorr[:, :1], 1e-12)
+        normalized = autocorr[:, min_lag:] / energy
+        best = np.argmax(normalized, axis=1)
+        strength = normalized[np.arange(len(best)), best]
+        pitched = strength >= threshold
+        f0[offset:offset + len(best)] = np.where(pitched, sr / (best + min_lag), 0.0)
+    return f0
+
+
+def find_segments(audio: np.ndarray, sr: int, min_duration: float = 1.0,
+                  max_duration: float = 8.0, max_gap: float = 0.3,
+                  margin_db: float = 12.0, floor_db: float = -55.0) -> Tuple[List[Segment], float]:
+    """Voiced segments of a recording with their quality measures.
+
+    Returns (segments, noise_db). Speech is any frame more than margin_db
+    above the recording's noise floor (its quietest tenth of frames); gaps
+    shorter than max_gap are bridged and segments longer than max_duration
+    are cut at their quietest frame so prompts can be assembled from
+    sentence-sized pieces.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    frame = max(1, int(FRAME_S * sr))
+    frames = _frames(audio, frame)
+    if len(frames) == 0:
+        return [], float(floor_db)
+    power = np.mean(frames.astype(np.float64) ** 2, axis=1)
+    frame_db = 10.0 * np.log10(power + 1e-12)
+    noise_db = float(np.percentile(frame_db, 10))
+    voiced = frame_db > max(noise_db + margin_db, floor_db)
+
+    starts, ends = _runs(voiced)
+    if len(starts) == 0:
+        return [], noise_db
+    # Bridge short pauses between words
+    keep = np.concatenate([[True], starts[1:] - ends[:-1] >= int(max_gap / FRAME_S)])
+    starts, ends = starts[keep], np.concatenate([ends[np.flatnonzero(keep[1:])], ends[-1:]])
+
+    # Cut over-long segments at their quietest frame
+    min_frames, max_frames = int(min_duration / FRAME_S), int(max_duration / FRAME_S)
+    pieces = []
+    for start, end in zip(starts, ends):
+        while end - start > max_frames:
+            low = start + max(min_frames, 1)
+            cut = low + int(np.argmin(frame_db[low:start + max_frames]))
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+    pieces = np.array([p for p in pieces if p[1] - p[0] >= max(min_frames, 1)], dtype=np.int64)
+    if len(pieces) == 0:
+        return [], noise_db
+    starts, ends = pieces[:, 0], pieces[:, 1]
+    lengths = ends - starts
+
+    # Every measure below is a per-frame quantity summed per segment
+    unvoiced_power = power[~voiced]
+    noise_power = float(unvoiced_power.mean()) if len(unvoiced_power) else float(10 ** (noise_db / 10))
+    snr_db = 10.0 * np.log10(_segment_sums(power, starts, ends) / lengths / max(noise_power, 1e-12))
+    clipped = np.sum(np.abs(frames) >= CLIP_LEVEL, axis=1)
+    clipping = _segment_sums(clipped, starts, ends) / (lengths * frame)
+
+    f0 = frame_pitch(audio, sr, frame)
+    pitched = f0 > 0
+    semitones = 12.0 * np.log2(np.where(pitched, f0, 1.0))
+    # Pitch change between neighbouring pitched frames; octave errors are capped
+    pair = pitched[1:] & pitched[:-1]
+    step = np.where(pair, np.minimum(np.abs(np.diff(semitones)), 2.0), 0.0)
+    pair_count = _segment_sums(pair, starts, ends - 1)
+    pitched_count = _segment_sums(pitched, starts, ends)
+    pitch_jitter = _segment_sums(step, starts, ends - 1) / np.maximum(pair_count, 1)
+    pitch_hz = _segment_sums(np.where(pitched, f0, 0.0), starts, ends) / np.maximum(pitched_count, 1)
+
+    segments = [
+        Segment(
+            start=float(s * FRAME_S), end=float(e * FRAME_S), snr_db=float(snr),
+            clipping=float(clip), pitch_hz=float(hz),
+            # A segment with no pitched pairs is as unstable as it gets
+            pitch_jitter=float(jitter) if pairs else 2.0,
+            voiced_ratio=float(count / length)
+        )
+        for s, e, snr, clip, hz, jitter, pairs, count, length in zip(
+            starts, ends, snr_db, clipping, pitch_hz, pitch_jitter,
+            pair_count, pitched_count, lengths)
+    ]
+    return segments, noise_db
+
+
+def select_segments(candidates: List[Dict], target_seconds: float,
+                    overshoot: float = 1.25) -> List[Dict]:
+    """Greedily take the best-ranked segments until target_seconds is reached.
+
+    candidates must already be sorted best first. A segment that would run
+    past overshoot * target is skipped in favour of a shorter one further
+    down the list.
+    """
+    chosen, total = [], 0.0
+    for candidate in candidates:
+        if total >= target_seconds:
+            break
+        if total + candidate['duration'] > overshoot * target_seconds:
+            continue
+        chosen.append(candidate)
+        total += candidate['duration']
+    return chosen
+
+
+def assemble_segments(selection: List[Dict], load_audio: Callable[[str], Tuple[np.ndarray, int]],
+                      gap_s: float = 0.2, fade_ms: float = 10.0,
+                      target_dbfs: float = -20.0) -> Tuple[np.ndarray, int]:
+    """Concatenate selected segments, level-matched, with short pauses between them.
+
+    Segments keep corpus order (file, then time) so the prompt reads like
+    continuous speech. Each file is loaded once.
+    """
+    ordered = sorted(selection, key=lambda s: (s['path'], s['start']))
+    pieces, sr, loaded = [], None, {}
+    for segment in ordered:
+        if segment['path'] not in loaded:
+            loaded = {segment['path']: load_audio(segment['path'])}
+        audio, sr = loaded[segment['path']]
+        piece = np.asarray(audio[int(segment['start'] * sr):int(segment['end'] * sr)], dtype=np.float32)
+        if not len(piece):
+            continue
+        rms = np.sqrt(np.mean(piece.astype(np.float64) ** 2))
+        piece = piece * (10 ** (target_dbfs / 20.0) / max(rms, 1e-6))
+        fade = min(int(fade_ms / 1000.0 * sr), len(piece) // 2)
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            piece[:fade] *= ramp
+            piece[-fade:] *= ramp[::-1]
+        pieces += [piece, np.zeros(int(gap_s * sr), dtype=np.float32)]
+    if not pieces:
+        return np.zeros(0, dtype=np.float32), sr or 0
+    return np.clip(np.concatenate(pieces[:-1]), -1.0, 1.0), sr
@@ -0,0 +1,565 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from config.settings import settings
+from src.audio_writer import OPUS_RATES, STREAMABLE_FORMATS, stream_encoded
+from src.cancellation import CancellationToken
+from src.tts_engine import split_text_for_synthesis
+
+
+class SessionLimitError(Exception):
+    """A session (or the manager) is over one of its resource limits"""
+
+
+@dataclass
+class SpeechJob:
+    session: "AgentSession"
+    utterance_id: int
+    index: int
+    text: str
+    last: bool
+    cancel_token: CancellationToken
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class FairSynthesisScheduler:
+    """Shares the voice cloner between sessions, one chunk at a time, round-robin.
+
+    Each session has its own FIFO of text chunks. Workers take the next
+    chunk from the session at the head of the ring and put that session at
+    the back once the chunk is rendered, so a long reply cannot hold up
+    everyone else's first sentence. A session has at most one chunk in
+    flight, which keeps its audio in order.
+    """
+
+    def __init__(self, voice_cloner, workers: int = 2, max_pending: int = 8):
+        self.voice_cloner = voice_cloner
+        self.max_pending = max_pending
+        self._queues: Dict[str, deque] = {}
+        self._ring: deque = deque()
+        self._busy = set()
+        self._cond = threading.Condition()
+        self._running = True
+        self.chunks_rendered = 0
+        self.render_seconds = 0.0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"session-tts-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, jobs: List[SpeechJob]) -> bool:
+        """Queue one utterance's chunks; False if that would exceed the session's limit"""
+        if not jobs:
+            return True
+        session_id = jobs[0].session.session_id
+        with self._cond:
+            queue = self._queues.setdefault(session_id, deque())
+            if len(queue) + len(jobs) > self.max_pending:
+                return False
+            queue.extend(jobs)
+            if session_id not in self._busy and session_id not in self._ring:
+                self._ring.append(session_id)
+            self._cond.notify()
+        return True
+
+    def cancel(self, session_id: str):
+        """Drop everything a session still has queued"""
+        with self._cond:
+            self._queues.pop(session_id, None)
+            if session_id in self._ring:
+                self._ring.remove(session_id)
+
+    def pending(self, session_id: str) -> int:
+        with self._cond:
+            return len(self._queues.get(session_id, ()))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ring:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                session_id = self._ring.popleft()
+                job = self._queues[session_id].popleft()
+                self._busy.add(session_id)
+
+            try:
+                self._render(job)
+            finally:
+                with self._cond:
+                    self._busy.discard(session_id)
+                    if self._queues.get(session_id):
+                        self._ring.append(session_id)
+                        self._cond.notify()
+                    elif session_id in self._queues:
+                        del self._queues[session_id]
+
+    def _render(self, job: SpeechJob):
+        session = job.session
+        if job.cancel_token.cancelled:
+            return
+        start = time.perf_counter()
+        audio = self.voice_cloner.synthesize_speech(
+            job.text, session.speaker_name, silence_padding=0.0,
+            cancel_token=job.cancel_token,
+            rate=session.speaking_rate, pitch_semitones=session.pitch_semitones
+        )
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.chunks_rendered += 1
+            self.render_seconds += elapsed
+        session.synthesis_seconds += elapsed
+        if job.cancel_token.cancelled:
+            return
+        session.deliver(job, audio)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+class AgentSession:
+    """One conversation: its history, limits and where its audio goes.
+
+    on_audio(session, utterance_id, audio) receives each rendered chunk as
+    float32 at the cloner's sample rate; on_event(session, event_dict)
+    receives utterance boundaries and errors.
+    """
+
+    def __init__(self, session_id: str, manager: "SessionManager", speaker_name: str,
+                 on_audio: Optional[Callable] = None, on_event: Optional[Callable] = None):
+        self.session_id = session_id
+        self.manager = manager
+        self.speaker_name = speaker_name
+        self.on_audio = on_audio
+        self.on_event = on_event
+        self.conversation_history = []
+        self.speaking_rate = settings.tts.speaking_rate
+        self.pitch_semitones = settings.tts.pitch_semitones
+        self.created = time.monotonic()
+        self.last_active = self.created
+        self.synthesis_seconds = 0.0
+        self.turns = 0
+        self._turn_times = deque()
+        self._utterance_id = 0
+        self._cancel_token = CancellationToken()
+        self._lock = threading.Lock()
+
+    def _check_rate(self):
+        limit = self.manager.config.turns_per_minute
+        now = time.monotonic()
+        with self._lock:
+            while self._turn_times and now - self._turn_times[0] > 60.0:
+                self._turn_times.popleft()
+            if limit > 0 and len(self._turn_times) >= limit:
+                raise SessionLimitError(f"more than {limit} turns per minute")
+            self._turn_times.append(now)
+            self.last_active = now
+
+    def respond(self, user_text: str) -> Optional[str]:
+        """Generate the assistant's reply through the shared Grok client"""
+        self._check_rate()
+        config = self.manager.config
+        with self._lock:
+            self.conversation_history.append({"role": "user", "content": user_text})
+            # Keep only recent conversation to manage context length
+            self.conversation_history = self.conversation_history[-config.history_turns:]
+            messages = [{"role": "system", "content": settings.agent.system_prompt}] + \
+                self.conversation_history
+        reply = self.manager.grok_client.create_chat_completion_within(
+            messages=messages,
+            model=settings.grok.model,
+            temperature=settings.grok.temperature,
+            max_tokens=settings.grok.max_tokens,
+            deadline_s=settings.grok.turn_deadline_s
+        )
+        if not reply:
+            return None
+        reply = reply.strip()
+        with self._lock:
+            self.conversation_history.append({"role": "assistant", "content": reply})
+            self.turns += 1
+        return reply
+
+    def speak(self, text: str) -> Optional[int]:
+        """Queue text for synthesis; returns the utterance id or None if refused"""
+        # A new utterance interrupts whatever this session was still saying
+        self.interrupt()
+        text = text[:self.manager.config.max_reply_chars]
+        chunks = [c for c in split_text_for_synthesis(text) if c.strip()]
+        with self._lock:
+            self._utterance_id += 1
+            utterance_id = self._utterance_id
+            token = self._cancel_token
+        jobs = [SpeechJob(self, utterance_id, i, chunk, i == len(chunks) - 1, token)
+                for i, chunk in enumerate(chunks)]
+        if not self.manager.scheduler.submit(jobs):
+            self._emit({"type": "error", "message": "too much speech queued for this session"})
+            return None
+        return utterance_id
+
+    def handle_text(self, user_text: str) -> Optional[str]:
+        """One text turn: reply, then speak it"""
+        reply = self.respond(user_text)
+        if reply is None:
+            self._emit({"type": "error", "message": "no reply from Grok in time"})
+            return None
+        self._emit({"type": "reply", "text": reply})
+        self.speak(reply)
+        return reply
+
+    def transcribe(self, pcm16: bytes, sample_rate: int) -> Optional[str]:
+        """Recognize one utterance of 16-bit mono PCM"""
+        import speech_recognition as sr
+        try:
+            return sr.Recognizer().recognize_google(sr.AudioData(pcm16, sample_rate, 2))
+        except sr.UnknownValueError:
+            return None
+        except Exception as e:
+            print(f"Error in speech recognition ({self.session_id}): {e}")
+            return None
+
+    def handle_audio(self, pcm16: bytes, sample_rate: int) -> Optional[str]:
+        """One voice turn: transcribe, reply, speak"""
+        text = self.transcribe(pcm16, sample_rate)
+        if not text:
+            self._emit({"type": "error", "message": "could not understand audio"})
+            return None
+        self._emit({"type": "transcript", "text": text})
+        return self.handle_text(text)
+
+    def interrupt(self):
+        """Stop the current utterance (barge-in)"""
+        with self._lock:
+            self._cancel_token.cancel("interrupted")
+            self._cancel_token = CancellationToken()
+        self.manager.scheduler.cancel(self.session_id)
+
+    def deliver(self, job: SpeechJob, audio: Optional[np.ndarray]):
+        if audio is not None and self.on_audio is not None:
+            self.on_audio(self, job.utterance_id, audio)
+        if job.last:
+            self._emit({"type": "audio_end", "utterance": job.utterance_id})
+
+    def _emit(self, event: Dict):
+        if self.on_event is not None:
+            self.on_event(self, event)
+
+    def close(self):
+        self.interrupt()
+
+    def get_stats(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'turns': self.turns,
+            'synthesis_seconds': self.synthesis_seconds,
+            'pending_chunks': self.manager.scheduler.pending(self.session_id),
+            'idle_s': time.monotonic() - self.last_active,
+        }
+
+
+class SessionManager:
+    """Serves many conversations from one warm voice cloner and one Grok client"""
+
+    def __init__(self, voice_cloner, grok_client, config=None):
+        self.voice_cloner = voice_cloner
+        self.grok_client = grok_client
+        self.config = config or settings.sessions
+        self.scheduler = FairSynthesisScheduler(voice_cloner, self.config.synthesis_workers,
+                                                self.config.max_pending_chunks)
+        self.sessions: Dict[str, AgentSession] = {}
+        # Turns mostly wait on Grok, so every session can have one in flight
+        self.turn_executor = ThreadPoolExecutor(max_workers=self.config.max_sessions,
+                                                thread_name_prefix="session-turn")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        self._reaper.start()
+
+    def create_session(self, speaker_name: str = "user", on_audio: Optional[Callable] = None,
+                       on_event: Optional[Callable] = None) -> AgentSession:
+        with self._lock:
+            if len(self.sessions) >= self.config.max_sessions:
+                raise SessionLimitError(f"server is at its limit of {self.config.max_sessions} sessions")
+            session = AgentSession(uuid.uuid4().hex[:12], self, speaker_name, on_audio, on_event)
+            self.sessions[session.session_id] = session
+        return session
+
+    def get_session(self, session_id: str) -> Optional[AgentSession]:
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def close_session(self, session_id: str):
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def _reap_idle(self):
+        while not self._stop.wait(30.0):
+            now = time.monotonic()
+            with self._lock:
+                idle = [sid for sid, s in self.sessions.items()
+                        if now - s.last_active > self.config.idle_timeout_s
+                        and self.scheduler.pending(sid) == 0]
+            for session_id in idle:
+                print(f"Closing idle session {session_id}")
+                self.close_session(session_id)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            sessions = [s.get_stats() for s in self.sessions.values()]
+        return {
+            'sessions': len(sessions),
+            'chunks_rendered': self.scheduler.chunks_rendered,
+            'render_seconds': self.scheduler.render_seconds,
+            'grok': dict(self.grok_client.stats),
+            'per_session': sessions,
+        }
+
+    def shutdown(self):
+        self._stop.set()
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        self.scheduler.stop()
+        self.turn_executor.shutdown(wait=False)
+
+
+class UtteranceEncoder:
+    """Encodes one utterance's chunks on a background thread as they arrive.
+
+    Bytes are passed to send as soon as the encoder produces them, so the
+    client starts decoding while later chunks are still being synthesized.
+    At most max_chunks wait for the encoder; write blocks past that.
+    """
+
+    def __init__(self, sample_rate: int, fmt: str, send: Callable[[bytes], None],
+                 max_chunks: int = 8):
+        self._chunks = queue.Queue(maxsize=max_chunks)
+        self._thread = threading.Thread(target=self._run, args=(sample_rate, fmt, send),
+                                        name="session-encoder", daemon=True)
+        self._thread.start()
+
+    def _pending_chunks(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    def _run(self, sample_rate: int, fmt: str, send: Callable[[bytes], None]):
+        try:
+            for data in stream_encoded(self._pending_chunks(), sample_rate, fmt):
+                send(data)
+        except Exception as e:
+            print(f"Audio encoding failed: {e}")
+
+    def write(self, audio: np.ndarray):
+        self._chunks.put(audio)
+
+    def close(self):
+        """Finish the stream; returns once every byte has been sent"""
+        self._chunks.put(None)
+        self._thread.join()
+
+
+async def _serve_connection(manager: SessionManager, websocket, speaker_name: str):
+    """WebSocket protocol, one session per connection.
+
+    Client -> server: JSON text frames {"type": "text", "text": ...},
+    {"type": "end_of_speech", "sample_rate": 16000} after binary frames of
+    16-bit mono PCM, {"type": "audio_format", "format": ...}, {"type":
+    "interrupt"} and {"type": "stats"}.
+    Server -> client: JSON events (session, transcript, reply, audio_end,
+    error, stats) and binary audio at the cloner's rate: frames of 16-bit
+    mono PCM for "pcm16", otherwise one WAV or Ogg Opus stream per
+    utterance, ended by its audio_end event.
+    """
+    loop = asyncio.get_running_loop()
+    loop_thread = threading.get_ident()
+    config = manager.config
+    # Bounded so a slow client holds back synthesis instead of growing memory
+    outgoing: asyncio.Queue = asyncio.Queue(maxsize=config.max_outgoing_messages)
+    closed = threading.Event()
+    sample_rate = manager.voice_cloner.sample_rate
+    audio_format = manager.config.audio_format
+    encoders: Dict[int, UtteranceEncoder] = {}
+    encoders_lock = threading.Lock()
+
+    def send(data):
+        if closed.is_set():
+            return
+        if threading.get_ident() == loop_thread:
+            # Never block the event loop; the put completes as the sender drains
+            loop.create_task(outgoing.put(data))
+            return
+        # Worker threads wait for room, until the connection goes away
+        pending = asyncio.run_coroutine_threadsafe(outgoing.put(data), loop)
+        while True:
+            try:
+                pending.result(timeout=0.5)
+                return
+            except FutureTimeoutError:
+                if closed.is_set():
+                    pending.cancel()
+                    return
+
+    def close_encoders(keep: Optional[int] = None):
+        """End the streams of utterances that were cut off"""
+        with encoders_lock:
+            stale = [(uid, enc) for uid, enc in encoders.items() if uid != keep]
+            for uid, _ in stale:
+                del encoders[uid]
+        for uid, encoder in stale:
+            encoder.close()
+            send(json.dumps({"type": "audio_end", "utterance": uid, "interrupted": True}))
+
+    def on_audio(session, utterance_id, audio):
+        if audio_format == "pcm16":
+            send((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+            return
+        close_encoders(keep=utterance_id)
+        with encoders_lock:
+            encoder = encoders.get(utterance_id)
+            if encoder is None:
+                encoder = encoders[utterance_id] = UtteranceEncoder(
+                    sample_rate, audio_format, send, max_chunks=config.max_pending_chunks)
+        encoder.write(audio)
+
+    def on_event(session, event):
+        if event.get("type") == "audio_end":
+            # Every encoded byte goes out before the event that ends the stream
+            with encoders_lock:
+                encoder = encoders.pop(event["utterance"], None)
+            if encoder is not None:
+                encoder.close()
+        send(json.dumps(event))
+
+    try:
+        session = manager.create_session(speaker_name, on_audio, on_event)
+    except SessionLimitError as e:
+        await websocket.send(json.dumps({"type": "error", "message": str(e)}))
+        return
+
+    async def sender():
+        try:
+            while True:
+                await websocket.send(await outgoing.get())
+        finally:
+            closed.set()
+
+    send_task = asyncio.create_task(sender())
+    await websocket.send(json.dumps({"type": "session", "id": session.session_id,
+                                     "sample_rate": sample_rate, "audio_format": audio_format}))
+    def guarded(handler, *args):
+        try:
+            handler(*args)
+        except SessionLimitError as e:
+            on_event(session, {"type": "error", "message": str(e)})
+        except Exception as e:
+            print(f"Session {session.session_id} turn failed: {e}")
+            on_event(session, {"type": "error", "message": "turn failed"})
+
+    # The rate is only declared at end_of_speech, so bound by the highest one
+    max_audio_bytes = int(config.max_audio_in_seconds * config.max_audio_in_rate) * 2
+    audio_in = bytearray()
+    try:
+        async for message in websocket:
+            if isinstance(message, bytes):
+                if len(audio_in) + len(message) > max_audio_bytes:
+                    await websocket.send(json.dumps({
+                        "type": "error",
+                        "message": f"utterance longer than {config.max_audio_in_seconds:.0f}s"
+                    }))
+                    await websocket.close(code=1009, reason="audio too long")
+                    break
+                audio_in.extend(message)
+                continue
+            try:
+                request = json.loads(message)
+            except json.JSONDecodeError as e:
+                on_event(session, {"type": "error", "message": f"invalid JSON: {e}"})
+                continue
+            if not isinstance(request, dict):
+                on_event(session, {"type": "error", "message": "expected a JSON object"})
+                continue
+            kind = request.get("type")
+            # Turns run off the event loop so an interrupt is read right away
+            if kind == "text":
+                loop.run_in_executor(manager.turn_executor, guarded, session.handle_text,
+                                     request.get("text", ""))
+            elif kind == "end_of_speech":
+                pcm, audio_in = bytes(audio_in), bytearray()
+                try:
+                    rate = int(request.get("sample_rate", 16000))
+                except (TypeError, ValueError):
+                    rate = 0
+                if not 0 < rate <= config.max_audio_in_rate:
+                    on_event(session, {"type": "error", "message":
+                                       f"unsupported sample rate {request.get('sample_rate')!r}"})
+                    continue
+                if len(pcm) / 2 / rate > config.max_audio_in_seconds:
+                    on_event(session, {"type": "error", "message":
+                                       f"utterance longer than {config.max_audio_in_seconds:.0f}s"})
+                    continue
+                loop.run_in_executor(manager.turn_executor, guarded, session.handle_audio,
+                                     pcm, rate)
+            elif kind == "audio_format":
+                fmt = str(request.get("format", "")).lower()
+                if fmt in ("opus", "ogg") and sample_rate not in OPUS_RATES:
+                    on_event(session, {"type": "error", "message": f"opus needs one of {OPUS_RATES} Hz"})
+                elif fmt == "pcm16" or fmt in STREAMABLE_FORMATS:
+                    audio_format = fmt
+                else:
+                    on_event(session, {"type": "error", "message": f"unsupported audio format '{fmt}'"})
+            elif kind == "interrupt":
+                session.interrupt()
+                await loop.run_in_executor(None, close_encoders)
+            elif kind == "stats":
+                on_event(session, {"type": "stats", **session.get_stats()})
+    finally:
+        closed.set()
+        manager.close_session(session.session_id)
+        await loop.run_in_executor(None, close_encoders)
+        send_task.cancel()
+
+
+def serve_websocket(manager: SessionManager, host: Optional[str] = None,
+                    port: Optional[int] = None, speaker_name: str = "user"):
+    """Serve sessions over WebSocket until interrupted (needs the websockets package)"""
+    try:
+        import websockets
+    except ImportError:
+        print("WebSocket serving needs the websockets package: pip install websockets")
+        return
+    host = host or manager.config.host
+    port = port or manager.config.port
+
+    async def main():
+        async with websockets.serve(lambda ws, *_: _serve_connection(manager, ws, speaker_name),
+                                    host, port, max_size=2 ** 22):
+            print(f"Serving voice sessions on ws://{host}:{port}")
+            await asyncio.Future()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.shutdown()
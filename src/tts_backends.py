@@ -0,0 +1,178 @@
+import io
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.cancellation import check_cancelled
+from src.sample_rates import MODEL_RATE, resample
+
+
+class TTSBackend:
+    """A text-to-speech engine the TTS scheduler can route chunks to"""
+
+    name = "base"
+
+    def __init__(self, sample_rate: int = MODEL_RATE):
+        self.sample_rate = sample_rate
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def synthesize(self, text: str, speaker_name: str, cancel_token=None) -> Optional[np.ndarray]:
+        """Render text to float32 audio at self.sample_rate, or None on failure"""
+        raise NotImplementedError
+
+
+class BarkBackend(TTSBackend):
+    """Full-fidelity cloned voice through BarkVoiceCloner"""
+
+    name = "bark"
+
+    def __init__(self, voice_cloner):
+        super().__init__(voice_cloner.sample_rate)
+        self.voice_cloner = voice_cloner
+
+    def synthesize(self, text: str, speaker_name: str, cancel_token=None) -> Optional[np.ndarray]:
+        return self.voice_cloner.synthesize_speech(text, speaker_name, silence_padding=0.0,
+                                                   cancel_token=cancel_token)
+
+
+class EspeakBackend(TTSBackend):
+    """Fast local formant synthesis with espeak-ng; generic voice, near-instant on CPU"""
+
+    name = "espeak"
+
+    def __init__(self, sample_rate: int = MODEL_RATE, voice: str = "en",
+                 words_per_minute: int = 170, executable: Optional[str] = None):
+        super().__init__(sample_rate)
+        self.voice = voice
+        self.words_per_minute = words_per_minute
+        self.executable = executable or shutil.which("espeak-ng") or shutil.which("espeak")
+
+    @property
+    def available(self) -> bool:
+        return self.executable is not None
+
+    def synthesize(self, text: str, speaker_name: str, cancel_token=None) -> Optional[np.ndarray]:
+        import soundfile as sf
+        check_cancelled(cancel_token)
+        try:
+            result = subprocess.run(
+                [self.executable, "--stdout", "-v", self.voice,
+                 "-s", str(self.words_per_minute), text],
+                capture_output=True, timeout=30, check=True
+            )
+            audio, sr = sf.read(io.BytesIO(result.stdout), dtype='float32')
+        except (OSError, subprocess.SubprocessError, RuntimeError) as e:
+            print(f"Fast TTS failed: {e}")
+            return None
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        # Converted to the playback rate here, once
+        return resample(audio, sr, self.sample_rate)
+
+
+class RTFTracker:
+    """Exponentially weighted real-time factor (synthesis seconds per audio second)"""
+
+    def __init__(self, prior: float = 2.0, alpha: float = 0.3):
+        self.value = prior
+        self.alpha = alpha
+        self.samples = 0
+        self._lock = threading.Lock()
+
+    def record(self, synth_seconds: float, audio_seconds: float):
+        if audio_seconds <= 0:
+            return
+        with self._lock:
+            rtf = synth_seconds / audio_seconds
+            # The first real measurement replaces the prior outright
+            self.value = rtf if self.samples == 0 else \
+                self.alpha * rtf + (1.0 - self.alpha) * self.value
+            self.samples += 1
+
+
+@dataclass
+class ChunkDecision:
+    index: int
+    backend: str
+    budget_s: float
+    estimated_s: float
+    rtf: float
+    reason: str
+
+
+class TTSScheduler:
+    """Picks a backend per chunk so audio keeps flowing within the deadline.
+
+    Bark's render time for a chunk is estimated from its length and the
+    measured Bark real-time factor. If that would overrun the chunk's budget
+    -- time to the first-audio deadline for the first chunk, queued playback
+    for later ones -- the fast engine renders it instead.
+    """
+
+    def __init__(self, primary: TTSBackend, fallback: Optional[TTSBackend] = None,
+                 rtf_prior: float = 2.0, chars_per_second: float = 14.0,
+                 max_gap_s: float = 0.3, history: int = 200):
+        self.primary = primary
+        self.fallback = fallback if fallback is not None and fallback.available else None
+        self.rtf = RTFTracker(rtf_prior)
+        self.chars_per_second = chars_per_second
+        self.max_gap_s = max_gap_s
+        self.history = history
+        self.decisions: List[ChunkDecision] = []
+
+    def estimate_audio_seconds(self, text: str) -> float:
+        return max(0.5, len(text) / self.chars_per_second)
+
+    def choose(self, index: int, text: str, budget_s: float,
+               elapsed_s: float = 0.0) -> Tuple[TTSBackend, ChunkDecision]:
+        """elapsed_s is Bark time the chunk has already had, when it started earlier"""
+        estimated = max(0.0, self.rtf.value * self.estimate_audio_seconds(text) - elapsed_s)
+        budget = budget_s + self.max_gap_s
+        if self.fallback is None:
+            backend, reason = self.primary, "no fast engine available"
+        elif estimated <= budget:
+            backend, reason = self.primary, "fits budget"
+        else:
+            backend, reason = self.fallback, "bark would miss the deadline"
+        decision = ChunkDecision(index, backend.name, budget, estimated, self.rtf.value, reason)
+        self.decisions.append(decision)
+        del self.decisions[:-self.history]
+        budget_text = "unbounded" if budget == float('inf') else f"{budget:.1f}s"
+        print(f"TTS chunk {index + 1}: {backend.name} ({reason}; bark est {estimated:.1f}s, "
+              f"budget {budget_text}, rtf {self.rtf.value:.2f})")
+        return backend, decision
+
+    def render(self, backend: TTSBackend, text: str, speaker_name: str,
+               cancel_token=None) -> Optional[np.ndarray]:
+        """Render with backend, feeding Bark timings back into the RTF estimate"""
+        start = time.perf_counter()
+        audio = backend.synthesize(text, speaker_name, cancel_token=cancel_token)
+        if audio is not None and backend is self.primary:
+            self.rtf.record(time.perf_counter() - start, len(audio) / backend.sample_rate)
+        if audio is None and backend is self.primary and self.fallback is not None:
+            check_cancelled(cancel_token)
+            print("Bark failed for this chunk, using the fast engine")
+            audio = self.fallback.synthesize(text, speaker_name, cancel_token=cancel_token)
+        return audio
+
+
+def create_fast_backend(name: str, sample_rate: int, voice: str = "en",
+                        words_per_minute: int = 170) -> Optional[TTSBackend]:
+    """Build the degraded-path engine by name ('espeak' or 'none')"""
+    if name in ("espeak", "espeak-ng"):
+        backend = EspeakBackend(sample_rate, voice, words_per_minute)
+        if not backend.available:
+            print("espeak-ng not found; TTS will not fall back to a fast engine")
+            return None
+        return backend
+    if name in ("", "none"):
+        return None
+    raise ValueError(f"Unknown fast TTS engine '{name}'")
@@ -1,25 +1,89 @@
 import threading
 from queue import Queue
 import time
-import numpy as np
-from scipy.io.wavfile import write as write_wav
-import sounddevice as sd
-from bark import SAMPLE_RATE
+from typing import Optional
+from concurrent.futures import TimeoutError as FutureTimeout
+from src.cancellation import AnyCancelled, CancellationToken, SynthesisCancelled, check_cancelled
+from src.audio_output import AudioSink, create_sink
+from src.prosody import apply_prosody
+from src.tts_backends import BarkBackend, TTSBackend, TTSScheduler, create_fast_backend
+from config.settings import settings
+
+
+def split_text_for_synthesis(text: str, max_length: int = 100) -> list:
+    """Split text into chunks suitable for synthesis"""
+    # Simple splitting by sentences or length
+    sentences = text.split('. ')
+    chunks = []
+    current_chunk = ""
+    
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) < max_length:
+            current_chunk += sentence + ". "
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = sentence + ". "
+    
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    
+    return chunks
+
 
 class BarkTTSEngine:
-    def __init__(self, voice_cloner):
+    # Chunks started in the Bark stage pipeline ahead of the one playing next
+    pipeline_lookahead = 3
+
+    def __init__(self, voice_cloner, sink: AudioSink = None, fast_backend: TTSBackend = None):
         self.voice_cloner = voice_cloner
-        self.sample_rate = SAMPLE_RATE
+        self.sample_rate = voice_cloner.sample_rate
+        # One persistent output stream for every utterance
+        self.sink = sink if sink is not None else create_sink(
+            settings.audio.output_sink,
+            self.sample_rate,
+            crossfade_ms=settings.audio.output_crossfade_ms,
+            path=settings.audio.output_path,
+            buffer_seconds=settings.audio.output_buffer_seconds
+        )
+        # Bark is the primary backend; the fast engine covers chunks Bark
+        # could not render in time
+        if fast_backend is None:
+            fast_backend = create_fast_backend(
+                settings.tts.fast_engine,
+                self.sample_rate,
+                voice=settings.tts.fast_voice,
+                words_per_minute=settings.tts.fast_words_per_minute
+            )
+        self.scheduler = TTSScheduler(
+            BarkBackend(voice_cloner),
+            fast_backend,
+            rtf_prior=settings.tts.bark_rtf_prior,
+            chars_per_second=settings.tts.speech_chars_per_second,
+            max_gap_s=settings.tts.max_gap_s
+        )
+        # Delivery preferences are applied to each rendered chunk, so
+        # changing them never costs another Bark generation
+        self.speaking_rate = settings.tts.speaking_rate
+        self.pitch_semitones = settings.tts.pitch_semitones
         self.speech_queue = Queue()
         self.is_speaking = False
         self.thread = None
+        self.cancel_token = None
         
-    def speak(self, text: str, speaker_name: str = "user", blocking: bool = False):
-        """Speak text using Bark TTS with cloned voice"""
+    def speak(self, text: str, speaker_name: str = "user", blocking: bool = False,
+              deadline: Optional[float] = None):
+        """Speak text using Bark TTS with cloned voice.
+
+        deadline is a time.monotonic() by which the first audio should play;
+        it defaults to settings.tts.first_audio_deadline_s from now.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + settings.tts.first_audio_deadline_s
         if blocking:
-            self._synthesize_and_play(text, speaker_name)
+            self._synthesize_and_play(text, speaker_name, deadline)
         else:
-            self.speech_queue.put((text, speaker_name))
+            self.speech_queue.put((text, speaker_name, deadline))
             if not self.is_speaking:
                 self._start_speaking_thread()
     
@@ -34,57 +98,152 @@ class BarkTTSEngine:
         """Background worker for non-blocking speech"""
         self.is_speaking = True
         while not self.speech_queue.empty():
-            text, speaker_name = self.speech_queue.get()
-            self._synthesize_and_play(text, speaker_name)
+            text, speaker_name, deadline = self.speech_queue.get()
+            self._synthesize_and_play(text, speaker_name, deadline)
             self.speech_queue.task_done()
             time.sleep(0.1)
         self.is_speaking = False
     
-    def _synthesize_and_play(self, text: str, speaker_name: str):
+    def _synthesize_and_play(self, text: str, speaker_name: str,
+                             deadline: Optional[float] = None):
         """Synthesize and play audio"""
+        cancel_token = CancellationToken()
+        self.cancel_token = cancel_token
         try:
             # Split long text into smaller chunks for better synthesis
-            chunks = self._split_text_for_synthesis(text)
-            
-            for chunk in chunks:
-                if chunk.strip():
-                    # Synthesize audio using Bark
-                    audio = self.voice_cloner.synthesize_speech(
-                        text=chunk,
-                        speaker_name=speaker_name
-                    )
-                    
-                    if audio is not None:
-                        # Play audio
-                        sd.play(audio, self.sample_rate)
-                        sd.wait()  # Wait until playback is finished
+            chunks = [c for c in self._split_text_for_synthesis(text) if c.strip()]
+
+            if self.scheduler.fallback is None:
+                audio_chunks = self._render_pipelined(chunks, speaker_name, cancel_token)
+            else:
+                audio_chunks = self._render_scheduled(chunks, speaker_name, deadline, cancel_token)
+            for audio in audio_chunks:
+                if cancel_token.cancelled:
+                    break
+                if audio is not None:
+                    audio = apply_prosody(audio, self.speaking_rate, self.pitch_semitones)
+                    # Blocks while the sink's buffer is full
+                    self.sink.write(audio)
+
+            if cancel_token.cancelled:
+                self.sink.stop()
+                return
+            self.sink.end_utterance()
+            # Wait for playback to finish, but give up as soon as we are stopped
+            while not self.sink.drain(timeout=0.05):
+                if cancel_token.cancelled:
+                    break
                     
+        except SynthesisCancelled:
+            self.sink.stop()
         except Exception as e:
             print(f"Error in speech synthesis: {e}")
     
+    def _render_pipelined(self, chunks: list, speaker_name: str, cancel_token):
+        """Bark only: later chunks keep rendering in the stage pipeline while earlier ones play"""
+        return self.voice_cloner.synthesize_chunks(chunks, speaker_name, cancel_token=cancel_token)
+    
+    def _render_scheduled(self, chunks: list, speaker_name: str,
+                          deadline: Optional[float], cancel_token):
+        """Bark chunks overlap in the stage pipeline; one that will not be ready in time is replaced.
+
+        Each chunk gets its own token on top of the request's, so dropping a
+        late chunk in favour of the fast engine stops only that chunk's
+        stages while the following chunks keep rendering.
+        """
+        started = {}  # chunk index -> (future or None, chunk token)
+
+        def start(index: int):
+            if index >= len(chunks) or index in started:
+                return
+            token = CancellationToken()
+            try:
+                future = self.voice_cloner.submit_chunk(
+                    chunks[index], speaker_name, cancel_token=AnyCancelled([cancel_token, token])
+                )
+            except Exception as e:
+                print(f"Could not start Bark for chunk {index + 1}: {e}")
+                future = None
+            started[index] = (future, token)
+
+        try:
+            # Bark time a chunk has had: it gets the pipeline once the previous one is out
+            slot_start = time.monotonic()
+            for i, chunk in enumerate(chunks):
+                for j in range(i, i + self.pipeline_lookahead):
+                    start(j)
+                future, token = started[i]
+                if i == 0 and deadline is not None:
+                    budget = deadline - time.monotonic()
+                else:
+                    # Audio already queued plays while this chunk renders
+                    budget = self.sink.buffered_seconds
+
+                waited = future is not None and not future.done()
+                if future is None:
+                    backend = self.scheduler.fallback
+                elif waited:
+                    backend, _ = self.scheduler.choose(i, chunk, budget,
+                                                       elapsed_s=time.monotonic() - slot_start)
+                else:
+                    backend = self.scheduler.primary
+
+                if backend is not self.scheduler.primary:
+                    if future is not None:
+                        token.cancel("replaced by the fast engine")
+                        self.voice_cloner.cancel_chunk(future)
+                    audio = self.scheduler.render(backend, chunk, speaker_name, cancel_token)
+                else:
+                    audio = self._wait_for_chunk(future, cancel_token)
+                    if audio is not None and waited:
+                        self.scheduler.rtf.record(time.monotonic() - slot_start,
+                                                  len(audio) / self.sample_rate)
+                    if audio is None:
+                        print("Bark failed for this chunk, using the fast engine")
+                        audio = self.scheduler.render(self.scheduler.fallback, chunk,
+                                                      speaker_name, cancel_token)
+                del started[i]
+                slot_start = time.monotonic()
+                yield audio
+        finally:
+            for future, token in started.values():
+                token.cancel("stopped")
+                if future is not None:
+                    self.voice_cloner.cancel_chunk(future)
+
+    def _wait_for_chunk(self, future, cancel_token, poll_interval: float = 0.05):
+        """A pipeline chunk's audio, or None if Bark failed"""
+        while True:
+            check_cancelled(cancel_token)
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeout:
+                continue
+            except SynthesisCancelled:
+                raise
+            except Exception as e:
+                print(f"Error synthesizing speech with Bark: {e}")
+                return None
+    
     def _split_text_for_synthesis(self, text: str, max_length: int = 100) -> list:
         """Split text into chunks suitable for synthesis"""
-        # Simple splitting by sentences or length
-        sentences = text.split('. ')
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            if len(current_chunk) + len(sentence) < max_length:
-                current_chunk += sentence + ". "
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence + ". "
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+        return split_text_for_synthesis(text, max_length)
     
-    def stop(self):
-        """Stop speaking"""
-        sd.stop()
+    def wait_until_done(self, poll_interval: float = 0.05):
+        """Block until queued speech has finished or been stopped"""
+        while self.is_speaking or not self.speech_queue.empty():
+            time.sleep(poll_interval)
+    
+    def stop(self, reason: str = "stopped"):
+        """Stop speaking and cancel any synthesis still in flight"""
+        if self.cancel_token is not None:
+            self.cancel_token.cancel(reason)
+        self.sink.stop()
         while not self.speech_queue.empty():
             self.speech_queue.get()
-            self.speech_queue.task_done()
\ No newline at end of file
+            self.speech_queue.task_done()
+    
+    def close(self):
+        """Stop speaking and release the output stream"""
+        self.stop()
+        self.sink.close()
@@ -1,36 +1,105 @@
-import torch
-import torchaudio
+import hashlib
 import numpy as np
 import os
-from typing import List, Optional, Dict, Tuple
+from importlib.util import find_spec
+from typing import Iterator, List, Optional, Dict, Tuple, Union
 import json
-import librosa
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import replace
 import soundfile as sf
+from config.settings import settings
+from src.voice_manifest import VoiceManifest, characteristics_from_stats, compute_feature_stats, hash_file
+from src.voice_registry import VoiceRegistry
+from src.audio_cache import load_audio
+from src.denoise import denoise_file, gate_signature
+from src.audio_writer import write_audio
+from src.segment_index import assemble_segments
+from src.sample_rates import MODEL_RATE, resample
+from src.cancellation import SynthesisCancelled
 
-try:
-    from bark import SAMPLE_RATE, generate_audio, preload_models
-    from scipy.io.wavfile import write as write_wav
-    BARK_AVAILABLE = True
-except ImportError:
+# Bark pulls in torch and transformers, so only check that it is installed
+# here; it is imported when the cloner loads its models
+BARK_AVAILABLE = find_spec("bark") is not None
+if not BARK_AVAILABLE:
     print("Bark not available. Please install it with: pip install suno-bark")
-    BARK_AVAILABLE = False
-    # Define fallback constants
-    SAMPLE_RATE = 24000
+SAMPLE_RATE = MODEL_RATE
 
 class BarkVoiceCloner:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, performance_profile: Optional[str] = None):
+        self.device = settings.model.resolve_device()
         self.sample_rate = SAMPLE_RATE
         self.voice_embeddings = {}
         self.voice_prompts = {}
+        self.batch_scheduler = None
+        self.pipeline = None
+        self.worker_pool = None
+        self.memory_governor = None
+        self.performance = replace(settings.performance)
+        if performance_profile is not None:
+            self.performance.profile = performance_profile
+        self.model_info = {}
         
-        if BARK_AVAILABLE:
-            # Preload Bark models
-            print("Loading Bark models...")
-            preload_models()
+        # Index every saved voice once; lookups after this are in-memory
+        self.voice_registry = VoiceRegistry(
+            settings.models_dir,
+            max_cache_bytes=settings.registry.max_prompt_cache_mb * 1024 * 1024,
+            revalidate_interval=settings.registry.revalidate_interval_s
+        )
+        self.voice_registry.start()
+        
+        if BARK_AVAILABLE and settings.worker_pool.enabled:
+            # Workers map one shared copy of the weights; this process
+            # only routes jobs and never loads the models itself
+            from src.worker_pool import SynthesisWorkerPool
+            self.worker_pool = SynthesisWorkerPool(
+                num_workers=settings.worker_pool.num_workers,
+                threads_per_worker=settings.worker_pool.threads_per_worker,
+                shared_dir=settings.worker_pool.shared_weights_dir,
+                use_small_models=self.performance.use_small_models,
+                use_kv_caching=self.performance.use_kv_caching,
+                fine_temperature=settings.pipeline.fine_temperature,
+                max_retries=settings.worker_pool.max_retries,
+                partition_cores=settings.worker_pool.partition_cores,
+                min_partition_width=settings.worker_pool.min_partition_width
+            ).start()
+        elif BARK_AVAILABLE:
+            # Preload Bark models with the configured performance profile
+            from src.cpu_profile import load_bark_models
+            print(f"Loading Bark models ({self.performance.profile} profile)...")
+            self.model_info = load_bark_models(self.performance)
             print("Bark models loaded successfully!")
+            
+            if settings.memory_governor.enabled:
+                # Shrink the footprint while the assistant is not talking
+                from src.memory_governor import ModelMemoryGovernor, install_governor
+                quantized = [k for k, q in self.model_info.get('quantized', {}).items() if q]
+                self.memory_governor = ModelMemoryGovernor(
+                    idle_ttl=settings.memory_governor.idle_ttl_s,
+                    check_interval=settings.memory_governor.check_interval_s,
+                    min_available_bytes=settings.memory_governor.min_available_mb * 1024 * 1024,
+                    offload_dir=settings.memory_governor.offload_dir,
+                    use_small_models=self.performance.use_small_models,
+                    quantized=quantized
+                )
+                install_governor(self.memory_governor)
+                self.memory_governor.start()
+            
+            from src.bark_pipeline import BarkStagePipeline, SemanticTokenCache
+            self.pipeline = BarkStagePipeline(
+                semantic_cache=SemanticTokenCache(settings.pipeline.semantic_cache_size),
+                use_kv_caching=self.performance.use_kv_caching,
+                fine_temperature=settings.pipeline.fine_temperature
+            )
+            
+            if settings.batching.enabled:
+                from src.batch_scheduler import BarkBatchScheduler
+                self.batch_scheduler = BarkBatchScheduler(
+                    max_batch_size=settings.batching.max_batch_size,
+                    max_wait_ms=settings.batching.max_wait_ms,
+                    use_kv_caching=self.performance.use_kv_caching
+                )
+                self.batch_scheduler.start()
         else:
             print("Bark is not available. Using fallback mode.")
     
@@ -38,64 +107,32 @@ class BarkVoiceCloner:
         """Extract voice characteristics from audio for better cloning"""
         try:
             # Load audio
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
-            
-            # Extract features
-            features = {}
-            
-            # MFCC features
-            mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=20)
-            features['mfcc_mean'] = np.mean(mfcc, axis=1)
-            features['mfcc_std'] = np.std(mfcc, axis=1)
-            
-            # Spectral features
-            spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)
-            features['spectral_centroid_mean'] = np.mean(spectral_centroid)
-            
-            # Pitch features
-            f0, voiced_flag, voiced_probs = librosa.pyin(audio, fmin=50, fmax=500, sr=sr)
-            features['pitch_mean'] = np.nanmean(f0) if np.any(voiced_flag) else 0
-            features['pitch_std'] = np.nanstd(f0) if np.any(voiced_flag) else 0
-            
-            # Energy features
-            rms = librosa.feature.rms(y=audio)
-            features['energy_mean'] = np.mean(rms)
+            audio, sr = load_audio(audio_path, self.sample_rate)
             
-            # Duration and timing features
-            features['duration'] = len(audio) / sr
-            
-            return features
+            # Per-frame stats in mergeable form, reduced to means and stds
+            return characteristics_from_stats(compute_feature_stats(audio, sr))
             
         except Exception as e:
             print(f"Error extracting voice characteristics: {str(e)}")
             return {}
     
-    def create_voice_prompt(self, audio_path: str, speaker_name: str) -> bool:
+    def create_voice_prompt(self, audio_path: str, speaker_name: str,
+                            characteristics: Optional[Dict] = None) -> bool:
         """Create a voice prompt for Bark voice cloning"""
         try:
             # For Bark, we use the audio directly as a prompt
             # We'll create a cleaned version optimized for Bark
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
+            audio, sr = load_audio(audio_path, self.sample_rate)
             
             # Save the processed audio as voice prompt
-            prompt_path = f"data/models/{speaker_name}_prompt.wav"
+            prompt_path = f"{settings.models_dir}/{speaker_name}_prompt.wav"
             sf.write(prompt_path, audio, sr)
             
             # Store voice characteristics for reference
-            characteristics = self.extract_voice_characteristics(audio_path)
-            self.voice_embeddings[speaker_name] = characteristics
-            
-            # Save characteristics to file
-            char_path = f"data/models/{speaker_name}_characteristics.json"
-            with open(char_path, 'w') as f:
-                # Convert numpy arrays to lists for JSON serialization
-                serializable_chars = {}
-                for key, value in characteristics.items():
-                    if isinstance(value, np.ndarray):
-                        serializable_chars[key] = value.tolist()
-                    else:
-                        serializable_chars[key] = value
-                json.dump(serializable_chars, f)
+            if characteristics is None:
+                characteristics = self.extract_voice_characteristics(audio_path)
+            self._save_characteristics(speaker_name, characteristics)
+            self.voice_registry.refresh()
             
             print(f"Voice prompt created for {speaker_name}")
             return True
@@ -104,21 +141,32 @@ class BarkVoiceCloner:
             print(f"Error creating voice prompt: {str(e)}")
             return False
     
-    def load_voice_prompt(self, speaker_name: str) -> Optional[str]:
+    def _save_characteristics(self, speaker_name: str, characteristics: Dict):
+        """Store voice characteristics in memory and on disk"""
+        self.voice_embeddings[speaker_name] = characteristics
+        
+        char_path = f"{settings.models_dir}/{speaker_name}_characteristics.json"
+        with open(char_path, 'w') as f:
+            # Convert numpy arrays to lists for JSON serialization
+            serializable_chars = {}
+            for key, value in characteristics.items():
+                if isinstance(value, np.ndarray):
+                    serializable_chars[key] = value.tolist()
+                else:
+                    serializable_chars[key] = value
+            json.dump(serializable_chars, f)
+    
+    def load_voice_prompt(self, speaker_name: str) -> Optional[Union[str, Dict]]:
         """Load voice prompt for a speaker"""
         try:
-            prompt_path = f"data/models/{speaker_name}_prompt.wav"
-            if os.path.exists(prompt_path):
-                return prompt_path
+            prompt = self.voice_registry.get_prompt(speaker_name)
             
-            # Also try to load characteristics
-            char_path = f"data/models/{speaker_name}_characteristics.json"
-            if os.path.exists(char_path):
-                with open(char_path, 'r') as f:
-                    characteristics = json.load(f)
-                    self.voice_embeddings[speaker_name] = characteristics
+            # Also keep the characteristics at hand
+            characteristics = self.voice_registry.get_characteristics(speaker_name)
+            if characteristics:
+                self.voice_embeddings[speaker_name] = characteristics
             
-            return None
+            return prompt
         except Exception as e:
             print(f"Error loading voice prompt: {str(e)}")
             return None
@@ -126,8 +174,15 @@ class BarkVoiceCloner:
     def synthesize_speech(self, text: str, speaker_name: str, 
                          output_path: str = None,
                          temperature: float = 0.7,
-                         silence_padding: float = 0.5) -> Optional[np.ndarray]:
-        """Synthesize speech using Bark with voice cloning"""
+                         silence_padding: float = 0.5,
+                         cancel_token=None,
+                         rate: float = 1.0,
+                         pitch_semitones: float = 0.0) -> Optional[np.ndarray]:
+        """Synthesize speech using Bark with voice cloning.
+
+        rate and pitch_semitones are applied to the render afterwards with
+        DSP (see src.prosody); Bark itself is unaffected.
+        """
         try:
             if not BARK_AVAILABLE:
                 print("Bark is not available. Cannot synthesize speech.")
@@ -136,34 +191,187 @@ class BarkVoiceCloner:
             # Load voice prompt
             prompt_path = self.load_voice_prompt(speaker_name)
             
-            if not prompt_path:
+            if prompt_path is None:
                 raise ValueError(f"No voice prompt found for {speaker_name}")
             
-            # Generate audio using Bark with voice prompt
-            audio_array = generate_audio(
-                text,
-                history_prompt=prompt_path,  # This enables voice cloning
-                text_temp=temperature,
-                waveform_temp=temperature,
-                silent_duration=silence_padding
-            )
+            if self.worker_pool is not None:
+                audio_array = self.worker_pool.generate(
+                    text, prompt_path, temperature=temperature, cancel_token=cancel_token
+                )
+            elif self.batch_scheduler is not None:
+                # Share forward passes with other concurrent requests
+                audio_array = self.batch_scheduler.generate(
+                    text, prompt_path, temperature=temperature, cancel_token=cancel_token
+                )
+            else:
+                # Run Bark's stages one after another; the voice prompt
+                # is passed as history to enable voice cloning
+                audio_array = self.pipeline.submit(
+                    text, prompt_path, self.voice_registry.voice_key(speaker_name),
+                    temperature=temperature, cancel_token=cancel_token
+                ).result()
+            
+            if rate != 1.0 or pitch_semitones != 0.0:
+                from src.prosody import apply_prosody
+                audio_array = apply_prosody(audio_array, rate, pitch_semitones)
+            
+            if silence_padding > 0:
+                audio_array = np.concatenate([
+                    audio_array,
+                    np.zeros(int(silence_padding * self.sample_rate), dtype=audio_array.dtype)
+                ])
             
             if output_path:
-                write_wav(output_path, self.sample_rate, audio_array)
-                return None
-            else:
-                return audio_array
+                write_audio(output_path, audio_array, self.sample_rate)
+            # Returned even when saved, so callers can tell success from failure
+            return audio_array
                 
+        except SynthesisCancelled:
+            return None
         except Exception as e:
             print(f"Error synthesizing speech with Bark: {str(e)}")
             return None
     
+    def synthesize_chunks(self, chunks: List[str], speaker_name: str,
+                          temperature: float = 0.7,
+                          cancel_token=None) -> Iterator[np.ndarray]:
+        """Synthesize several chunks with Bark stages pipelined across chunks"""
+        if not BARK_AVAILABLE:
+            print("Bark is not available. Cannot synthesize speech.")
+            return
+        
+        prompt_path = self.load_voice_prompt(speaker_name)
+        if prompt_path is None:
+            print(f"Error synthesizing speech with Bark: No voice prompt found for {speaker_name}")
+            return
+        
+        try:
+            if self.worker_pool is not None:
+                yield from self._render_on_workers(chunks, prompt_path, temperature, cancel_token)
+                return
+            yield from self.pipeline.render(
+                chunks, prompt_path, self.voice_registry.voice_key(speaker_name),
+                temperature=temperature, cancel_token=cancel_token
+            )
+        except SynthesisCancelled:
+            return
+        except Exception as e:
+            print(f"Error synthesizing speech with Bark: {str(e)}")
+    
+    def submit_chunk(self, text: str, speaker_name: str, temperature: float = 0.7,
+                     cancel_token=None) -> Future:
+        """Start one chunk through the stage pipeline (or worker pool); returns a future of the waveform"""
+        if not BARK_AVAILABLE:
+            raise RuntimeError("Bark is not available")
+        prompt_path = self.load_voice_prompt(speaker_name)
+        if prompt_path is None:
+            raise ValueError(f"No voice prompt found for {speaker_name}")
+        if self.worker_pool is not None:
+            return self.worker_pool.submit(text, prompt_path, temperature)
+        return self.pipeline.submit(text, prompt_path, self.voice_registry.voice_key(speaker_name),
+                                    temperature=temperature, cancel_token=cancel_token)
+    
+    def cancel_chunk(self, future: Future):
+        """Stop a chunk started with submit_chunk that is no longer wanted"""
+        if self.worker_pool is not None:
+            self.worker_pool.cancel(future)
+        else:
+            # Stages already running stop through the chunk's cancel token
+            future.cancel()
+    
+    def synthesize_best_of(self, text: str, speaker_name: str,
+                           candidates: Optional[int] = None,
+                           temperature: float = 0.7,
+                           output_path: str = None,
+                           cancel_token=None) -> Tuple[Optional[np.ndarray], Dict]:
+        """Render several takes and keep the one closest to the speaker's profile"""
+        config = settings.best_of_k
+        k = candidates or config.candidates
+        try:
+            if not BARK_AVAILABLE:
+                print("Bark is not available. Cannot synthesize speech.")
+                return None, {}
+            
+            prompt_path = self.load_voice_prompt(speaker_name)
+            if prompt_path is None:
+                raise ValueError(f"No voice prompt found for {speaker_name}")
+            
+            def score(audio):
+                return self.similarity_to_profile(audio, speaker_name)
+            
+            if self.worker_pool is not None:
+                # Workers render whole takes, so there is no early abort here
+                futures = [self.worker_pool.submit(text, prompt_path, temperature) for _ in range(k)]
+                try:
+                    takes = [self.worker_pool.wait(future, cancel_token) for future in futures]
+                finally:
+                    for future in futures:
+                        if not future.done():
+                            self.worker_pool.cancel(future)
+                scores = [score(take) for take in takes]
+                best = int(np.argmax(scores))
+                audio_array = takes[best]
+                report = {'k': k, 'chosen': best, 'similarity': scores[best], 'scores': scores}
+            else:
+                from src.best_of_k import render_best_of_k
+                audio_array, report = render_best_of_k(
+                    text, prompt_path, score, k=k, temperature=temperature,
+                    min_similarity=config.min_similarity,
+                    probe_seconds=config.probe_seconds,
+                    speech_rate_range=(config.min_chars_per_second, config.max_chars_per_second),
+                    use_kv_caching=self.performance.use_kv_caching,
+                    fine_temperature=settings.pipeline.fine_temperature,
+                    cancel_token=cancel_token
+                )
+            
+            if output_path:
+                write_audio(output_path, audio_array, self.sample_rate)
+            return audio_array, report
+        
+        except SynthesisCancelled:
+            return None, {}
+        except Exception as e:
+            print(f"Error synthesizing speech with Bark: {str(e)}")
+            return None, {}
+    
+    def memory_report(self) -> Dict:
+        """Resident Bark model memory and process RSS"""
+        if self.memory_governor is not None:
+            return self.memory_governor.report()
+        from src.memory_governor import process_rss_bytes
+        return {'process_rss_bytes': process_rss_bytes()}
+    
+    def _render_on_workers(self, chunks: List[str], history_prompt, temperature: float,
+                           cancel_token=None, lookahead: int = 2) -> Iterator[np.ndarray]:
+        """Render chunks across the worker pool, yielding them in order.
+
+        Only ``lookahead`` chunks are in flight at a time, so a barge-in
+        leaves at most that many jobs to cancel on the workers.
+        """
+        pending = iter(chunks)
+        futures = deque()
+        try:
+            for chunk in pending:
+                futures.append(self.worker_pool.submit(chunk, history_prompt, temperature))
+                if len(futures) >= lookahead:
+                    break
+            while futures:
+                audio = self.worker_pool.wait(futures.popleft(), cancel_token)
+                for chunk in pending:
+                    futures.append(self.worker_pool.submit(chunk, history_prompt, temperature))
+                    break
+                yield audio
+        finally:
+            for future in futures:
+                self.worker_pool.cancel(future)
+    
     def fine_tune_voice_similarity(self, reference_audio: np.ndarray, 
-                                  generated_audio: np.ndarray) -> float:
+                                  generated_audio: np.ndarray,
+                                  reference_sr: Optional[int] = None) -> float:
         """Calculate similarity between reference and generated audio"""
         try:
-            # Extract features from both audios
-            ref_features = self.extract_features_from_audio(reference_audio)
+            # Extract features from both audios at the model rate
+            ref_features = self.extract_features_from_audio(reference_audio, reference_sr)
             gen_features = self.extract_features_from_audio(generated_audio)
             
             # Calculate similarity (simple cosine similarity on MFCCs)
@@ -177,10 +385,29 @@ class BarkVoiceCloner:
             print(f"Error calculating voice similarity: {str(e)}")
             return 0.0
     
-    def extract_features_from_audio(self, audio: np.ndarray) -> Dict:
+    def similarity_to_profile(self, generated_audio: np.ndarray, speaker_name: str) -> float:
+        """Similarity between generated audio and a speaker's stored profile"""
+        try:
+            profile = self.voice_embeddings.get(speaker_name)
+            if not profile or 'mfcc_mean' not in profile:
+                return 0.0
+            gen_features = self.extract_features_from_audio(generated_audio)
+            return self.cosine_similarity(
+                np.asarray(profile['mfcc_mean']),
+                gen_features['mfcc_mean']
+            )
+        except Exception as e:
+            print(f"Error calculating voice similarity: {str(e)}")
+            return 0.0
+    
+    def extract_features_from_audio(self, audio: np.ndarray, sr: Optional[int] = None) -> Dict:
         """Extract features from audio array"""
         features = {}
+        # Features are only comparable when computed at one rate
+        if sr is not None:
+            audio = resample(audio, sr, self.sample_rate)
         
+        import librosa
         # MFCC features
         mfcc = librosa.feature.mfcc(y=audio, sr=self.sample_rate, n_mfcc=20)
         features['mfcc_mean'] = np.mean(mfcc, axis=1)
@@ -194,13 +421,13 @@ class BarkVoiceCloner:
     
     def list_available_voices(self) -> List[str]:
         """List available cloned voices"""
-        return list(self.voice_embeddings.keys())
+        return self.voice_registry.list_voices()
     
     def optimize_prompt_for_bark(self, audio_path: str, output_path: str) -> bool:
         """Optimize audio prompt for better Bark performance"""
         try:
             # Load audio
-            audio, sr = librosa.load(audio_path, sr=self.sample_rate)
+            audio, sr = load_audio(audio_path, self.sample_rate)
             
             # Remove silence using simple energy-based method
             from pydub import AudioSegment, effects
@@ -224,47 +451,121 @@ class BarkVoiceCloner:
             print(f"Error optimizing prompt: {str(e)}")
             return False
     
+    @staticmethod
+    def _ingest_signature() -> str:
+        """What corpus audio goes through before analysis; manifests are keyed on it"""
+        config = settings.denoise
+        if not config.ingest:
+            return "raw"
+        return "denoise-" + gate_signature(config.n_fft, n_std_thresh=config.n_std_thresh,
+                                           prop_decrease=config.prop_decrease,
+                                           time_smoothing=config.time_smoothing)
+    
+    def _load_recording(self, path: str) -> Tuple[np.ndarray, int]:
+        """Decode a corpus recording, denoised first when ingest denoising is on"""
+        config = settings.denoise
+        if not config.ingest:
+            return load_audio(path, self.sample_rate)
+        # One denoised copy per recording content and gate settings, made in
+        # constant memory
+        cleaned = os.path.join(config.cache_dir, f"{hash_file(path)}_{self._ingest_signature()}.wav")
+        if not os.path.exists(cleaned):
+            os.makedirs(config.cache_dir, exist_ok=True)
+            tmp = f"{cleaned}.{os.getpid()}.tmp.wav"
+            try:
+                profile = denoise_file(path, tmp, n_fft=config.n_fft,
+                                       n_std_thresh=config.n_std_thresh,
+                                       prop_decrease=config.prop_decrease,
+                                       time_smoothing=config.time_smoothing)
+            except Exception as e:
+                print(f"Could not denoise {path}, using it as recorded: {e}")
+                profile = None
+            if profile is None:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return load_audio(path, self.sample_rate)
+            os.replace(tmp, cleaned)
+        return load_audio(cleaned, self.sample_rate)
+    
     def create_voice_from_multiple_samples(self, audio_directory: str, 
                                          speaker_name: str) -> bool:
         """Create voice prompt from multiple audio samples"""
         try:
-            audio_files = [f for f in os.listdir(audio_directory) 
-                          if f.endswith(('.wav', '.mp3', '.m4a'))]
-            
-            if not audio_files:
+            # The manifest remembers every recording it has already decoded,
+            # so only new or changed files are loaded here
+            manifest = VoiceManifest.for_speaker(speaker_name, settings.models_dir)
+            changes = manifest.sync(audio_directory, self._load_recording,
+                                    preprocess=self._ingest_signature())
+            print(f"Corpus: {len(changes.added)} added, {len(changes.updated)} updated, "
+                  f"{len(changes.removed)} removed, {changes.unchanged} unchanged")
+            
+            if not manifest.recordings():
                 print("No audio files found")
                 return False
             
-            # Find the best sample (longest duration with good quality)
-            best_file = None
-            max_duration = 0
-            
-            for audio_file in audio_files:
-                file_path = os.path.join(audio_directory, audio_file)
-                try:
-                    audio, sr = librosa.load(file_path, sr=self.sample_rate)
-                    duration = len(audio) / sr
-                    
-                    # Check if this is a better sample
-                    if duration > max_duration and duration > 3.0:  # At least 3 seconds
-                        max_duration = duration
-                        best_file = file_path
-                except Exception as e:
-                    print(f"Error processing {audio_file}: {e}")
-                    continue
-            
-            if best_file:
-                print(f"Using {best_file} for voice cloning (duration: {max_duration:.2f}s)")
+            # Build the prompt from the best voiced segments across the whole
+            # corpus; the segment index is a table query, nothing is re-scanned
+            config = settings.voice_prompt
+            selection = manifest.best_segments(
+                config.target_seconds,
+                min_snr_db=config.min_snr_db,
+                max_clipping=config.max_clipping,
+                min_voiced_ratio=config.min_voiced_ratio,
+                jitter_weight=config.jitter_weight,
+                clipping_weight=config.clipping_weight
+            )
+            if selection:
+                source_key = hashlib.sha1(json.dumps(
+                    [(s['content_hash'], s['start'], s['end']) for s in selection]
+                ).encode()).hexdigest()
+            else:
+                # Nothing passes the quality floor: longest recording, as before
+                best = manifest.best_recording(min_duration=3.0)
+                if best is None:
+                    return False
+                source_key = best['content_hash']
+            
+            characteristics = manifest.speaker_characteristics()
+            prompt_path = f"{settings.models_dir}/{speaker_name}_prompt.wav"
+            if (manifest.get_meta('prompt_source_hash') == source_key
+                    and os.path.exists(prompt_path)):
+                # Same source audio as last time: only refresh the profile
+                print(f"Voice prompt for {speaker_name} is up to date")
+                self._save_characteristics(speaker_name, characteristics)
+                self.voice_registry.refresh()
+                return True
+            
+            optimized_path = f"{settings.models_dir}/{speaker_name}_optimized.wav"
+            if selection:
+                seconds = sum(s['duration'] for s in selection)
+                files = len({s['content_hash'] for s in selection})
+                print(f"Using {len(selection)} segments from {files} recordings for voice cloning "
+                      f"({seconds:.1f}s, SNR {min(s['snr_db'] for s in selection):.0f}-"
+                      f"{max(s['snr_db'] for s in selection):.0f} dB)")
+                audio, sr = assemble_segments(
+                    selection,
+                    self._load_recording,
+                    gap_s=config.gap_s,
+                    target_dbfs=config.target_dbfs
+                )
+                write_audio(optimized_path, audio, sr)
+                source = optimized_path
+            else:
+                best_file = best['path']
+                print(f"No segment passes the quality floor; using {best_file} "
+                      f"(duration: {best['duration']:.2f}s)")
                 # Optimize the best sample for Bark
-                optimized_path = f"data/models/{speaker_name}_optimized.wav"
+                source = best_file
                 if self.optimize_prompt_for_bark(best_file, optimized_path):
-                    return self.create_voice_prompt(optimized_path, speaker_name)
-                else:
-                    # Fallback: use original file
-                    return self.create_voice_prompt(best_file, speaker_name)
+                    source = optimized_path
+                # Otherwise fall back to the original file
             
-            return False
+            if not self.create_voice_prompt(source, speaker_name, characteristics):
+                return False
+            manifest.set_meta('prompt_source_hash', source_key)
+            manifest.conn.commit()
+            return True
             
         except Exception as e:
             print(f"Error creating voice from multiple samples: {str(e)}")
-            return False
\ No newline at end of file
+            return False
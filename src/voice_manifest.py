@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.segment_index import SEGMENT_INDEX_VERSION, find_segments, select_segments
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a')
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-1 of a file's contents, read in blocks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _frame_stats(frames: np.ndarray) -> Dict:
+    """Mergeable stats of per-frame features: frames has shape (n_features, n_frames)"""
+    frames = np.atleast_2d(frames).astype(np.float64)
+    return {
+        'count': int(frames.shape[1]),
+        'sum': frames.sum(axis=1).tolist(),
+        'sumsq': (frames ** 2).sum(axis=1).tolist(),
+    }
+
+
+def compute_feature_stats(audio: np.ndarray, sr: int) -> Dict:
+    """Per-file feature statistics as counts, sums and sums of squares"""
+    import librosa
+    mfcc = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=20)
+    spectral_centroid = librosa.feature.spectral_centroid(y=audio, sr=sr)
+    rms = librosa.feature.rms(y=audio)
+    f0, voiced_flag, _ = librosa.pyin(audio, fmin=50, fmax=500, sr=sr)
+    voiced_f0 = f0[voiced_flag & ~np.isnan(f0)] if f0 is not None else np.zeros(0)
+
+    return {
+        'mfcc': _frame_stats(mfcc),
+        'spectral_centroid': _frame_stats(spectral_centroid),
+        'energy': _frame_stats(rms),
+        'pitch': _frame_stats(voiced_f0[None, :]),
+        'samples': {'count': 1, 'sum': [len(audio) / sr], 'sumsq': [(len(audio) / sr) ** 2]},
+    }
+
+
+def merge_stats(a: Dict, b: Dict, sign: int = 1) -> Dict:
+    """Combine two stats dicts; sign=-1 removes b from a"""
+    merged = {}
+    for name in set(a) | set(b):
+        if name not in b:
+            merged[name] = a[name]
+            continue
+        if name not in a:
+            if sign < 0:
+                continue
+            merged[name] = b[name]
+            continue
+        merged[name] = {
+            'count': a[name]['count'] + sign * b[name]['count'],
+            'sum': (np.asarray(a[name]['sum']) + sign * np.asarray(b[name]['sum'])).tolist(),
+            'sumsq': (np.asarray(a[name]['sumsq']) + sign * np.asarray(b[name]['sumsq'])).tolist(),
+        }
+    return merged
+
+
+def _mean_std(entry: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    count = entry['count']
+    if count <= 0:
+        zeros = np.zeros(len(entry['sum']))
+        return zeros, zeros
+    mean = np.asarray(entry['sum']) / count
+    var = np.maximum(np.asarray(entry['sumsq']) / count - mean ** 2, 0.0)
+    return mean, np.sqrt(var)
+
+
+def characteristics_from_stats(stats: Dict) -> Dict:
+    """Turn merged stats into the characteristics dict used by BarkVoiceCloner"""
+    if not stats:
+        return {}
+    features = {}
+    mfcc_mean, mfcc_std = _mean_std(stats['mfcc'])
+    features['mfcc_mean'] = mfcc_mean
+    features['mfcc_std'] = mfcc_std
+    features['spectral_centroid_mean'] = float(_mean_std(stats['spectral_centroid'])[0][0])
+    pitch_mean, pitch_std = _mean_std(stats['pitch'])
+    has_pitch = stats['pitch']['count'] > 0
+    features['pitch_mean'] = float(pitch_mean[0]) if has_pitch else 0
+    features['pitch_std'] = float(pitch_std[0]) if has_pitch else 0
+    features['energy_mean'] = float(_mean_std(stats['energy'])[0][0])
+    features['duration'] = float(stats['samples']['sum'][0])
+    return features
+
+
+@dataclass
+class SyncResult:
+    added: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+
+class VoiceManifest:
+    """Per-speaker SQLite manifest of recordings and mergeable feature stats"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS recordings (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                duration REAL NOT NULL,
+                sample_rate INTEGER NOT NULL,
+                stats TEXT NOT NULL
+            )
+        """)
+        # Voiced segments are keyed by content so renames keep them
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                content_hash TEXT NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                duration REAL NOT NULL,
+                snr_db REAL NOT NULL,
+                clipping REAL NOT NULL,
+                pitch_hz REAL NOT NULL,
+                pitch_jitter REAL NOT NULL,
+                voiced_ratio REAL NOT NULL
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS segments_by_hash ON segments (content_hash)"
+        )
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS segment_index (
+                content_hash TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                noise_db REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def for_speaker(cls, speaker_name: str, models_dir: str = "data/models") -> 'VoiceManifest':
+        return cls(os.path.join(models_dir, f"{speaker_name}_manifest.sqlite"))
+
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                          (key, json.dumps(value)))
+
+    def _profile_stats(self) -> Dict:
+        return self.get_meta('profile_stats', {})
+
+    def _index_segments(self, content_hash: str, audio: np.ndarray, sr: int):
+        # Caller holds self._lock
+        segments, noise_db = find_segments(audio, sr)
+        self.conn.execute("DELETE FROM segments WHERE content_hash = ?", (content_hash,))
+        self.conn.executemany(
+            "INSERT INTO segments (content_hash, start, end, duration, snr_db, clipping, "
+            "pitch_hz, pitch_jitter, voiced_ratio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(content_hash, s.start, s.end, s.duration, s.snr_db, s.clipping,
+              s.pitch_hz, s.pitch_jitter, s.voiced_ratio) for s in segments]
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO segment_index (content_hash, version, noise_db) VALUES (?, ?, ?)",
+            (content_hash, SEGMENT_INDEX_VERSION, noise_db)
+        )
+
+    def _backfill_segments(self, load_audio: Callable[[str], Tuple[np.ndarray, int]]) -> int:
+        # Caller holds self._lock. Recordings indexed before segments existed,
+        # or by an older analysis, are decoded once more here.
+        stale = self.conn.execute(
+            "SELECT MIN(r.path), r.content_hash FROM recordings r "
+            "LEFT JOIN segment_index i ON i.content_hash = r.content_hash "
+            "WHERE i.version IS NULL OR i.version != ? GROUP BY r.content_hash",
+            (SEGMENT_INDEX_VERSION,)
+        ).fetchall()
+        for path, content_hash in stale:
+            try:
+                audio, sr = load_audio(path)
+            except Exception as e:
+                print(f"Error indexing segments of {os.path.basename(path)}: {e}")
+                continue
+            self._index_segments(content_hash, audio, sr)
+        # Drop segments of recordings that are gone
+        self.conn.execute(
+            "DELETE FROM segments WHERE content_hash NOT IN (SELECT content_hash FROM recordings)"
+        )
+        self.conn.execute(
+            "DELETE FROM segment_index WHERE content_hash NOT IN (SELECT content_hash FROM recordings)"
+        )
+        return len(stale)
+
+    def _reset_analysis(self):
+        # Caller holds self._lock. Stats and segments were measured on audio
+        # prepared differently, so every recording is decoded again.
+        self.conn.execute("DELETE FROM recordings")
+        self.conn.execute("DELETE FROM segments")
+        self.conn.execute("DELETE FROM segment_index")
+        self.set_meta('profile_stats', {})
+
+    def sync(self, audio_directory: str,
+             load_audio: Callable[[str], Tuple[np.ndarray, int]],
+             preprocess: str = "") -> SyncResult:
+        """Bring the manifest in line with a directory, decoding only new files.
+
+        ``preprocess`` names what load_audio does to a recording before it
+        is analysed (e.g. denoising and its settings); when it differs from
+        the last sync the stored analysis is discarded. The manifest mirrors
+        one directory: recordings not found in it are removed.
+        """
+        result = SyncResult()
+        audio_directory = os.path.realpath(audio_directory)
+        with self._lock:
+            if self.get_meta('preprocess', "") != preprocess:
+                self._reset_analysis()
+                self.set_meta('preprocess', preprocess)
+            known = {
+                row[0]: row for row in self.conn.execute(
+                    "SELECT path, content_hash, size, mtime, stats FROM recordings"
+                )
+            }
+            by_hash = {row[1]: row for row in known.values()}
+            profile = self._profile_stats()
+            seen = set()
+
+            for name in sorted(os.listdir(audio_directory)):
+                if not name.endswith(AUDIO_EXTENSIONS):
+                    continue
+                path = os.path.join(audio_directory, name)
+                stat = os.stat(path)
+                seen.add(path)
+
+                row = known.get(path)
+                if row is not None and row[2] == stat.st_size and row[3] == stat.st_mtime:
+                    # Same size and mtime: trust the stored entry without hashing
+                    result.unchanged += 1
+                    continue
+
+                content_hash = hash_file(path)
+                if row is not None and row[1] == content_hash:
+                    self.conn.execute("UPDATE recordings SET size = ?, mtime = ? WHERE path = ?",
+                                      (stat.st_size, stat.st_mtime, path))
+                    result.unchanged += 1
+                    continue
+
+                moved = by_hash.get(content_hash)
+                if row is None and moved is not None and moved[0] not in seen \
+                        and not os.path.exists(moved[0]):
+                    # Renamed file: re-key it instead of decoding it again
+                    self.conn.execute(
+                        "UPDATE recordings SET path = ?, size = ?, mtime = ? WHERE path = ?",
+                        (path, stat.st_size, stat.st_mtime, moved[0])
+                    )
+                    known.pop(moved[0], None)
+                    result.updated.append(path)
+                    continue
+
+                try:
+                    audio, sr = load_audio(path)
+                    stats = compute_feature_stats(audio, sr)
+                    self._index_segments(content_hash, audio, sr)
+                except Exception as e:
+                    print(f"Error processing {name}: {e}")
+                    continue
+
+                if row is not None:
+                    profile = merge_stats(profile, json.loads(row[4]), sign=-1)
+                    result.updated.append(path)
+                else:
+                    result.added.append(path)
+                profile = merge_stats(profile, stats)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO recordings "
+                    "(path, content_hash, size, mtime, duration, sample_rate, stats) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, content_hash, stat.st_size, stat.st_mtime,
+                     len(audio) / sr, sr, json.dumps(stats))
+                )
+
+            for path, row in known.items():
+                if path not in seen:
+                    profile = merge_stats(profile, json.loads(row[4]), sign=-1)
+                    self.conn.execute("DELETE FROM recordings WHERE path = ?", (path,))
+                    result.removed.append(path)
+
+            self._backfill_segments(load_audio)
+            self.set_meta('profile_stats', profile)
+            self.conn.commit()
+        return result
+
+    def recordings(self) -> List[Dict]:
+        """All recordings with their duration and sample rate"""
+        rows = self.conn.execute(
+            "SELECT path, content_hash, duration, sample_rate FROM recordings ORDER BY path"
+        )
+        return [
+            {'path': r[0], 'content_hash': r[1], 'duration': r[2], 'sample_rate': r[3]}
+            for r in rows
+        ]
+
+    def best_recording(self, min_duration: float = 3.0) -> Optional[Dict]:
+        """Longest recording above min_duration, without decoding anything"""
+        row = self.conn.execute(
+            "SELECT path, content_hash, duration FROM recordings "
+            "WHERE duration > ? ORDER BY duration DESC LIMIT 1",
+            (min_duration,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'path': row[0], 'content_hash': row[1], 'duration': row[2]}
+
+    def ranked_segments(self, min_snr_db: float = 15.0, max_clipping: float = 0.001,
+                        min_voiced_ratio: float = 0.3, jitter_weight: float = 10.0,
+                        clipping_weight: float = 10000.0) -> List[Dict]:
+        """Indexed segments passing the quality floor, best first.
+
+        The score is SNR in dB minus jitter_weight per semitone of
+        frame-to-frame pitch jitter and clipping_weight per unit of clipped
+        fraction. The weights are applied in the query, so re-ranking never
+        touches the audio.
+        """
+        rows = self.conn.execute(
+            "SELECT paths.path, s.content_hash, s.start, s.end, s.duration, s.snr_db, "
+            "s.clipping, s.pitch_hz, s.pitch_jitter, s.voiced_ratio, "
+            "s.snr_db - ? * s.pitch_jitter - ? * s.clipping AS score "
+            "FROM segments s "
+            "JOIN (SELECT content_hash, MIN(path) AS path FROM recordings GROUP BY content_hash) paths "
+            "ON paths.content_hash = s.content_hash "
+            "WHERE s.snr_db >= ? AND s.clipping <= ? AND s.voiced_ratio >= ? "
+            "ORDER BY score DESC",
+            (jitter_weight, clipping_weight, min_snr_db, max_clipping, min_voiced_ratio)
+        )
+        columns = ('path', 'content_hash', 'start', 'end', 'duration', 'snr_db',
+                   'clipping', 'pitch_hz', 'pitch_jitter', 'voiced_ratio', 'score')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def best_segments(self, target_seconds: float, **quality) -> List[Dict]:
+        """Best segments adding up to about target_seconds (see ranked_segments)"""
+        return select_segments(self.ranked_segments(**quality), target_seconds)
+
+    def segment_summary(self) -> Dict:
+        """Segment count, total voiced seconds and median SNR of the corpus"""
+        count, seconds = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(duration), 0) FROM segments"
+        ).fetchone()
+        snrs = [row[0] for row in self.conn.execute("SELECT snr_db FROM segments")]
+        return {
+            'segments': count,
+            'seconds': seconds,
+            'median_snr_db': float(np.median(snrs)) if snrs else None,
+        }
+
+    def speaker_characteristics(self) -> Dict:
+        """Speaker profile merged from every recording's stats"""
+        return characteristics_from_stats(self._profile_stats())
+
+    def rebuild_profile(self) -> Dict:
+        """Recompute the speaker profile from per-file stats (drops rounding drift)"""
+        with self._lock:
+            profile = {}
+            for (stats,) in self.conn.execute("SELECT stats FROM recordings"):
+                profile = merge_stats(profile, json.loads(stats))
+            self.set_meta('profile_stats', profile)
+            self.conn.commit()
+        return characteristics_from_stats(profile)
+
+    def close(self):
+        self.conn.close()
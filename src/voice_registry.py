@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+PROMPT_SUFFIXES = ("_prompt.npz", "_prompt.wav")
+CHARACTERISTICS_SUFFIX = "_characteristics.json"
+
+
+@dataclass
+class VoiceEntry:
+    name: str
+    prompt_path: Optional[str] = None
+    prompt_mtime: float = 0.0
+    characteristics_path: Optional[str] = None
+    characteristics_mtime: float = 0.0
+    characteristics: Dict = field(default_factory=dict)
+
+    @property
+    def version(self) -> str:
+        """Changes whenever the prompt file is replaced"""
+        return f"{self.name}@{self.prompt_mtime:.6f}"
+
+
+class VoiceRegistry:
+    """Index of every voice in the models directory with an LRU of loaded prompts.
+
+    The directory is scanned once at startup and then revalidated by mtime
+    on a background thread, so lookups on the synthesis path never touch
+    the filesystem.
+    """
+
+    def __init__(self, models_dir: str = "data/models",
+                 max_cache_bytes: int = 256 * 1024 * 1024,
+                 revalidate_interval: float = 5.0):
+        self.models_dir = models_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.revalidate_interval = revalidate_interval
+        self._entries: Dict[str, VoiceEntry] = {}
+        self._prompt_cache = OrderedDict()  # name -> (version, payload, nbytes)
+        self._cache_bytes = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.scan()
+
+    def start(self):
+        """Start background revalidation"""
+        if self.revalidate_interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._revalidate_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _revalidate_loop(self):
+        while not self._stop.wait(self.revalidate_interval):
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Error revalidating voice registry: {e}")
+
+    def scan(self):
+        """Rescan the models directory, reloading only files whose mtime changed"""
+        found: Dict[str, VoiceEntry] = {}
+        if os.path.isdir(self.models_dir):
+            with os.scandir(self.models_dir) as it:
+                for item in it:
+                    if not item.is_file():
+                        continue
+                    name = item.name
+                    for suffix in PROMPT_SUFFIXES:
+                        if name.endswith(suffix):
+                            entry = found.setdefault(name[:-len(suffix)], VoiceEntry(name[:-len(suffix)]))
+                            # Prefer a real Bark .npz history over a raw .wav
+                            if entry.prompt_path is None or suffix == "_prompt.npz":
+                                entry.prompt_path = item.path
+                                entry.prompt_mtime = item.stat().st_mtime
+                    if name.endswith(CHARACTERISTICS_SUFFIX):
+                        entry = found.setdefault(name[:-len(CHARACTERISTICS_SUFFIX)],
+                                                 VoiceEntry(name[:-len(CHARACTERISTICS_SUFFIX)]))
+                        entry.characteristics_path = item.path
+                        entry.characteristics_mtime = item.stat().st_mtime
+
+        with self._lock:
+            for name, entry in found.items():
+                old = self._entries.get(name)
+                if (old is not None and old.characteristics_path == entry.characteristics_path
+                        and old.characteristics_mtime == entry.characteristics_mtime):
+                    entry.characteristics = old.characteristics
+                elif entry.characteristics_path:
+                    entry.characteristics = self._read_characteristics(entry.characteristics_path)
+                if old is not None and old.version != entry.version:
+                    self._evict(name)
+            for name in set(self._entries) - set(found):
+                self._evict(name)
+            self._entries = found
+
+    def refresh(self):
+        """Pick up voices that were just written by this process"""
+        self.scan()
+
+    def _read_characteristics(self, path: str) -> Dict:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading voice characteristics from {path}: {e}")
+            return {}
+
+    def _evict(self, name: str):
+        cached = self._prompt_cache.pop(name, None)
+        if cached is not None:
+            self._cache_bytes -= cached[2]
+
+    def _load_prompt(self, entry: VoiceEntry):
+        if entry.prompt_path.endswith(".npz"):
+            with np.load(entry.prompt_path) as data:
+                payload = {key: data[key] for key in data.files}
+            nbytes = sum(arr.nbytes for arr in payload.values())
+        else:
+            # Raw audio prompts are handed to Bark by path
+            payload = entry.prompt_path
+            nbytes = 0
+        return payload, nbytes
+
+    def get(self, name: str) -> Optional[VoiceEntry]:
+        with self._lock:
+            return self._entries.get(name)
+
+    def get_prompt(self, name: str) -> Optional[Union[str, Dict]]:
+        """Return the Bark history prompt for a voice, loading it at most once"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.prompt_path is None:
+                return None
+            cached = self._prompt_cache.get(name)
+            if cached is not None and cached[0] == entry.version:
+                self._prompt_cache.move_to_end(name)
+                return cached[1]
+
+        payload, nbytes = self._load_prompt(entry)
+        with self._lock:
+            self._evict(name)
+            self._prompt_cache[name] = (entry.version, payload, nbytes)
+            self._cache_bytes += nbytes
+            while self._cache_bytes > self.max_cache_bytes and len(self._prompt_cache) > 1:
+                _, (_, _, evicted_bytes) = self._prompt_cache.popitem(last=False)
+                self._cache_bytes -= evicted_bytes
+        return payload
+
+    def get_characteristics(self, name: str) -> Dict:
+        entry = self.get(name)
+        return entry.characteristics if entry is not None else {}
+
+    def voice_key(self, name: str) -> str:
+        """Cache key for derived data that must change when the prompt changes"""
+        entry = self.get(name)
+        return entry.version if entry is not None else name
+
+    def list_voices(self) -> List[str]:
+        """Names of all voices that have a prompt"""
+        with self._lock:
+            return sorted(n for n, e in self._entries.items() if e.prompt_path is not None)
+
+    def cache_info(self) -> Dict:
+        with self._lock:
+            return {
+                'voices': len(self._entries),
+                'cached_prompts': len(self._prompt_cache),
+                'cache_bytes': self._cache_bytes,
+                'max_cache_bytes': self.max_cache_bytes,
+            }
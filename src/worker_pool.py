@@ -0,0 +1,523 @@
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeout
+from dataclasses import asdict, dataclass, field
+from itertools import count
+from queue import Empty
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.cancellation import SynthesisCancelled, check_cancelled
+from src.core_scheduler import CorePartitioner, pin_threads
+from src.sample_rates import MODEL_RATE
+
+SHARED_MODEL_KEYS = ("text", "coarse", "fine", "codec")
+MANIFEST_NAME = "manifest.json"
+
+
+def save_shared_model(key: str, container, shared_dir: str) -> Dict:
+    """Write one Bark sub-model as a plain state dict; returns its manifest entry"""
+    import torch
+    model = container["model"] if key == "text" else container
+    state = {name: tensor.detach().cpu().contiguous()
+             for name, tensor in model.state_dict().items()}
+    path = os.path.join(shared_dir, f"{key}.pt")
+    tmp = path + ".tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+    entry = {'path': f"{key}.pt"}
+    if key != "codec":
+        entry['config'] = asdict(model.config)
+    return entry
+
+
+def load_shared_model(key: str, entry: Dict, shared_dir: str, device: str = "cpu",
+                      tokenizer=None):
+    """Memory-map a sub-model written by save_shared_model; returns a bark.generation container"""
+    import torch
+    from bark.model import GPT, GPTConfig
+    from bark.model_fine import FineGPT, FineGPTConfig
+    from encodec import EncodecModel
+
+    state = torch.load(os.path.join(shared_dir, entry['path']),
+                       map_location="cpu", mmap=True, weights_only=True)
+    if key == "codec":
+        model = EncodecModel.encodec_model_24khz(pretrained=False)
+        model.set_target_bandwidth(6.0)
+    else:
+        # Built on the meta device so no private weights are allocated;
+        # assign=True makes the parameters views of the mapped file
+        with torch.device("meta"):
+            if key == "fine":
+                model = FineGPT(FineGPTConfig(**entry['config']))
+            else:
+                model = GPT(GPTConfig(**entry['config']))
+    model.load_state_dict(state, assign=True)
+    model.eval()
+    if device != "cpu":
+        model.to(device)
+
+    if key == "text":
+        if tokenizer is None:
+            from transformers import BertTokenizer
+            tokenizer = BertTokenizer.from_pretrained("bert-base-multilingual-cased")
+        return {"model": model, "tokenizer": tokenizer}
+    return model
+
+
+def convert_checkpoints(shared_dir: str, use_small: bool = False, force: bool = False) -> Dict:
+    """Write Bark's weights once as plain state dicts that torch can memory-map.
+
+    Bark's own checkpoints wrap the weights with optimizer state and training
+    metadata, so every process that loads them gets a private copy. The
+    converted files are mapped read-only by the workers instead, so all of
+    them share the same page-cache pages.
+    """
+    manifest_path = os.path.join(shared_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        files_present = all(
+            os.path.exists(os.path.join(shared_dir, entry['path']))
+            for entry in manifest['models'].values()
+        )
+        if manifest.get('use_small') == use_small and files_present:
+            return manifest
+
+    import bark.generation as bark_gen
+    from bark import preload_models
+
+    print("Converting Bark checkpoints for shared memory-mapped loading...")
+    os.makedirs(shared_dir, exist_ok=True)
+    preload_models(
+        text_use_gpu=False, text_use_small=use_small,
+        coarse_use_gpu=False, coarse_use_small=use_small,
+        fine_use_gpu=False, fine_use_small=use_small,
+        codec_use_gpu=False
+    )
+
+    manifest = {'use_small': use_small, 'models': {}}
+    for key in SHARED_MODEL_KEYS:
+        manifest['models'][key] = save_shared_model(key, bark_gen.models[key], shared_dir)
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # The supervisor never generates, so it does not keep a copy
+    bark_gen.clean_models()
+    return manifest
+
+
+def map_shared_models(shared_dir: str):
+    """Install memory-mapped Bark models into bark.generation for this process"""
+    import bark.generation as bark_gen
+
+    with open(os.path.join(shared_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+
+    for key, entry in manifest['models'].items():
+        bark_gen.models[key] = load_shared_model(key, entry, shared_dir)
+        bark_gen.models_devices[key] = "cpu"
+
+
+@dataclass
+class SynthesisJob:
+    job_id: int
+    text: str
+    history_prompt: object
+    temperature: float = 0.7
+    fine_temperature: float = 0.5
+    use_kv_caching: bool = True
+    cpus: tuple = ()  # cores the worker pins itself to; empty = unpinned
+    submitted_at: float = 0.0
+    dispatched_at: float = 0.0
+
+
+class _RemoteCancel:
+    """Cancellation token for one job, fed by the supervisor's cancel queue.
+
+    Bark's stages check their token every sampling step; the queue is
+    polled at most every ``poll_interval`` so the check stays cheap.
+    """
+
+    def __init__(self, job_id: int, cancel_queue, cancelled: set, poll_interval: float = 0.05):
+        self.job_id = job_id
+        self._queue = cancel_queue
+        self._cancelled = cancelled
+        self._poll_interval = poll_interval
+        self._last_poll = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        now = time.monotonic()
+        if now - self._last_poll >= self._poll_interval:
+            self._last_poll = now
+            _drain_cancels(self._queue, self._cancelled)
+        return self.job_id in self._cancelled
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise SynthesisCancelled("cancelled by the supervisor")
+
+
+def _drain_cancels(cancel_queue, cancelled: set):
+    while True:
+        try:
+            cancelled.add(cancel_queue.get_nowait())
+        except Empty:
+            return
+
+
+def _render_job(job: SynthesisJob, cancel_token=None) -> np.ndarray:
+    from src.bark_stages import (
+        decode_batch,
+        generate_coarse_batch,
+        generate_fine_batch,
+        generate_semantic_batch,
+    )
+    semantic = generate_semantic_batch([job.text], [job.history_prompt], [job.temperature],
+                                       use_kv_caching=job.use_kv_caching,
+                                       cancel_token=cancel_token)[0]
+    coarse = generate_coarse_batch([semantic], [job.history_prompt], [job.temperature],
+                                   use_kv_caching=job.use_kv_caching,
+                                   cancel_token=cancel_token)[0]
+    fine = generate_fine_batch([coarse], [job.history_prompt], temp=job.fine_temperature,
+                               cancel_token=cancel_token)[0]
+    return decode_batch([fine], cancel_token=cancel_token)[0]
+
+
+def _worker_main(worker_id: int, shared_dir: str, threads: int, job_queue, cancel_queue,
+                 result_queue):
+    """Worker process: map the shared weights, then render jobs until told to stop"""
+    import torch
+    if threads > 0:
+        torch.set_num_threads(threads)
+    map_shared_models(shared_dir)
+    result_queue.put(("ready", worker_id, None, None))
+
+    pinned = None
+    cancelled = set()
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        token = _RemoteCancel(job.job_id, cancel_queue, cancelled)
+        try:
+            # Jobs cancelled while queued are skipped without rendering
+            check_cancelled(token)
+            if job.cpus and job.cpus != pinned:
+                pin_threads(job.cpus, len(job.cpus))
+                pinned = job.cpus
+            audio = _render_job(job, token)
+            result_queue.put(("done", worker_id, job.job_id, audio))
+        except SynthesisCancelled:
+            result_queue.put(("cancelled", worker_id, job.job_id, None))
+        except Exception as e:
+            result_queue.put(("error", worker_id, job.job_id, f"{type(e).__name__}: {e}"))
+        cancelled.discard(job.job_id)
+
+
+@dataclass
+class _WorkerHandle:
+    process: object
+    job_queue: object
+    cancel_queue: object
+    ready: bool = False
+    # job_id -> (job, future, attempts)
+    inflight: Dict[int, tuple] = field(default_factory=dict)
+
+
+class SynthesisWorkerPool:
+    """Supervisor for Bark worker processes that share memory-mapped weights.
+
+    Workers are started up front and each maps the converted checkpoints
+    read-only, so adding a worker costs its activations and KV cache, not
+    another copy of the models. Jobs go to the worker with the fewest jobs
+    in flight; a worker that dies is restarted and its unfinished jobs are
+    retried on the others.
+
+    With ``partition_cores`` the cores are split between workers per job
+    instead: a job waits for an idle worker and a free partition, and the
+    partition is sized from the queue depth (see CorePartitioner). The
+    worker pins itself to those cores and uses one torch thread per core.
+    """
+
+    def __init__(self, num_workers: int = 0, threads_per_worker: int = 4,
+                 shared_dir: str = "data/models/shared",
+                 use_small_models: bool = False,
+                 use_kv_caching: bool = True,
+                 fine_temperature: float = 0.5,
+                 max_retries: int = 1,
+                 monitor_interval: float = 1.0,
+                 partition_cores: bool = False,
+                 min_partition_width: int = 2,
+                 partitioner: Optional[CorePartitioner] = None):
+        cpus = os.cpu_count() or 1
+        self.partitioner = partitioner
+        if self.partitioner is None and partition_cores:
+            self.partitioner = CorePartitioner(min_width=min_partition_width)
+        if self.partitioner is not None:
+            # Enough workers to run the narrowest partitions side by side;
+            # each sets its thread count per job
+            self.threads_per_worker = self.partitioner.min_width
+            self.num_workers = num_workers or self.partitioner.max_partitions
+        else:
+            self.threads_per_worker = threads_per_worker
+            self.num_workers = num_workers or max(1, cpus // max(1, threads_per_worker))
+        self.shared_dir = shared_dir
+        self.use_small_models = use_small_models
+        self.use_kv_caching = use_kv_caching
+        self.fine_temperature = fine_temperature
+        self.max_retries = max_retries
+        self.monitor_interval = monitor_interval
+
+        self._ctx = mp.get_context("spawn")  # never fork a process that has torch threads
+        self._result_queue = None
+        self._workers: Dict[int, _WorkerHandle] = {}
+        # (job, future, attempts) waiting for a free partition
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._job_ids = count()
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self.restarts = 0
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+
+    def start(self) -> "SynthesisWorkerPool":
+        """Convert checkpoints if needed and start every worker"""
+        convert_checkpoints(self.shared_dir, self.use_small_models)
+        self._result_queue = self._ctx.Queue()
+        self._running = True
+        with self._lock:
+            for worker_id in range(self.num_workers):
+                self._spawn(worker_id)
+        for target in (self._collect_results, self._monitor_workers):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.partitioner is not None:
+            print(f"Started {self.num_workers} synthesis workers "
+                  f"sharing {len(self.partitioner.cores)} cores")
+        else:
+            print(f"Started {self.num_workers} synthesis workers "
+                  f"({self.threads_per_worker} threads each)")
+        return self
+
+    def _spawn(self, worker_id: int):
+        job_queue = self._ctx.Queue()
+        cancel_queue = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.shared_dir, self.threads_per_worker,
+                  job_queue, cancel_queue, self._result_queue),
+            name=f"bark-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = _WorkerHandle(process, job_queue, cancel_queue)
+
+    def _dispatch(self, job: SynthesisJob, future: Future, attempts: int):
+        # Caller holds self._lock
+        alive = [(wid, w) for wid, w in self._workers.items() if w.process.is_alive()]
+        if not alive:
+            future.set_exception(RuntimeError("No synthesis workers are running"))
+            return
+        if self.partitioner is not None:
+            self._pending.append((job, future, attempts))
+            self._drain_pending()
+            return
+        worker_id, worker = min(alive, key=lambda item: len(item[1].inflight))
+        job.dispatched_at = time.perf_counter()
+        worker.inflight[job.job_id] = (job, future, attempts)
+        worker.job_queue.put(job)
+
+    def _drain_pending(self):
+        """Start queued jobs while there are idle workers and free cores"""
+        # Caller holds self._lock
+        while self._pending:
+            job, future, attempts = self._pending[0]
+            if future.done():
+                # Cancelled while it was waiting
+                self._pending.popleft()
+                continue
+            idle = [w for w in self._workers.values() if w.process.is_alive() and not w.inflight]
+            if not idle:
+                return
+            running = sum(len(w.inflight) for w in self._workers.values())
+            cpus = self.partitioner.allocate(load=running + len(self._pending))
+            if cpus is None:
+                return
+            self._pending.popleft()
+            job.cpus = cpus
+            job.dispatched_at = time.perf_counter()
+            idle[0].inflight[job.job_id] = (job, future, attempts)
+            idle[0].job_queue.put(job)
+
+    def _finish(self, job: SynthesisJob, audio: Optional[np.ndarray]):
+        """Return a job's cores and log its timing"""
+        # Caller holds self._lock
+        if self.partitioner is None or not job.cpus:
+            return
+        self.partitioner.release(job.cpus)
+        if audio is not None:
+            now = time.perf_counter()
+            self.partitioner.record(
+                len(job.cpus),
+                queue_seconds=job.dispatched_at - job.submitted_at,
+                latency_seconds=now - job.submitted_at,
+                render_seconds=now - job.dispatched_at,
+                audio_seconds=len(audio) / MODEL_RATE
+            )
+        job.cpus = ()
+        self._drain_pending()
+
+    def submit(self, text: str, history_prompt, temperature: float = 0.7) -> Future:
+        """Queue one text for synthesis; returns a future of the waveform"""
+        future = Future()
+        if not self._running:
+            future.set_exception(RuntimeError("Worker pool is not running"))
+            return future
+        job = SynthesisJob(next(self._job_ids), text, history_prompt, temperature,
+                           self.fine_temperature, self.use_kv_caching,
+                           submitted_at=time.perf_counter())
+        future.job_id = job.job_id
+        with self._lock:
+            self._dispatch(job, future, attempts=0)
+        return future
+
+    def cancel(self, future: Future):
+        """Cancel a submitted job; a worker already rendering it stops at its next step"""
+        job_id = getattr(future, 'job_id', None)
+        with self._lock:
+            if self._pending:
+                self._pending = deque(entry for entry in self._pending if entry[1] is not future)
+            for worker in self._workers.values():
+                if job_id in worker.inflight:
+                    # The worker reports back "cancelled", which frees its cores
+                    worker.cancel_queue.put(job_id)
+                    break
+        future.cancel()
+
+    def wait(self, future: Future, cancel_token=None, poll_interval: float = 0.05) -> np.ndarray:
+        """Wait for a job's result, giving up as soon as cancel_token fires"""
+        while True:
+            try:
+                return future.result(timeout=poll_interval)
+            except FutureTimeout:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self.cancel(future)
+                    check_cancelled(cancel_token)
+
+    def generate(self, text: str, history_prompt, temperature: float = 0.7,
+                 cancel_token=None) -> np.ndarray:
+        """Blocking helper around submit()"""
+        return self.wait(self.submit(text, history_prompt, temperature), cancel_token)
+
+    def _collect_results(self):
+        while self._running:
+            try:
+                kind, worker_id, job_id, payload = self._result_queue.get(timeout=0.5)
+            except Empty:
+                continue
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is None:
+                    continue
+                if kind == "ready":
+                    worker.ready = True
+                    continue
+                entry = worker.inflight.pop(job_id, None)
+                if entry is None:
+                    continue
+                self._finish(entry[0], payload if kind == "done" else None)
+            _, future, _ = entry
+            try:
+                if kind == "done":
+                    future.set_result(payload)
+                    self.jobs_completed += 1
+                elif kind == "cancelled":
+                    future.cancel()
+                else:
+                    future.set_exception(RuntimeError(payload))
+                    self.jobs_failed += 1
+            except InvalidStateError:
+                # Cancelled by the caller while the worker was rendering
+                pass
+
+    def _monitor_workers(self):
+        while self._running:
+            time.sleep(self.monitor_interval)
+            with self._lock:
+                if not self._running:
+                    break
+                for worker_id, worker in list(self._workers.items()):
+                    if worker.process.is_alive():
+                        continue
+                    print(f"Synthesis worker {worker_id} exited with code "
+                          f"{worker.process.exitcode}; restarting")
+                    self.restarts += 1
+                    self._spawn(worker_id)
+                    for job, _, _ in worker.inflight.values():
+                        self._finish(job, None)
+                    # Retry whatever the dead worker had not finished
+                    for job, future, attempts in worker.inflight.values():
+                        if future.done():
+                            continue
+                        if attempts < self.max_retries:
+                            self._dispatch(job, future, attempts + 1)
+                        else:
+                            self.jobs_failed += 1
+                            future.set_exception(RuntimeError(
+                                f"Synthesis worker crashed while rendering job {job.job_id}"))
+
+    def stop(self, timeout: float = 5.0):
+        """Stop every worker; jobs still in flight are failed"""
+        with self._lock:
+            self._running = False
+            workers = list(self._workers.values())
+            pending, self._pending = list(self._pending), deque()
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Worker pool stopped"))
+        for worker in workers:
+            worker.job_queue.put(None)
+        for worker in workers:
+            worker.process.join(timeout=timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            for _, future, _ in worker.inflight.values():
+                if not future.done():
+                    future.set_exception(RuntimeError("Worker pool stopped"))
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def get_stats(self) -> dict:
+        """Worker liveness, restart count and job counters"""
+        with self._lock:
+            workers = {
+                worker_id: {
+                    'alive': worker.process.is_alive(),
+                    'ready': worker.ready,
+                    'inflight': len(worker.inflight),
+                    'cpus': [list(job.cpus) for job, _, _ in worker.inflight.values()],
+                }
+                for worker_id, worker in self._workers.items()
+            }
+            pending = len(self._pending)
+        stats = {
+            'workers': workers,
+            'restarts': self.restarts,
+            'jobs_completed': self.jobs_completed,
+            'jobs_failed': self.jobs_failed,
+            'pending': pending,
+        }
+        if self.partitioner is not None:
+            stats['partitions'] = self.partitioner.report()
+        return stats
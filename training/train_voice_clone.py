@@ -2,14 +2,13 @@ import os
 import sys
 sys.path.append('..')
 
-from src.audio_processing import AudioProcessor
 from src.voice_cloning import BarkVoiceCloner  # Updated import
+from src.audio_writer import write_audio
 from config.settings import settings
 
 def train_voice_clone(audio_directory: str, speaker_name: str):
     """Train voice clone from audio samples using Bark"""
     
-    audio_processor = AudioProcessor()
     voice_cloner = BarkVoiceCloner()  # Updated class name
     
     # Process audio files and create voice prompt
@@ -23,25 +22,24 @@ def train_voice_clone(audio_directory: str, speaker_name: str):
         test_text = "Hello, this is my cloned voice speaking through Bark. How do I sound?"
         
         print("Synthesizing test speech...")
-        test_audio = voice_cloner.synthesize_speech(
+        # Several takes are rendered together and clearly bad ones are
+        # dropped early, so one unlucky seed does not fail validation
+        test_audio, report = voice_cloner.synthesize_best_of(
             text=test_text,
-            speaker_name=speaker_name,
-            output_path="data/processed_audio/test_bark_voice.wav"
+            speaker_name=speaker_name
         )
         
         if test_audio is not None:
+            write_audio("data/processed_audio/test_bark_voice.wav", test_audio, voice_cloner.sample_rate)
             print("Test audio saved to data/processed_audio/test_bark_voice.wav")
             
-            # Calculate voice similarity if we have reference audio
-            audio_files = [f for f in os.listdir(audio_directory) if f.endswith('.wav')]
-            if audio_files:
-                reference_path = os.path.join(audio_directory, audio_files[0])
-                reference_audio, _ = audio_processor.load_audio(reference_path)
-                
-                similarity = voice_cloner.fine_tune_voice_similarity(
-                    reference_audio, test_audio
-                )
-                print(f"Voice similarity score: {similarity:.3f}")
+            # Scored against the speaker profile merged from the whole corpus,
+            # so no reference recording has to be decoded again
+            print(f"Voice similarity score: {report['similarity']:.3f} "
+                  f"(best of {report['k']} takes, chose take {report['chosen'] + 1})")
+            for candidate in report.get('candidates', []):
+                if candidate['aborted'] and candidate['index'] != report['chosen']:
+                    print(f"  take {candidate['index'] + 1} dropped: {candidate['aborted']}")
         else:
             print("Test synthesis failed")
         
@@ -58,7 +56,14 @@ if __name__ == "__main__":
                        help='Directory containing audio files')
     parser.add_argument('--speaker_name', type=str, required=True,
                        help='Name for the cloned voice')
+    parser.add_argument('--profile', action='store_true',
+                       help='Profile training; reports go to a timestamped folder in data/profiles')
     
     args = parser.parse_args()
     
-    train_voice_clone(args.audio_dir, args.speaker_name)
\ No newline at end of file
+    if args.profile:
+        from src.profiling import profile_session
+        with profile_session("train_voice_clone"):
+            train_voice_clone(args.audio_dir, args.speaker_name)
+    else:
+        train_voice_clone(args.audio_dir, args.speaker_name)
\ No newline at end of file